@@ -2,6 +2,8 @@
 # Filename: assert_variable_type.py
 
 from types import *
+import timeit as _timeit
+from framework_profiler import Profiler as _Profiler
 
 def assert_variable_type(variable, expected_type, raise_exception=True):
     """Return True if a variable is of a certain type or types.
@@ -13,6 +15,15 @@ def assert_variable_type(variable, expected_type, raise_exception=True):
     raise_exception -- whether to raise an exception or just return
                         False on failure, with error message
     """
+    if _Profiler.enabled:
+        start_time = _timeit.default_timer()
+        try:
+            return _assert_variable_type(variable, expected_type, raise_exception)
+        finally:
+            _Profiler.observe('validation', _timeit.default_timer() - start_time)
+    return _assert_variable_type(variable, expected_type, raise_exception)
+
+def _assert_variable_type(variable, expected_type, raise_exception):
     # if expected type is not a list make it one
     if not isinstance(expected_type, list):
         expected_type = [expected_type]
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# Filename: bench_import_time.py
+
+"""Measure how long importing the framework takes in a fresh interpreter
+and fail if it got slower than a budget, if a module which should only be
+loaded on demand was imported, or if the import wrapped stdout.
+
+e.g. python bench_import_time.py --runs 20 --max-ms 150
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# modules which must only be imported when the feature using them is
+# enabled: the report, history and metrics dependencies
+LAZY_MODULES = ['jinja2',
+                'xhtml2pdf',
+                'reportlab',
+                'html5lib',
+                'PyPDF2',
+                'sqlite3',
+                'BaseHTTPServer',
+                'multiprocessing',
+                'difflib',
+                'csv']
+
+_MEASURE = """
+import sys, json, timeit
+stdout = sys.stdout
+start = timeit.default_timer()
+import external_program_test_framework
+elapsed = timeit.default_timer() - start
+lazy = %r
+sys.__stdout__.write(json.dumps({'ms': elapsed * 1000,
+                                 'loaded': [m for m in lazy if m in sys.modules],
+                                 'stdout_wrapped': sys.stdout is not stdout}))
+"""
+
+def measure(runs, module_directory):
+    """Import the framework in runs fresh interpreters and return the
+    sorted import times in milliseconds and the results of the last run
+    """
+    code = _MEASURE %LAZY_MODULES
+    times = []
+    result = None
+    for i in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=module_directory)
+        result = json.loads(output)
+        times.append(result['ms'])
+    return sorted(times), result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='fail if the median import time exceeds this budget')
+    args = parser.parse_args()
+    times, result = measure(args.runs, os.path.dirname(os.path.abspath(__file__)))
+    median = times[len(times) // 2]
+    print('import external_program_test_framework: median %.1f ms, min %.1f ms, max %.1f ms over %d runs'
+          %(median, times[0], times[-1], len(times)))
+    failures = []
+    if result['loaded']:
+        failures.append('imported on demand only modules: %s' %', '.join(result['loaded']))
+    if result['stdout_wrapped']:
+        failures.append('stdout was wrapped at import time')
+    if args.max_ms is not None and median > args.max_ms:
+        failures.append('median import time %.1f ms exceeds the budget of %.1f ms' %(median, args.max_ms))
+    for failure in failures:
+        print('FAIL: %s' %failure)
+    if failures:
+        sys.exit(1)
+    print('OK')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# Filename: case_allocator.py
+
+import os
+import re
+import errno
+import shutil
+import socket
+import tempfile
+from threading import Lock
+from assert_variable_type import *
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# directory holding the port reservations shared by all framework processes
+PORT_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'external_program_test_ports')
+# {port}, {port:name}, {workdir}, {log}, {log:name}
+TEMPLATE_PATTERN = re.compile(r'\{(port|workdir|log)(?::([\w.-]+))?\}')
+
+_reserved_ports = set()
+_reserved_ports_lock = Lock()
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+def _reserve_port(port):
+    """Reserve a port for this process, return False if it is reserved already
+    """
+    with _reserved_ports_lock:
+        if port in _reserved_ports:
+            return False
+        if not os.path.isdir(PORT_LOCK_DIR):
+            try:
+                os.makedirs(PORT_LOCK_DIR)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        # the processes create and take over lock files one at a time,
+        # or two of them could take over the same stale reservation
+        guard = open(os.path.join(PORT_LOCK_DIR, 'reservations.lock'), 'a')
+        try:
+            if fcntl is not None:
+                fcntl.flock(guard.fileno(), fcntl.LOCK_EX)
+            if not _create_lock_file(os.path.join(PORT_LOCK_DIR, '%d.lock' %port)):
+                return False
+        finally:
+            # closing the file releases the flock
+            guard.close()
+        _reserved_ports.add(port)
+        return True
+
+def _create_lock_file(lock_file):
+    """Create a port's lock file holding the pid of this process,
+    return False if a live process holds it
+    """
+    try:
+        fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+        # take over reservations left behind by dead processes
+        try:
+            with open(lock_file) as f:
+                pid = int(f.read().strip() or 0)
+        except (IOError, ValueError):
+            return False
+        if pid and _process_alive(pid):
+            return False
+        os.remove(lock_file)
+        fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    os.write(fd, str(os.getpid()))
+    os.close(fd)
+    return True
+
+def _release_port(port):
+    with _reserved_ports_lock:
+        _reserved_ports.discard(port)
+        try:
+            os.remove(os.path.join(PORT_LOCK_DIR, '%d.lock' %port))
+        except OSError:
+            pass
+
+class CaseAllocator:
+    """Hands out collision-free resources to a test case: free TCP ports,
+    which stay reserved across framework processes until released, an
+    isolated working directory and unique log paths inside it.
+
+    Command arguments refer to them through the templates {port},
+    {port:name}, {workdir}, {log} and {log:name}, see expand.
+    """
+    # whether release keeps the working directory for inspection
+    keep_workdirs = False
+
+    def __init__(self, label):
+        """Positional arguments:
+        label -- name used as the working directory prefix, e.g. suite.case
+        """
+        assert_variable_type(label, str)
+        self.label = re.sub(r'[^\w.-]', '_', label)
+        self._ports = {}
+        self._workdir = None
+        self._lock = Lock()
+
+    def port(self, name='default'):
+        """Return a free TCP port, the same one for every call with the same name
+        """
+        with self._lock:
+            if name not in self._ports:
+                while True:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    try:
+                        sock.bind(('', 0))
+                        port = sock.getsockname()[1]
+                    finally:
+                        sock.close()
+                    if _reserve_port(port):
+                        break
+                self._ports[name] = port
+            return self._ports[name]
+
+    @property
+    def workdir(self):
+        """The case's working directory, created on first use
+        """
+        with self._lock:
+            if self._workdir is None:
+                self._workdir = tempfile.mkdtemp(prefix=self.label + '-')
+            return self._workdir
+
+    def log_path(self, name='output'):
+        """Return the path of a log file unique to the case
+        """
+        return os.path.join(self.workdir, name + '.log')
+
+    def expand(self, argument):
+        """Replace the templates in a string, or in each string of a list
+        """
+        if isinstance(argument, list):
+            return [self.expand(x) for x in argument]
+        if not isinstance(argument, str) or '{' not in argument:
+            return argument
+        def _replace(match):
+            kind, name = match.group(1), match.group(2)
+            if kind == 'port':
+                return str(self.port(name or 'default'))
+            if kind == 'log':
+                return self.log_path(name or 'output')
+            return self.workdir
+        return TEMPLATE_PATTERN.sub(_replace, argument)
+
+    def release(self):
+        """Release the ports and remove the working directory
+        """
+        with self._lock:
+            for port in self._ports.values():
+                _release_port(port)
+            self._ports = {}
+            if self._workdir is not None and not self.keep_workdirs:
+                shutil.rmtree(self._workdir, True)
+            self._workdir = None
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+# Filename: console_renderer.py
+
+import sys
+import atexit
+import timeit
+import threading
+from Queue import Queue, Empty
+
+class _StreamLimiter:
+    """Rate limits the lines of one output stream of a process with a
+    token bucket. Lines over the limit are counted instead of printed
+    and the count is printed when lines get through again or the
+    stream ends. Only used by the thread reading the stream.
+    """
+
+    def __init__(self, renderer, group, lines_per_second, burst_lines):
+        self._renderer = renderer
+        self._group = group
+        self._rate = lines_per_second
+        self._burst = burst_lines
+        self._tokens = burst_lines
+        self._last = timeit.default_timer()
+        self.suppressed = 0
+
+    def _flush_suppressed(self):
+        if self.suppressed:
+            self._renderer._queue.put(('write', self._group, False,
+                                       '... {:,} lines suppressed\n'.format(self.suppressed)))
+            self.suppressed = 0
+
+    def write(self, text):
+        if self._rate is not None:
+            now = timeit.default_timer()
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            if self._tokens < 1:
+                self.suppressed += 1
+                return
+            self._tokens -= 1
+        self._flush_suppressed()
+        self._renderer._queue.put(('write', self._group, False, text))
+
+    def close(self):
+        self._flush_suppressed()
+
+class ConsoleRenderer:
+    """Writes the framework and process output from a single thread so
+    that a slow terminal does not hold up the tests.
+
+    Messages are queued and written in batches with one write and flush
+    per stream and batch. Process output is rate limited per stream.
+    When cases run in parallel the output of each case is kept together:
+    one case is printed live while the output of the others is held back
+    until that case ends. A case is identified by the group set with
+    set_group on the thread running it, which the stream readers created
+    on that thread inherit.
+    """
+    # the running renderer, None while output is written synchronously
+    active = None
+    _local = threading.local()
+
+    def __init__(self, lines_per_second=200, burst_lines=1000, batch_size=1000):
+        """Positional arguments:
+        lines_per_second -- lines of one process stream printed per second
+                            once the burst is used up, None for no limit
+        burst_lines -- lines of one process stream printed without limit
+        batch_size -- maximum number of messages written at once
+        """
+        self.lines_per_second = lines_per_second
+        self.burst_lines = burst_lines
+        self.batch_size = batch_size
+        self._queue = Queue()
+        self._thread = None
+        # the group printed live, the held back groups in order
+        # of appearance and the held back groups which have ended
+        self._foreground = None
+        self._held = {}
+        self._held_order = []
+        self._ended = set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._render)
+        self._thread.daemon = True
+        self._thread.start()
+        ConsoleRenderer.active = self
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write everything queued and held back and stop the thread
+        """
+        if ConsoleRenderer.active is self:
+            ConsoleRenderer.active = None
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @staticmethod
+    def current_group():
+        return getattr(ConsoleRenderer._local, 'group', None)
+
+    @staticmethod
+    def set_group(group):
+        """Send the output of the calling thread to a group, e.g. a case
+        """
+        ConsoleRenderer._local.group = group
+        renderer = ConsoleRenderer.active
+        if renderer is not None:
+            renderer._queue.put(('begin', group, False, None))
+
+    @staticmethod
+    def end_group():
+        """End the calling thread's group, its output is printed once it
+        is the oldest group left
+        """
+        group = ConsoleRenderer.current_group()
+        ConsoleRenderer._local.group = None
+        renderer = ConsoleRenderer.active
+        if renderer is not None and group is not None:
+            renderer._queue.put(('end', group, False, None))
+
+    def write(self, text, error=False):
+        """Queue text for stdout, or for stderr if error is True
+        """
+        self._queue.put(('write', ConsoleRenderer.current_group(), error, text))
+
+    def stream(self):
+        """Return a rate limited writer for one stream of process output
+        """
+        return _StreamLimiter(self, ConsoleRenderer.current_group(),
+                              self.lines_per_second, self.burst_lines)
+
+    def _release(self, group, output):
+        output.extend(self._held.pop(group, []))
+        if group in self._held_order:
+            self._held_order.remove(group)
+        self._ended.discard(group)
+
+    def _handle(self, message, output):
+        kind, group, error, text = message
+        if kind == 'write':
+            if group is None or group == self._foreground:
+                output.append((error, text))
+            else:
+                if group not in self._held:
+                    self._held[group] = []
+                    self._held_order.append(group)
+                self._held[group].append((error, text))
+        elif kind == 'begin':
+            if self._foreground is None:
+                self._foreground = group
+            elif group not in self._held:
+                self._held[group] = []
+                self._held_order.append(group)
+        elif kind == 'end':
+            if group != self._foreground:
+                self._ended.add(group)
+                return
+            self._foreground = None
+            # print the groups which ended meanwhile, then
+            # the oldest group still running becomes the live one
+            for held in [g for g in self._held_order if g in self._ended]:
+                self._release(held, output)
+            if self._held_order:
+                self._foreground = self._held_order[0]
+                self._release(self._foreground, output)
+
+    def _write(self, output):
+        """Write the batch with one write per run of the same stream
+        """
+        stream, chunks = None, []
+        for error, text in output + [(None, None)]:
+            if error != stream and chunks:
+                target = sys.stderr if stream else sys.stdout
+                target.write(''.join(chunks))
+                target.flush()
+                chunks = []
+            stream = error
+            if text is not None:
+                chunks.append(text)
+
+    def _render(self):
+        while True:
+            message = self._queue.get()
+            output = []
+            stopping = message is None
+            if not stopping:
+                self._handle(message, output)
+                # coalesce whatever else is queued already
+                for i in range(self.batch_size - 1):
+                    try:
+                        message = self._queue.get_nowait()
+                    except Empty:
+                        break
+                    if message is None:
+                        stopping = True
+                        break
+                    self._handle(message, output)
+            if stopping:
+                for group in list(self._held_order):
+                    self._release(group, output)
+                self._foreground = None
+            self._write(output)
+            if stopping:
+                return
@@ -0,0 +1,257 @@
+#!/usr/bin/python
+# Filename: dag_scheduler.py
+
+import timeit
+from threading import Thread, Condition
+
+# node states
+PENDING = 'pending'
+RUNNING = 'running'
+PASSED = 'passed'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+CANCELLED = 'cancelled'
+
+class DagScheduler:
+    """Run functions as soon as the functions they depend on have passed.
+
+    Dependencies are declared directly by name or through artifacts, a node
+    consuming an artifact depends on every node producing it. Ready nodes are
+    started in the order they were added on up to max_workers threads. With
+    one worker the nodes run in the calling thread. When a node fails, every
+    node depending on it is skipped right away instead of being run.
+
+    With a resource pool a node only starts once its resource requirements
+    can be reserved. Ready nodes that do not fit are passed over for later
+    ones that do, which packs the nodes onto the host's capacity.
+    """
+    # seconds between checks of a resource pool held by other schedulers
+    # while none of this scheduler's nodes are running
+    resource_recheck_seconds = 1
+
+    def __init__(self, max_workers=1, resource_pool=None):
+        """Positional arguments:
+        max_workers -- maximum number of nodes running at the same time,
+                       0 for no limit besides the resource pool
+        resource_pool -- resource_pool.ResourcePool shared by the nodes
+        """
+        if not isinstance(max_workers, int) or max_workers < 0 or (max_workers == 0 and resource_pool is None):
+            raise ValueError('max_workers argument "%s" is not a positive int' %str(max_workers))
+        self.max_workers = max_workers
+        self.resource_pool = resource_pool
+        self._order = []
+        self._nodes = {}
+        self._topological_order = None
+        self._cancelled = False
+        self._condition = Condition()
+
+    def add(self, name, function, depends_on=None, produces=None, consumes=None, resources=None):
+        """Add a node
+
+        Positional arguments:
+        name -- unique name of the node
+        function -- function run for the node, returning True if it passed
+        depends_on -- list of names of nodes which have to pass first
+        produces -- list of artifacts the node produces
+        consumes -- list of artifacts the node needs
+        resources -- resource requirements dict of the node, see resource_pool
+        """
+        if name in self._nodes:
+            raise SchedulerError('node "%s" was added twice' %name)
+        self._topological_order = None
+        self._order.append(name)
+        self._nodes[name] = {'function': function,
+                             'depends_on': list(depends_on or []),
+                             'produces': list(produces or []),
+                             'consumes': list(consumes or []),
+                             'resources': resources,
+                             'state': PENDING,
+                             'reason': None,
+                             'ready_time': None,
+                             'start_time': None,
+                             'duration': 0}
+
+    def resolve(self):
+        """Turn the declared dependencies and artifacts into
+        prerequisite and dependent sets, and check for cycles.
+        Raise SchedulerError if the dependencies can not be met.
+        """
+        producers = {}
+        for name in self._order:
+            for artifact in self._nodes[name]['produces']:
+                producers.setdefault(artifact, []).append(name)
+        for name in self._order:
+            node = self._nodes[name]
+            prerequisites = set()
+            for dependency in node['depends_on']:
+                if dependency not in self._nodes:
+                    raise SchedulerError('"%s" depends on unknown "%s"' %(name, dependency))
+                prerequisites.add(dependency)
+            for artifact in node['consumes']:
+                if artifact not in producers:
+                    raise SchedulerError('"%s" consumes artifact "%s" which nothing produces'
+                                         %(name, artifact))
+                prerequisites.update([p for p in producers[artifact] if p != name])
+            node['prerequisites'] = prerequisites
+            node['dependents'] = set()
+        for name in self._order:
+            for prerequisite in self._nodes[name]['prerequisites']:
+                self._nodes[prerequisite]['dependents'].add(name)
+        # topological order, a node left over is part of a cycle
+        self._topological_order = []
+        remaining = dict([(name, len(self._nodes[name]['prerequisites'])) for name in self._order])
+        ready = [name for name in self._order if remaining[name] == 0]
+        while ready:
+            name = ready.pop(0)
+            self._topological_order.append(name)
+            for dependent in sorted(self._nodes[name]['dependents'], key=self._order.index):
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if len(self._topological_order) != len(self._order):
+            cycle = [name for name in self._order if name not in self._topological_order]
+            raise SchedulerError('dependency cycle between %s' %', '.join(cycle))
+
+    def _skip_dependents(self, name, on_skip):
+        """Skip every node that transitively depends on a failed or skipped node
+        """
+        for dependent in sorted(self._nodes[name]['dependents'], key=self._order.index):
+            node = self._nodes[dependent]
+            if node['state'] == PENDING:
+                node['state'] = SKIPPED
+                node['reason'] = name
+                if on_skip is not None:
+                    on_skip(dependent, name)
+                self._skip_dependents(dependent, on_skip)
+
+    def _run_node(self, name):
+        node = self._nodes[name]
+        start_time = timeit.default_timer()
+        try:
+            passed = node['function']()
+        except Exception:
+            passed = False
+        if self.resource_pool is not None:
+            self.resource_pool.release(node['resources'])
+        with self._condition:
+            node['duration'] = timeit.default_timer() - start_time
+            node['state'] = PASSED if passed else FAILED
+            self._condition.notify_all()
+
+    def _ready_nodes(self):
+        return [name for name in self._order
+                if self._nodes[name]['state'] == PENDING
+                and all([self._nodes[p]['state'] == PASSED
+                         for p in self._nodes[name]['prerequisites']])]
+
+    def cancel(self):
+        """Start no more nodes, the running ones are left to finish
+        """
+        with self._condition:
+            self._cancelled = True
+            self._condition.notify_all()
+
+    def run(self, on_skip=None, on_cancel=None):
+        """Run all nodes and return a dict of node name to final state
+
+        Positional arguments:
+        on_skip -- function called with a skipped node's name and
+                   the name of the failed node it depended on
+        on_cancel -- function called with the name of every node
+                     not started because the run was cancelled
+        """
+        if self._topological_order is None:
+            self.resolve()
+        handled = set()
+        if self.resource_pool is not None:
+            self.resource_pool.listen(self._condition)
+        try:
+            with self._condition:
+                while True:
+                    # give up on everything not started yet
+                    if self._cancelled:
+                        for name in self._order:
+                            if self._nodes[name]['state'] == PENDING:
+                                self._nodes[name]['state'] = CANCELLED
+                                if on_cancel is not None:
+                                    on_cancel(name)
+                    # skip the dependents of nodes that finished unsuccessfully
+                    for name in self._order:
+                        if name not in handled and self._nodes[name]['state'] in (FAILED, SKIPPED):
+                            handled.add(name)
+                            self._skip_dependents(name, on_skip)
+                    running = len([name for name in self._order
+                                   if self._nodes[name]['state'] == RUNNING])
+                    ready = self._ready_nodes()
+                    if not ready and running == 0:
+                        break
+                    now = timeit.default_timer()
+                    for name in ready:
+                        if self._nodes[name]['ready_time'] is None:
+                            self._nodes[name]['ready_time'] = now
+                    dispatched = False
+                    for name in ready:
+                        node = self._nodes[name]
+                        if self.max_workers and running >= self.max_workers:
+                            break
+                        if (self.resource_pool is not None
+                            and not self.resource_pool.try_acquire(node['resources'])):
+                            continue
+                        node['state'] = RUNNING
+                        node['start_time'] = timeit.default_timer()
+                        running += 1
+                        dispatched = True
+                        if self.max_workers == 1:
+                            # run in the calling thread
+                            self._condition.release()
+                            try:
+                                self._run_node(name)
+                            finally:
+                                self._condition.acquire()
+                        else:
+                            worker = Thread(target=self._run_node, args=(name,))
+                            worker.daemon = True
+                            worker.start()
+                    if self.max_workers == 1 and dispatched:
+                        continue
+                    # wait for a node to finish or for resources to be released
+                    if running:
+                        self._condition.wait()
+                    else:
+                        self._condition.wait(self.resource_recheck_seconds)
+        finally:
+            if self.resource_pool is not None:
+                self.resource_pool.unlisten(self._condition)
+        return dict([(name, self._nodes[name]['state']) for name in self._order])
+
+    def critical_path(self):
+        """Return the chain of dependent nodes with the longest total
+        duration, which bounds the wall time of the run, and that duration.
+        """
+        longest = {}
+        previous = {}
+        for name in self._topological_order:
+            node = self._nodes[name]
+            best = None
+            for prerequisite in node['prerequisites']:
+                if best is None or longest[prerequisite] > longest[best]:
+                    best = prerequisite
+            longest[name] = node['duration'] + (longest[best] if best is not None else 0)
+            previous[name] = best
+        if not longest:
+            return [], 0
+        end = max(self._topological_order, key=lambda name: longest[name])
+        path = []
+        name = end
+        while name is not None:
+            path.insert(0, name)
+            name = previous[name]
+        return path, longest[end]
+
+    def resource_wait_time(self):
+        """Return the total seconds nodes were ready but waiting for resources or a worker
+        """
+        return sum([node['start_time'] - node['ready_time'] for node in self._nodes.values()
+                    if node['start_time'] is not None and node['ready_time'] is not None])
+
+class SchedulerError(Exception): pass
@@ -1,3 +1,4 @@
+import argparse
 from external_program_test_framework import *
 
 class Bash(ExternalProgramTestSuite):
@@ -57,12 +58,18 @@ class HttpGet(ExternalProgramTestSuite):
         self.check_subprocess("curl", ["http://www.google.com"], 0)     
         
 def main():
+    # e.g. python demo.py --maxfail 2 --profile
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--maxfail', type=int, default=None)
+    parser.add_argument('--profile', action='store_true')
+    args = parser.parse_args()
+    ExternalProgramTestSuite.profile_framework = args.profile
     #ExternalProgramTestSuite.color_output_text = False
     #Dummy(suite_name='dummy1').run()
     Bash(stdout_log_file='run.log', suite_description="Bash Unit Tests", suite_name="Bash")
     HttpGet().run()
     Dummy(suite_description="dummy unit tests", suite_timelimit=1)
-    ExternalProgramTestSuite.run_all()
+    ExternalProgramTestSuite.run_all(maxfail=args.maxfail)
 """
 import xhtml2pdf
 import six
@@ -0,0 +1,303 @@
+#!/usr/bin/python
+# Filename: differential.py
+
+import os
+import timeit
+import subprocess
+from threading import Thread, Lock, Timer
+from assert_variable_type import *
+from nbstream_readerwriter import NonBlockingStreamReaderWriter as NBSRW
+from stdin_feeder import StdinFeeder, StdinFile, open_stdin_source
+from golden_comparator import compile_normalizers, normalize_line
+from log_sink import LogWriter
+from run_subprocess import DRAIN_TIMEOUT, KILL_GRACE, stop_process
+
+class ChunkComparator:
+    """Compare the output lines of two programs as they arrive.
+
+    Lines of the side running ahead are queued until the other side
+    produces its line, so only the lead of one side over the other is
+    held in memory, and nothing is kept after the first divergence.
+    """
+
+    def __init__(self, normalizers=None):
+        """Positional arguments:
+        normalizers -- list of (regex, replacement) tuples applied to
+                       the lines of both sides, see golden_comparator
+        """
+        self._normalizers = compile_normalizers(normalizers)
+        self._lock = Lock()
+        self._pending = {'a': [], 'b': []}
+        self.lines = {'a': 0, 'b': 0}
+        # (line number, line of a, line of b) of the first divergence
+        self.divergence = None
+
+    def feed(self, side, line):
+        """Compare the next line of side "a" or "b"
+        """
+        line = normalize_line(line, self._normalizers)
+        other = 'b' if side == 'a' else 'a'
+        with self._lock:
+            self.lines[side] += 1
+            if self.divergence is not None:
+                return
+            if not self._pending[other]:
+                self._pending[side].append(line)
+                return
+            other_line = self._pending[other].pop(0)
+            if other_line != line:
+                pair = {side: line, other: other_line}
+                self.divergence = (self.lines[side], pair['a'], pair['b'])
+                self._pending = {'a': [], 'b': []}
+
+    def finish(self):
+        """Record a divergence if one side produced more lines, return
+        the divergence or None if the outputs are equal
+        """
+        with self._lock:
+            if self.divergence is None:
+                for side, other in [('a', 'b'), ('b', 'a')]:
+                    if self._pending[side]:
+                        pair = {side: self._pending[side][0], other: None}
+                        self.divergence = (self.lines[other] + 1, pair['a'], pair['b'])
+                        break
+            self._pending = {'a': [], 'b': []}
+            return self.divergence
+
+def _ratio(a, b):
+    if not a:
+        return None
+    return b * 1.0 / a
+
+class ProgramRun:
+    """Result of one side of a differential run
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.returncode = None
+        self.execution_time = None
+        # user and system CPU seconds and maximum resident set size in kilobytes
+        self.user_time = None
+        self.system_time = None
+        self.max_rss = None
+        self.stderr_lines = 0
+
+class DifferentialResult:
+    """Comparison of the runs of two programs on the same input
+    """
+
+    def __init__(self, a, b, divergence, stderr_divergence):
+        self.a = a
+        self.b = b
+        # (line number, line of a, line of b), None for equal output
+        self.divergence = divergence
+        self.stderr_divergence = stderr_divergence
+
+    def same_behavior(self, compare_stderr=False):
+        """Return whether both programs returned the same code and wrote
+        the same, normalized, output
+        """
+        return (self.a.returncode == self.b.returncode
+                and self.divergence is None
+                and (not compare_stderr or self.stderr_divergence is None))
+
+    def time_ratio(self):
+        """Return the wall time of b relative to a"""
+        return _ratio(self.a.execution_time, self.b.execution_time)
+
+    def cpu_ratio(self):
+        """Return the CPU time of b relative to a"""
+        return _ratio(self.a.user_time + self.a.system_time, self.b.user_time + self.b.system_time)
+
+    def rss_ratio(self):
+        """Return the maximum resident set size of b relative to a"""
+        return _ratio(self.a.max_rss, self.b.max_rss)
+
+def _reusable_stdin(stdin):
+    """Raise a ValueError for stdin which can only be read by one program
+    """
+    if stdin is None or isinstance(stdin, (StdinFile, str, bytearray, memoryview, buffer, list, tuple)):
+        return
+    raise ValueError('stdin argument "%s" can only be read once, pass a StdinFile, buffer or list of chunks'
+                     %type(stdin).__name__)
+
+def _log_line(log_file, label, line):
+    """Write a line of one side to the log file both sides share
+    """
+    if isinstance(log_file, LogWriter):
+        log_file.write(label + line)
+    else:
+        with open(log_file, 'a') as f:
+            f.write(label + line)
+
+def _run_side(run, command, stdin, print_process_output,
+              stdout_callback, stderr_callback, processes, process_callback):
+    """Start one program, read its output and reap it with os.wait4 to get
+    its own resource usage, which Popen.wait does not report
+    """
+    popen_stdin, stdin_source = open_stdin_source(stdin)
+    start_time = timeit.default_timer()
+    try:
+        process = subprocess.Popen(command,
+                                   stdin=(subprocess.PIPE if popen_stdin == -1 else popen_stdin),
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   # buffered pipes, unbuffered ones read a byte per syscall
+                                   bufsize=-1)
+    finally:
+        if isinstance(stdin, StdinFile) and popen_stdin is not None:
+            popen_stdin.close()
+    processes.append(process)
+    if process_callback is not None:
+        process_callback(process)
+    stdout_reader = NBSRW(process.stdout, print_process_output, None, stdout_callback, False)
+    stderr_reader = NBSRW(process.stderr, print_process_output, None, stderr_callback, False)
+    feeder = StdinFeeder(process.stdin, stdin_source) if stdin_source is not None else None
+    pid, status, usage = os.wait4(process.pid, 0)
+    run.execution_time = timeit.default_timer() - start_time
+    # Popen must not wait for the reaped process again
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    run.returncode = process.returncode
+    run.user_time = usage.ru_utime
+    run.system_time = usage.ru_stime
+    run.max_rss = usage.ru_maxrss
+    # a grandchild may keep the pipes open after the program exited
+    stdout_reader.join(DRAIN_TIMEOUT)
+    stderr_reader.join(DRAIN_TIMEOUT)
+    if feeder is not None:
+        if feeder.join(DRAIN_TIMEOUT) and feeder.error is not None:
+            raise feeder.error
+
+def compare_programs(command_a, command_b, stdin=None, normalizers=None, timeout=None,
+                     print_process_output=False, stdout_file=None,
+                     stderr_file=None, process_callback=None):
+    """Run two programs at the same time on the same input, compare their
+    output line by line while it arrives and return a DifferentialResult
+
+    Positional arguments:
+    command_a, command_b (list) -- executable and arguments of each program,
+                                   a is the reference, e.g. the production binary
+    stdin -- input of both programs, None, a stdin_feeder.StdinFile, a buffer or a list of chunks
+    normalizers -- list of (regex, replacement) tuples masking volatile output
+    timeout (int/float) -- seconds after which both programs are terminated,
+                           and killed if they have not exited KILL_GRACE seconds later
+    stdout_file, stderr_file -- file or log_sink.LogWriter the output of both
+                                programs is logged to, every line prefixed
+                                with "a: " or "b: "
+    process_callback -- function called with each process right after it was created
+    """
+    assert_variable_type(command_a, list)
+    assert_variable_type(command_b, list)
+    assert_variable_type(timeout, [int, float, NoneType])
+    _reusable_stdin(stdin)
+    stdout_comparator = ChunkComparator(normalizers)
+    stderr_comparator = ChunkComparator(normalizers)
+    runs = {'a': ProgramRun(command_a), 'b': ProgramRun(command_b)}
+    processes = []
+    errors = []
+    def _callback(comparator, log_file, side):
+        label = '%s: ' %side
+        def callback(line):
+            comparator.feed(side, line)
+            if log_file is not None:
+                _log_line(log_file, label, line)
+        return callback
+    def _side(side, command):
+        try:
+            _run_side(runs[side], command, stdin, print_process_output,
+                      _callback(stdout_comparator, stdout_file, side),
+                      _callback(stderr_comparator, stderr_file, side),
+                      processes, process_callback)
+        except Exception as e:
+            errors.append(e)
+            # the other program's result is of no use now
+            _signal(False)
+    threads = [Thread(target=_side, args=('a', command_a)),
+               Thread(target=_side, args=('b', command_b))]
+    timed_out = []
+    killers = []
+    def _signal(kill):
+        for process in processes:
+            if process.returncode is None:
+                try:
+                    if kill:
+                        process.kill()
+                    else:
+                        process.terminate()
+                except OSError:
+                    pass
+    def _terminate():
+        timed_out.append(True)
+        if not [process for process in processes if process.returncode is None]:
+            return
+        _signal(False)
+        # a program ignoring SIGTERM would block os.wait4 forever
+        killer = Timer(KILL_GRACE, _signal, (True,))
+        killer.daemon = True
+        killers.append(killer)
+        killer.start()
+    timer = None
+    if timeout is not None:
+        timer = Timer(timeout, _terminate)
+        timer.daemon = True
+        timer.start()
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # no timer thread may outlive the comparison, it would be
+    # torn down with the interpreter if the program exits next
+    if timer is not None:
+        timer.cancel()
+        timer.join()
+    for killer in killers:
+        killer.cancel()
+        killer.join()
+    for log_file in [stdout_file, stderr_file]:
+        if isinstance(log_file, LogWriter):
+            log_file.close()
+    if errors:
+        # a side may have failed after starting its program
+        for process in processes:
+            if process.returncode is None:
+                stop_process(process)
+        raise errors[0]
+    if timed_out:
+        raise DifferentialTimeout('programs did not complete before %.4f seconds elapsed' %timeout)
+    runs['a'].stderr_lines = stderr_comparator.lines['a']
+    runs['b'].stderr_lines = stderr_comparator.lines['b']
+    return DifferentialResult(runs['a'], runs['b'], stdout_comparator.finish(), stderr_comparator.finish())
+
+def format_comparison_table(rows):
+    """Return the lines of a comparison table of differential checks
+
+    Positional arguments:
+    rows -- list of (check id, DifferentialResult) tuples
+    """
+    header = ('CHECK', 'A SECONDS', 'B SECONDS', 'TIME B/A', 'CPU B/A', 'RSS B/A', 'BEHAVIOR')
+    table = [header]
+    def _format(ratio):
+        return '-' if ratio is None else '%.2f' %ratio
+    for check_id, result in rows:
+        if result is None:
+            table.append((check_id, '-', '-', '-', '-', '-', 'NOT RUN'))
+            continue
+        if result.same_behavior():
+            behavior = 'SAME'
+        elif result.a.returncode != result.b.returncode:
+            behavior = 'RETURN CODE %s -> %s' %(result.a.returncode, result.b.returncode)
+        else:
+            behavior = 'OUTPUT DIFFERS AT LINE %d' %result.divergence[0]
+        table.append((check_id,
+                      '%.4f' %result.a.execution_time,
+                      '%.4f' %result.b.execution_time,
+                      _format(result.time_ratio()),
+                      _format(result.cpu_ratio()),
+                      _format(result.rss_ratio()),
+                      behavior))
+    widths = [max([len(row[i]) for row in table]) for i in range(len(header))]
+    return ['  '.join([value.ljust(width) for value, width in zip(row, widths)]).rstrip() for row in table]
+
+class DifferentialTimeout(Exception): pass
@@ -3,14 +3,17 @@
 
 import sys
 import os
+import re
+import copy
 import shutil
+import time
 import timeit
+from threading import Thread, Lock
 from sets import Set
 
 import inspect
 
 import colorama
-colorama.init()
 from colorama import Fore, Back, Style
 """
 Fore: BLACK, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE, RESET.
@@ -19,7 +22,42 @@ Style: DIM, NORMAL, BRIGHT, RESET_ALL
 """
 from test_case_decorators import *
 from assert_variable_type import *
-from run_subprocess import run_subprocess, TimeoutError
+from run_subprocess import run_subprocess, stop_process, TimeoutError
+from stdin_feeder import StdinFile
+from readiness_probes import *
+from fixture_manager import FixtureManager, FIXTURE_SCOPES
+from dag_scheduler import DagScheduler, SchedulerError
+from resource_pool import ResourcePool
+from case_allocator import CaseAllocator
+from output_matcher import OutputMatcher
+from golden_comparator import GoldenComparator
+from trace_events import Tracer, monotonic_ns
+from framework_profiler import Profiler
+from console_renderer import ConsoleRenderer
+from nbstream_readerwriter import NonBlockingStreamReaderWriter as NBSRW
+from parameter_table import load_rows, row_ids, call_with_row, ResultTable
+from type_validator import compile_validator
+from interactive_session import InteractiveSession, ExpectTimeout, ExpectEOF
+from differential import compare_programs, format_comparison_table, DifferentialTimeout
+
+_validate_suite = compile_validator([('suite_description', [str, NoneType]),
+                                     ('stdout_file', [str, NoneType]),
+                                     ('stderr_file', [str, NoneType]),
+                                     ('overwrite_log_file', bool),
+                                     ('fail_fast', bool),
+                                     ('print_process_output', bool),
+                                     ('log_framework_output', bool),
+                                     ('case_workers', int),
+                                     ('check_retries', int),
+                                     ('suite_timelimit', [int, float, NoneType]),
+                                     ('suite_case_timelimit', [int, float, NoneType]),
+                                     ('suite setup', [MethodType, NoneType]),
+                                     ('suite teardown', [MethodType, NoneType])])
+_validate_test = compile_validator([('description', [str, NoneType]),
+                                    ('name', [str, NoneType]),
+                                    ('timelimit', [int, float, NoneType])])
+_validate_test_functions = compile_validator([('case setup', [FunctionType, MethodType, NoneType]),
+                                              ('case teardown', [FunctionType, MethodType, NoneType])])
 
 class ExternalProgramTestSuite:
     """ A Class for creating Test Suites with
@@ -31,8 +69,69 @@ class ExternalProgramTestSuite:
     _all_log_files = Set()
     _has_run = False
     _framework_output_file = None
+    _num_failures = 0
+    _failures_lock = Lock()
+    _run_all_scheduler = None
+    _history = None
+    _history_lock = Lock()
+    _log_sink = None
+    _log_sink_archive = None
+    # executable replaced by a baseline and a candidate while run_differential runs
+    _differential = None
+    _log_sink_lock = Lock()
+    # number of header decorators of each case function, the
+    # source is scanned once per function instead of once per run
+    _header_decorator_counts = {}
+    _console_initialized = False
     # public static variables
     color_output_text = True
+    # number of suites run_all runs at the same time
+    suite_workers = 1
+    # host capacity shared by the cases of all suites
+    resource_pool = ResourcePool()
+    # number of failed cases after which run_all cancels all remaining work
+    maxfail = None
+    # ids ("suite.case: command arguments") of checks whose
+    # failures are reported but not counted
+    quarantined_checks = set()
+    # SQLite file recording every check result, None to keep no history
+    history_file = None
+    # quarantine checks automatically once this fraction of
+    # their recent results in the history was flaky
+    quarantine_flaky_rate = None
+    # Chrome Trace Event JSON file the phases of the run are written to,
+    # None to record no trace
+    trace_file = None
+    # whether to collect counters and histograms of the framework's
+    # own operations and print an overhead report at the end of the run
+    profile_framework = False
+    # export the run's progress to Prometheus while run_all runs, on a
+    # local HTTP endpoint and/or in a node exporter textfile
+    metrics_port = None
+    metrics_textfile = None
+    metrics_interval = 5
+    # reporters.Reporter objects, e.g. JUnitReporter, JsonLinesReporter
+    # or TapReporter, receiving the check, case and suite results
+    reporters = []
+    # whether to write the console output from a separate thread, in
+    # batches, with rate limited process output grouped by case
+    async_console = False
+    # HTML, or PDF if it ends with .pdf, summary report run_all writes
+    report_file = None
+    # compressed archive, e.g. run.log.gz, replacing the run.log files with
+    # gzip or zstd members indexed by suite, case and check, see log_sink.
+    # A new part is started once a part reaches max_bytes or max_seconds.
+    # {run} is replaced by the run id of history_file, e.g. logs/run-{run}.log.gz,
+    # to keep the archives of previous runs for query_runs. When a history
+    # is kept, an archive without {run} gets the run id before its extension,
+    # so the rows of previous runs never point into an overwritten archive.
+    log_archive = None
+    log_archive_compression = 'gzip'
+    log_archive_max_bytes = None
+    log_archive_max_seconds = None
+    # directory each case's output lines and framework lines are recorded
+    # to, with the time they were read, see stream_timeline
+    timeline_dir = None
     suite_header_color = Fore.MAGENTA
     case_header_color = Fore.CYAN
     suite_result_header_color = Fore.YELLOW
@@ -64,7 +163,18 @@ class ExternalProgramTestSuite:
                                                                           'execution_time': 0,
                                                                           'has_run': False,
                                                                           'pass_threshold': 100,
-                                                                          'passed': False}
+                                                                          'passed': False,
+                                                                          'startup_times': [],
+                                                                          'num_skipped': 0,
+                                                                          'skipped': False,
+                                                                          'critical_path': [],
+                                                                          'resource_wait_time': 0,
+                                                                          'num_not_run': 0,
+                                                                          'not_run': False,
+                                                                          'num_checks_flaky': 0,
+                                                                          'num_checks_quarantined': 0,
+                                                                          'parameter_results': {},
+                                                                          'differential_results': []}
             else:
                 raise ValueError('A suite with the name "%s" already exists. '
                                  'Please rename one of suite classes or pass a unique "suite_name" argument to one or both of the constructors.')
@@ -75,16 +185,41 @@ class ExternalProgramTestSuite:
         """Wrapper over print function to allow writing
         test framework output to file if desired.
         """
+        if not ExternalProgramTestSuite._console_initialized:
+            ExternalProgramTestSuite._init_console()
+        profiling = Profiler.enabled
+        if profiling:
+            Profiler.count('framework lines')
+            start_time = timeit.default_timer()
         # write the print output to the log files
+        timeline = getattr(self, '_timeline', None)
+        if timeline is not None:
+            timeline.stream('framework').record(print_string + "\n")
         if self.log_framework_output:
-            if error and self.stderr_file is not None:
-                with open(self.stderr_file, 'a') as f:
-                    f.write(print_string + "\r\n")
-            elif self.stdout_file is not None:
-                 with open(self.stdout_file, 'a') as f:
-                    f.write(print_string + "\r\n")
+            sink = ExternalProgramTestSuite._get_log_sink()
+            with Tracer.span('log write', 'io'):
+                if sink is not None:
+                    sink.write((self.suite_name, getattr(self, '_name', None), None),
+                               'stderr' if error else 'stdout',
+                               print_string + "\r\n")
+                elif error and self.stderr_file is not None:
+                    with open(self.stderr_file, 'a') as f:
+                        f.write(print_string + "\r\n")
+                elif self.stdout_file is not None:
+                     with open(self.stdout_file, 'a') as f:
+                        f.write(print_string + "\r\n")
+            if profiling:
+                end_time = timeit.default_timer()
+                Profiler.observe('framework log flush', end_time - start_time)
+                start_time = end_time
         # print the output and color appropriately
-        if ExternalProgramTestSuite.color_output_text:
+        renderer = ConsoleRenderer.active
+        if renderer is not None:
+            if ExternalProgramTestSuite.color_output_text:
+                renderer.write(color + print_string + Fore.RESET + Back.RESET + Style.RESET_ALL + "\n")
+            else:
+                renderer.write(print_string + "\r\n", error)
+        elif ExternalProgramTestSuite.color_output_text:
             print(color
                   + print_string
                   + Fore.RESET + Back.RESET + Style.RESET_ALL)
@@ -98,6 +233,8 @@ class ExternalProgramTestSuite:
             else:
                 sys.stdout.write(print_string + "\r\n")
                 sys.stdout.flush()
+        if profiling:
+            Profiler.observe('framework print', timeit.default_timer() - start_time)
         
     def _set_suite_defaults(self):
         """Set the suite variables to their defaults
@@ -106,11 +243,33 @@ class ExternalProgramTestSuite:
         # default suite name and description
         self.suite_name = None        
         self.suite_description = None
-        # number of passed test cases
+        # number of passed and skipped test cases
         self._num_tests_passed = 0
+        self._num_tests_skipped = 0
+        self._num_tests_failed = 0
+        self._num_tests_not_run = 0
+        # number of cases run at the same time,
+        # 0 for as many as the resource pool fits
+        self.case_workers = 1
+        self._case_lock = Lock()
+        # whether to stop the suite as soon as its pass threshold can
+        # no longer be met, and a case at its first failed check
+        self.fail_fast = False
+        self._cancelled = False
+        self._scheduler = None
+        # processes started by the suite's checks
+        self._processes = set()
+        # sub-case name to (case, row index, row, result table)
+        # of the parametrized cases
+        self._sub_cases = {}
         # num checks and failures
         self._total_checks_passed = 0
         self._total_checks = 0        
+        self._total_checks_flaky = 0
+        self._total_checks_quarantined = 0
+        # number of parallel reruns of a failed check,
+        # overridden by the retries case decorator
+        self.check_retries = 0
         # threshold in percentage of tests
         # passed to decide status of suite
         self.suite_pass_threshold = 100
@@ -140,6 +299,9 @@ class ExternalProgramTestSuite:
         """
         # default test case variables
         self._name = None
+        # name of the case function, and the parameter row of a sub-case
+        self._function_name = None
+        self.parameters = None
         # whether to print process output
         # or just write it to the log file
         self.print_case_output = self.print_process_output                      
@@ -150,6 +312,13 @@ class ExternalProgramTestSuite:
         # num checks and failures
         self._num_checks_passed = 0
         self._num_checks = 0
+        self._num_checks_flaky = 0
+        self._num_checks_quarantined = 0
+        # timeline of the case's output, if timeline_dir is set
+        self._timeline = None
+        # retries and quarantine decorators
+        self._case_retries = None
+        self._case_quarantined = False
         # threshold in percentage of checks
         # passed to decide status of case
         self.case_pass_threshold = 100
@@ -161,6 +330,15 @@ class ExternalProgramTestSuite:
         self._fixture = None
         self._case_setup = None
         self._case_teardown = None
+        self._fixture_scope = 'case'
+        self._acquired_fixture = None
+        self.fixture_value = None
+        # daemons started by the case
+        self._daemons = []
+        # interactive sessions started by the case
+        self._sessions = []
+        # ports, working directory and log paths of the case
+        self.allocator = None
 
     def _setup_suite(self, **kwargs):
         """ 
@@ -188,6 +366,8 @@ class ExternalProgramTestSuite:
     def _setup_case(self):
         # if a suite has startted running and the overwrite log file
         # flag was set to True, truncate the log files    
+        if ExternalProgramTestSuite.log_archive is not None:
+            return
         if self.overwrite_log_file and (not ExternalProgramTestSuite._has_run
                                         or len([(x) for x in [self.stdout_file, self.stderr_file]
                                                     if x not in ExternalProgramTestSuite._all_log_files]) > 0):
@@ -197,6 +377,25 @@ class ExternalProgramTestSuite:
                     f.truncate(0)           
     
     def _end_case(self):
+        # stop the daemons started by the case
+        for process in self._daemons:
+            stop_process(process)
+        self._daemons = []
+        # close the interactive sessions
+        for session in self._sessions:
+            session.close()
+        self._sessions = []
+        # forget the finished processes
+        self._processes.difference_update([p for p in list(self._processes) if p.poll() is not None])
+        # free the case's ports and working directory
+        if self.allocator is not None:
+            self.allocator.release()
+        # release a shared fixture, it is torn down at the end of its scope
+        if self._acquired_fixture is not None:
+            for error in FixtureManager.release(*self._acquired_fixture):
+                self.log(error, True, Fore.RED)
+            self._acquired_fixture = None
+            return
         # call fixture teardown if set
         if self._case_teardown is not None:
             if isinstance(self._case_teardown, MethodType):
@@ -204,36 +403,23 @@ class ExternalProgramTestSuite:
             else:
                 self._case_teardown() 
 
-    def _validate_argument(self, argument, types):
-        key = argument.keys()[0]     
-        valid, message = assert_variable_type(argument[key], types, False)
-        if not valid:
-            self._invalid_args.append("%s: %s" %(key, message))
-
     def _validate_suite_arguments(self):
         """ 
         Validate test suite argument types
         """
-        # reset invalid args list 
-        self._invalid_args = []
-        #string        
-        string_vars = [{"suite_description": self.suite_description},
-                       {"stdout_file": self.stdout_file},
-                       {"stderr_file": self.stderr_file}]
-        [self._validate_argument(x, [str, NoneType]) for x in string_vars]
-        # bool
-        bool_vars = [{"overwrite_log_file": self.overwrite_log_file},
-                     {"print_process_output": self.print_process_output},
-                     {"log_framework_output": self.log_framework_output}]
-        [self._validate_argument(x, bool) for x in bool_vars]
-        # float
-        float_vars = [{"suite_timelimit": self.suite_timelimit},
-                      {"suite_case_timelimit": self.suite_case_timelimit}]
-        [self._validate_argument(x, [int, float, NoneType]) for x in float_vars]
-        # functions
-        function_vars = [{"suite setup": self._suite_setup},
-                         {"suite teardown": self._suite_teardown}]
-        [self._validate_argument(x, [MethodType, NoneType]) for x in function_vars]
+        self._invalid_args = _validate_suite.errors(self.suite_description,
+                                                    self.stdout_file,
+                                                    self.stderr_file,
+                                                    self.overwrite_log_file,
+                                                    self.fail_fast,
+                                                    self.print_process_output,
+                                                    self.log_framework_output,
+                                                    self.case_workers,
+                                                    self.check_retries,
+                                                    self.suite_timelimit,
+                                                    self.suite_case_timelimit,
+                                                    self._suite_setup,
+                                                    self._suite_teardown)
         # raise exception if any invalid args
         if len(self._invalid_args) > 0:
             raise InvalidArgument(('\r\n').join(self._invalid_args))
@@ -242,25 +428,22 @@ class ExternalProgramTestSuite:
         """ 
         Validate test case argument types
         """
-        # reset invalid args list 
-        self._invalid_args = []
-        #string
-        string_vars = [{'description': self._description},
-                       {'name': self._name}]
-        [self._validate_argument(x, [str, NoneType]) for x in string_vars]        
-        # float
-        float_vars = [{'timelimit': self._timelimit}]
-        [self._validate_argument(x, [int, float, NoneType]) for x in float_vars]
+        self._invalid_args = _validate_test.errors(self._description,
+                                                   self._name,
+                                                   self._timelimit)
         # fixture
+        if self._fixture_scope not in FIXTURE_SCOPES:
+            self._invalid_args.append('fixture scope: "%s" is not one of %s'
+                                      %(self._fixture_scope, ', '.join(FIXTURE_SCOPES)))
         try:
-            if self._fixture is not None:
+            # shared fixtures are started by the fixture manager
+            if self._fixture is not None and self._fixture_scope == 'case':
                 self._case_setup, self._case_teardown = self._fixture()
         except Exception:
             self._invalid_args.append('a proper fixture returning a setup and teardown function was not provided')        
         # functions (fixture override)
-        function_vars = [{'case setup': self._case_setup},
-                         {'case teardown': self._case_teardown}]
-        [self._validate_argument(x, [FunctionType, MethodType, NoneType]) for x in function_vars]
+        self._invalid_args += _validate_test_functions.errors(self._case_setup,
+                                                              self._case_teardown)
         # raise exception if any invalid args
         if len(self._invalid_args) > 0:
             raise InvalidArgument(('\r\n').join(self._invalid_args))        
@@ -271,6 +454,36 @@ class ExternalProgramTestSuite:
         """
         # capture start time
         suite_start_time = timeit.default_timer()  
+        # record a trace of a suite run on its own
+        standalone_trace = (ExternalProgramTestSuite.trace_file is not None
+                            and ExternalProgramTestSuite._run_all_scheduler is None)
+        if standalone_trace:
+            Tracer.start()
+        standalone_profile = (ExternalProgramTestSuite.profile_framework
+                              and ExternalProgramTestSuite._run_all_scheduler is None)
+        if standalone_profile:
+            Profiler.start()
+        standalone_console = (ExternalProgramTestSuite.async_console
+                              and ConsoleRenderer.active is None)
+        if standalone_console:
+            ConsoleRenderer().start()
+        # stop them also when the suite raises SuiteError
+        try:
+            self._run_suite(suite_name, suite_start_time)
+        finally:
+            if standalone_trace:
+                Tracer.stop()
+                Tracer.export(ExternalProgramTestSuite.trace_file)
+            if standalone_profile:
+                Profiler.stop()
+                for line in Profiler.report():
+                    self.log(line)
+            if standalone_console:
+                ConsoleRenderer.active.stop()
+
+    def _run_suite(self, suite_name, suite_start_time):
+        # the clock is only read when tracing
+        suite_start_ns = monotonic_ns() if Tracer.enabled else None
         # setup suite
         if suite_name is None:
             suite_name = self.suite_name
@@ -282,42 +495,74 @@ class ExternalProgramTestSuite:
             ExternalProgramTestSuite._test_suites[self.suite_name]['has_run'] = True
             raise SuiteError('Error in test suite "%s" [%s] %s'
                              %(suite_name, type(e).__name__, e))        
-        # run all the test cases
-        for index, case in enumerate(sorted(self.test_cases)):
-            self.test_case = getattr(self, case)
-            if not self.test_case:
-                raise Exception("Test Case %s does not exist" % str(self.test_case))
+        # schedule the test cases after the cases they depend on
+        try:
+            scheduler = DagScheduler(self.case_workers, ExternalProgramTestSuite.resource_pool)
+            self._scheduler = scheduler
+            self._cancelled = False
+            self._expand_parameters()
+            for case in self.test_cases:
+                function = self._case_function(case)
+                scheduler.add(case,
+                              lambda case=case: self._run_case(case),
+                              self._case_dependencies(case),
+                              getattr(function, '_produces', None),
+                              getattr(function, '_consumes', None),
+                              getattr(function, '_resources', None))
+            scheduler.resolve()
+        except Exception as e:
+            ExternalProgramTestSuite._test_suites[self.suite_name]['has_run'] = True
+            raise SuiteError('Error in test suite "%s" [%s] %s'
+                             %(suite_name, type(e).__name__, e))
+        if len(self.test_cases) > 0:
             # reset the default suite/case variables
+            # and truncate the log files before the first output
             self._set_case_defaults()
-            # set test case name to case
-            self._name = case            
-            # suite setup routine        
             self._setup_case()
             # print test suite name and descripion if any
-            # and if first loop through cases              
-            if index == 0: 
-                self.log("=" * ExternalProgramTestSuite._num_formatting_chars)
-                self.log("TEST SUITE: %s" %suite_name,
-                         False,
-                         ExternalProgramTestSuite.suite_header_color)
-                if self.suite_description:
-                    self.log("Description: %s" %(self.suite_description))
-                    ExternalProgramTestSuite._test_suites[suite_name]['description'] = self.suite_description
-                # call suite setup function if set
-                if self._suite_setup is not None:
-                    self._suite_setup()         
-            # run the test case
-            try:             
-                self._run_test_case()                              
-            except Exception as e:
-                self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
-            # set has_run flags
+            self.log("=" * ExternalProgramTestSuite._num_formatting_chars)
+            self.log("TEST SUITE: %s" %suite_name,
+                     False,
+                     ExternalProgramTestSuite.suite_header_color)
+            if self.suite_description:
+                self.log("Description: %s" %(self.suite_description))
+                ExternalProgramTestSuite._test_suites[suite_name]['description'] = self.suite_description
             ExternalProgramTestSuite._has_run = True
-            # set suite attributes for static _test_suites list
-            ExternalProgramTestSuite._test_suites[self.suite_name]['has_run'] = True
-            ExternalProgramTestSuite._test_suites[self.suite_name]['pass_threshold'] = self.suite_pass_threshold
-            # end case routine
-            self._end_case()
+            ExternalProgramTestSuite._report('suite_started', suite_name)
+            # call suite setup function if set
+            if self._suite_setup is not None:
+                with Tracer.span('suite setup', 'suite', suite=suite_name):
+                    self._suite_setup()
+        # run_all may have reached maxfail while the suite was starting
+        if ExternalProgramTestSuite._maxfail_reached():
+            self._cancel('maxfail of %d failed cases reached' %ExternalProgramTestSuite.maxfail)
+        # run all the test cases
+        scheduler.run(self._skip_case, self._cancel_case)
+        self._scheduler = None
+        # time cases spent waiting for resources counts towards the
+        # suite time limit but not towards the cases' time limits
+        ExternalProgramTestSuite._test_suites[self.suite_name]['resource_wait_time'] = scheduler.resource_wait_time()
+        # report the chain of cases bounding the suite's wall time
+        if self.case_workers != 1 or [case for case in self.test_cases
+                                     if hasattr(self._case_function(case), '_depends_on')
+                                     or hasattr(self._case_function(case), '_consumes')]:
+            path, path_time = scheduler.critical_path()
+            ExternalProgramTestSuite._test_suites[self.suite_name]['critical_path'] = path
+            self.log("CRITICAL PATH: %s in %.4f seconds" %(' -> '.join(path), path_time))
+        # summarize the sub-cases of each parametrized case
+        for case, table in sorted(ExternalProgramTestSuite._test_suites[self.suite_name]['parameter_results'].items()):
+            self.log("PARAMETRIZED %s: %d/%d sub-cases passed in %.4f seconds"
+                     %(case, table.num_passed(), len(table), table.total_time()),
+                     table.num_passed() != len(table),
+                     Fore.GREEN if table.num_passed() == len(table) else Fore.RED)
+            failed = table.failed()
+            if failed:
+                self.log("FAILED: %s" %', '.join(failed), True, Fore.RED)
+        # tear down the fixtures shared by the suite's cases
+        with Tracer.span('fixture teardown', 'fixture', scope='suite'):
+            errors = FixtureManager.teardown_scope('suite', self.suite_name)
+        for error in errors:
+            self.log(error, True, Fore.RED)
         # capture suite end time
         suite_end_time = timeit.default_timer() 
         suite_time_taken = suite_end_time - suite_start_time
@@ -335,13 +580,241 @@ class ExternalProgramTestSuite:
             self._total_checks += 1                            
         # call suite teardown function if set
         if self._suite_teardown is not None:
-            self._suite_teardown()            
+            with Tracer.span('suite teardown', 'suite', suite=suite_name):
+                self._suite_teardown()            
         # print test result
         self._print_suite_results()       
+        if ExternalProgramTestSuite._log_sink is not None:
+            ExternalProgramTestSuite._log_sink.flush(self.suite_name)
+        if suite_start_ns is not None:
+            Tracer.complete('suite', 'suite', suite_start_ns, monotonic_ns(), {'suite': suite_name})
+
+    def _expand_parameters(self):
+        """
+        Replace each parametrized case in the test case list
+        by its sub-cases, in row order
+        """
+        self._sub_cases = {}
+        parameter_results = {}
+        module_directory = os.path.dirname(os.path.abspath(inspect.getmodule(self.__class__).__file__))
+        test_cases = []
+        for case in sorted(self.test_cases):
+            function = self.__class__.__dict__[case]
+            if not hasattr(function, '_parameters'):
+                test_cases.append(case)
+                continue
+            rows = load_rows(function._parameters, module_directory)
+            table = ResultTable(case)
+            for index, row_id in enumerate(row_ids(rows, function._parameter_ids)):
+                sub_case = '%s[%s]' %(case, row_id)
+                if sub_case in self._sub_cases:
+                    raise ValueError('parameter id "%s" of case "%s" is not unique' %(row_id, case))
+                self._sub_cases[sub_case] = (case, index, rows[index], table)
+                test_cases.append(sub_case)
+            parameter_results[case] = table
+        self.test_cases = test_cases
+        ExternalProgramTestSuite._test_suites[self.suite_name]['parameter_results'] = parameter_results
+
+    def _case_function(self, case):
+        """
+        Return the function of a test case or sub-case
+        """
+        if case in self._sub_cases:
+            case = self._sub_cases[case][0]
+        return self.__class__.__dict__[case]
+
+    def _case_dependencies(self, case):
+        """
+        Return the cases a test case depends on, a dependency
+        on a parametrized case is one on all of its sub-cases
+        """
+        depends_on = []
+        for dependency in getattr(self._case_function(case), '_depends_on', []):
+            sub_cases = [x for x in self.test_cases
+                         if x in self._sub_cases and self._sub_cases[x][0] == dependency]
+            depends_on += sub_cases or [dependency]
+        return depends_on
+
+    def _run_case(self, case):
+        """
+        Run a test case and return whether it passed. When cases run
+        concurrently each case runs on its own copy of the suite and
+        its results are added to the suite's afterwards.
+        """
+        if self.case_workers != 1:
+            suite = copy.copy(self)
+            suite._num_tests_passed = 0
+            suite._total_checks = 0
+            suite._total_checks_passed = 0
+            suite._total_checks_flaky = 0
+            suite._total_checks_quarantined = 0
+        else:
+            suite = self
+        # keep the case's console output together
+        ConsoleRenderer.set_group('%s.%s' %(self.suite_name, case))
+        try:
+            return self._run_case_as(suite, case)
+        finally:
+            ConsoleRenderer.end_group()
+
+    def _run_case_as(self, suite, case):
+        """
+        Run a test case on the given suite or copy of the suite
+        """
+        function_name = self._sub_cases[case][0] if case in self._sub_cases else case
+        method = getattr(suite, function_name)
+        if not method:
+            raise Exception("Test Case %s does not exist" % str(method))
+        # reset the default suite/case variables
+        suite._set_case_defaults()
+        # set test case name to case
+        suite._name = case
+        suite._function_name = function_name
+        if case in self._sub_cases:
+            suite.parameters = self._sub_cases[case][2]
+            suite.test_case = lambda: call_with_row(method, suite.parameters)
+        else:
+            suite.test_case = method
+        suite._case_retries = getattr(method, '_retries', None)
+        suite._case_quarantined = getattr(method, '_quarantined', False)
+        suite.allocator = CaseAllocator('%s.%s' %(self.suite_name, case))
+        if ExternalProgramTestSuite.timeline_dir is not None:
+            suite._timeline = ExternalProgramTestSuite._open_timeline(self.suite_name, case)
+        # suite setup routine
+        suite._setup_case()
+        # run the test case
+        passed = False
+        start_time = timeit.default_timer()
+        start_ns = monotonic_ns() if Tracer.enabled else None
+        try:
+            passed = suite._run_test_case()
+        except Exception as e:
+            suite.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        if case in self._sub_cases:
+            index, table = self._sub_cases[case][1], self._sub_cases[case][3]
+            table.append(case, index, passed, suite._num_checks, suite._num_checks_passed,
+                         timeit.default_timer() - start_time)
+        # set has_run flags
+        ExternalProgramTestSuite._has_run = True
+        # set suite attributes for static _test_suites list
+        ExternalProgramTestSuite._test_suites[self.suite_name]['has_run'] = True
+        ExternalProgramTestSuite._test_suites[self.suite_name]['pass_threshold'] = self.suite_pass_threshold
+        # end case routine
+        try:
+            with Tracer.span('case teardown', 'case', case=case):
+                suite._end_case()
+        except Exception as e:
+            suite.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        if start_ns is not None:
+            Tracer.complete('case', 'case', start_ns, monotonic_ns(),
+                            {'suite': self.suite_name, 'case': case, 'passed': passed})
+        # write the case's archived output as members
+        if ExternalProgramTestSuite._log_sink is not None:
+            ExternalProgramTestSuite._log_sink.flush(self.suite_name, case)
+        case_time = timeit.default_timer() - start_time
+        ExternalProgramTestSuite._report('case_finished',
+                                         self.suite_name,
+                                         case,
+                                         'passed' if passed else 'failed',
+                                         suite._num_checks,
+                                         suite._num_checks_passed,
+                                         case_time)
+        ExternalProgramTestSuite._record_case_history(self.suite_name, case, passed, case_time)
+        if suite._timeline is not None:
+            suite._timeline.close()
+            suite._timeline = None
+        with self._case_lock:
+            if suite is not self:
+                self._num_tests_passed += suite._num_tests_passed
+                self._total_checks += suite._total_checks
+                self._total_checks_passed += suite._total_checks_passed
+                self._total_checks_flaky += suite._total_checks_flaky
+                self._total_checks_quarantined += suite._total_checks_quarantined
+            if not passed:
+                self._num_tests_failed += 1
+        if not passed:
+            with ExternalProgramTestSuite._failures_lock:
+                ExternalProgramTestSuite._num_failures += 1
+            # stop early when the outcome is already decided
+            if ExternalProgramTestSuite._maxfail_reached():
+                ExternalProgramTestSuite._cancel_all('maxfail of %d failed cases reached'
+                                                    %ExternalProgramTestSuite.maxfail)
+            elif self.fail_fast and self._threshold_unreachable():
+                self._cancel('suite pass threshold of %.2f%% can no longer be met'
+                             %self.suite_pass_threshold)
+        return passed
+
+    def _threshold_unreachable(self):
+        """
+        Return True if too many cases failed or were skipped
+        for the suite to meet its pass threshold
+        """
+        num_tests = len(self.test_cases)
+        if num_tests == 0:
+            return False
+        with self._case_lock:
+            max_passed = num_tests - self._num_tests_failed - self._num_tests_skipped
+        return max_passed * 100.0 / num_tests < self.suite_pass_threshold
+
+    def _cancel(self, reason):
+        """
+        Start no more cases of the suite and kill the processes still running
+        """
+        with self._case_lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+        self.log("CANCELLED: %s" %reason, True, Fore.RED)
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+        for process in list(self._processes):
+            if process.poll() is None:
+                process.terminate()
+
+    def _cancel_case(self, case):
+        """
+        Report a test case which is not run because the suite was cancelled
+        """
+        self.log("CASE NOT RUN: %s" %case, True, Fore.YELLOW)
+        with self._case_lock:
+            self._num_tests_not_run += 1
+        ExternalProgramTestSuite._report('case_finished', self.suite_name, case, 'not_run', 0, 0, 0)
+
+    @staticmethod
+    def _maxfail_reached():
+        return (ExternalProgramTestSuite.maxfail is not None
+                and ExternalProgramTestSuite._num_failures >= ExternalProgramTestSuite.maxfail)
+
+    @staticmethod
+    def _cancel_all(reason):
+        """
+        Cancel the suites running and stop run_all from starting more
+        """
+        if ExternalProgramTestSuite._run_all_scheduler is not None:
+            ExternalProgramTestSuite._run_all_scheduler.cancel()
+        for properties in ExternalProgramTestSuite._test_suites.values():
+            if properties['self']._scheduler is not None:
+                properties['self']._cancel(reason)
+
+    def _skip_case(self, case, dependency):
+        """
+        Report a test case which is not run because a case it depends on did not pass
+        """
+        self.log("-" * ExternalProgramTestSuite._num_formatting_chars)
+        self.log("CASE SKIPPED: %s (depends on %s which did not pass)" %(case, dependency),
+                 True,
+                 Fore.YELLOW)
+        with self._case_lock:
+            self._num_tests_skipped += 1
+        ExternalProgramTestSuite._report('case_finished', self.suite_name, case, 'skipped', 0, 0, 0)
 
     def case_header(self):
         """ Test case header output 
         """  
+        with Tracer.span('case header', 'case', case=self._name):
+            self._case_header()
+
+    def _case_header(self):
         # print case name
         self.log("-" * ExternalProgramTestSuite._num_formatting_chars)
         self.log("CASE: %s" %self._name,
@@ -356,12 +829,22 @@ class ExternalProgramTestSuite:
             self._validate_test_arguments()
         except Exception as e:
             self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        # start or join a shared fixture
+        if self._fixture is not None and self._fixture_scope in ['suite', 'session']:
+            scope_key = self.suite_name if self._fixture_scope == 'suite' else None
+            with Tracer.span('fixture setup', 'fixture', scope=self._fixture_scope):
+                self.fixture_value = FixtureManager.acquire(self._fixture,
+                                                            self._fixture_scope,
+                                                            scope_key,
+                                                            self)
+            self._acquired_fixture = (self._fixture, self._fixture_scope, scope_key)
         # call fixture setup if set
-        if self._case_setup is not None:
-            if isinstance(self._case_setup, MethodType):
-                self._case_setup(self)
-            else:
-                self._case_setup()                             
+        elif self._case_setup is not None:
+            with Tracer.span('fixture setup', 'fixture', scope='case'):
+                if isinstance(self._case_setup, MethodType):
+                    self.fixture_value = self._case_setup(self)
+                else:
+                    self.fixture_value = self._case_setup()                             
 
     def _run_test_case(self):
         """
@@ -369,30 +852,45 @@ class ExternalProgramTestSuite:
         """
         # read source file to see decorators and
         # call case_header at the right time
-        test_function = self._name
+        test_function = self._function_name or self._name
         suite_class =  str(self.__class__).rpartition('.')[2]
-        lines = []
-        save_lines = False
-        with open(inspect.getmodule(self.__class__).__file__) as f:
-            for line in f:
-                if suite_class in line:
-                    save_lines = True
-                if save_lines and test_function in line:
-                    break
-                if save_lines and 'def ' in line:
-                    lines = []
-                if (save_lines
-                    and len(line.strip()) > 0
-                    and line.strip()[0] == "@"):
-                    lines.append(line.strip().rpartition('(')[0])
+        key = (self.__class__, test_function)
+        if key not in ExternalProgramTestSuite._header_decorator_counts:
+            scan_start_time = timeit.default_timer()
+            lines = []
+            save_lines = False
+            with open(inspect.getmodule(self.__class__).__file__) as f:
+                for line in f:
+                    if suite_class in line:
+                        save_lines = True
+                    if save_lines and test_function in line:
+                        break
+                    if save_lines and 'def ' in line:
+                        lines = []
+                    if (save_lines
+                        and len(line.strip()) > 0
+                        and line.strip()[0] == "@"
+                        and line.strip().partition('(')[0] in HEADER_DECORATORS):
+                        lines.append(line.strip().partition('(')[0])
+            ExternalProgramTestSuite._header_decorator_counts[key] = len(lines)
+            if Profiler.enabled:
+                Profiler.observe('decorator scan', timeit.default_timer() - scan_start_time)
+        elif Profiler.enabled:
+            Profiler.count('decorator scans cached')
         # semaphore to wait for calling
         # case_header after all decorators
-        self._wait_sem = len(lines)
+        self._wait_sem = ExternalProgramTestSuite._header_decorator_counts[key]
         # if semaphor is 0 print case header immediately
         if self._wait_sem == 0:
             self.case_header()            
         # run test case
-        execution_time = timeit.timeit(self.test_case, number=1)        
+        start_time = timeit.default_timer()
+        try:
+            with Tracer.span('case body', 'case', case=self._name):
+                self.test_case()
+        except CaseAborted as e:
+            self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        execution_time = timeit.default_timer() - start_time
         # if a timelimit was set
         # check if it was met
         if self._timelimit is not None:
@@ -402,6 +900,12 @@ class ExternalProgramTestSuite:
             else:
                 self.log('CHECK FAIL: test did not complete before time limit of %.4f' %self._timelimit, True, Back.RED)
             self._num_checks += 1         
+            ExternalProgramTestSuite._report('check_finished',
+                                             self.suite_name,
+                                             self._name,
+                                             '%s.%s: timelimit %.4f' %(self.suite_name, self._name, self._timelimit),
+                                             execution_time <= self._timelimit,
+                                             execution_time)
         # print pass/fail, execution time
         if self._num_checks > 0:
             percentage_passed = (self._num_checks_passed * 1.0 / self._num_checks) * 100
@@ -418,13 +922,22 @@ class ExternalProgramTestSuite:
                 output_string += " with %.2f%% threshold" % self.case_pass_threshold
             self.log(output_string, False, Back.GREEN)
             self._num_tests_passed += 1
+            passed = True
         else:
             output_string += " TEST FAIL"
             self.log(output_string, False, Back.RED)
+            passed = False
         self._total_checks += self._num_checks
         self._total_checks_passed += self._num_checks_passed                   
+        self._total_checks_flaky += self._num_checks_flaky
+        self._total_checks_quarantined += self._num_checks_quarantined
+        return passed
 
     def _print_suite_results(self):
+        with Tracer.span('report', 'report', suite=self.suite_name):
+            self._write_suite_results()
+
+    def _write_suite_results(self):
         self.log( "*" * ExternalProgramTestSuite._num_formatting_chars)    
         self.log("SUITE RESULT",
                  False,
@@ -435,9 +948,16 @@ class ExternalProgramTestSuite:
         # add test result to class static suite list
         ExternalProgramTestSuite._test_suites[self.suite_name]['num_tests'] = len(self.test_cases)
         ExternalProgramTestSuite._test_suites[self.suite_name]['num_passed'] = self._num_tests_passed
+        ExternalProgramTestSuite._test_suites[self.suite_name]['num_skipped'] = self._num_tests_skipped
+        ExternalProgramTestSuite._test_suites[self.suite_name]['num_not_run'] = self._num_tests_not_run
         ExternalProgramTestSuite._test_suites[self.suite_name]['passed'] = passed
         ExternalProgramTestSuite._test_suites[self.suite_name]['num_checks'] = self._total_checks
         ExternalProgramTestSuite._test_suites[self.suite_name]['num_checks_passed'] = self._total_checks_passed               
+        ExternalProgramTestSuite._test_suites[self.suite_name]['num_checks_flaky'] = self._total_checks_flaky
+        ExternalProgramTestSuite._test_suites[self.suite_name]['num_checks_quarantined'] = self._total_checks_quarantined
+        ExternalProgramTestSuite._report('suite_finished',
+                                         self.suite_name,
+                                         ExternalProgramTestSuite._test_suites[self.suite_name])
 
     def _print_info_and_status(self, suite_name=""):
         num_tests = len(self.test_cases)
@@ -460,6 +980,14 @@ class ExternalProgramTestSuite:
                                self._total_checks,
                                percentage_checks_passed,
                                ExternalProgramTestSuite._test_suites[self.suite_name]['execution_time']))
+            if self._num_tests_skipped > 0:
+                output_string += " (%d SKIPPED)" % self._num_tests_skipped
+            if self._num_tests_not_run > 0:
+                output_string += " (%d NOT RUN)" % self._num_tests_not_run
+            if self._total_checks_flaky > 0:
+                output_string += " (%d FLAKY)" % self._total_checks_flaky
+            if self._total_checks_quarantined > 0:
+                output_string += " (%d QUARANTINED)" % self._total_checks_quarantined
             if percentage_tests_passed >= self.suite_pass_threshold and self._suite_timelimit_met:
                 output_string += " OK"
                 if self.suite_pass_threshold != 100:
@@ -473,6 +1001,101 @@ class ExternalProgramTestSuite:
             self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
         return passed           
 
+    def _record_check(self, passed, flaky=False, quarantined=False,
+                      check_id=None, execution_time=None, messages=None):
+        """Count a check of the current case and pass it to the reporters.
+        In fail fast mode a failed check stops the case if its pass
+        threshold can no longer be met. A failed quarantined check is
+        only counted as quarantined.
+        """
+        ExternalProgramTestSuite._report('check_finished',
+                                         self.suite_name,
+                                         self._name,
+                                         check_id,
+                                         passed,
+                                         execution_time,
+                                         messages,
+                                         flaky,
+                                         quarantined)
+        if quarantined and not passed:
+            self._num_checks_quarantined += 1
+            return
+        if flaky:
+            self._num_checks_flaky += 1
+        self._num_checks += 1
+        if passed:
+            self._num_checks_passed += 1
+        elif self.fail_fast and self.case_pass_threshold >= 100:
+            raise CaseAborted('check failed and the case pass threshold of %.2f%% can no longer be met'
+                              %self.case_pass_threshold)
+
+    def _check_id(self, executable_command, command_arguments):
+        """Return the id of a check, "suite.case: command arguments",
+        made before the templates are expanded so it is the same every run
+        """
+        return '%s.%s: %s' %(self.suite_name,
+                             self._name,
+                             ' '.join([str(x) for x in [executable_command] + list(command_arguments)]))
+
+    @staticmethod
+    def _report(event, *args):
+        """Pass an event to every reporter, a reporter failing
+        to write its report does not stop the run
+        """
+        for reporter in ExternalProgramTestSuite.reporters:
+            try:
+                getattr(reporter, event)(*args)
+            except (IOError, OSError, ValueError) as e:
+                ExternalProgramTestSuite._print(Fore.RED
+                                                + '[%s] %s reporter: %s' %(type(e).__name__, type(reporter).__name__, e)
+                                                + Fore.RESET + Back.RESET + Style.RESET_ALL)
+
+    @staticmethod
+    def _init_console():
+        """Let colorama wrap stdout and stderr before the first output, and
+        only when stdout is a terminal, so that importing the framework has
+        no side effects and piped output is left alone
+        """
+        ExternalProgramTestSuite._console_initialized = True
+        isatty = getattr(sys.stdout, 'isatty', None)
+        if ExternalProgramTestSuite.color_output_text and isatty is not None and isatty():
+            colorama.init()
+
+    @staticmethod
+    def _print(text):
+        """Print text outside of a suite, through the console renderer if one is running
+        """
+        if not ExternalProgramTestSuite._console_initialized:
+            ExternalProgramTestSuite._init_console()
+        if ConsoleRenderer.active is not None:
+            ConsoleRenderer.active.write(text + "\n")
+        else:
+            print(text)
+
+    def expand_templates(self, arguments):
+        """Replace the {port}, {port:name}, {workdir}, {log} and {log:name}
+        templates in a list of arguments with the case's allocations,
+        see case_allocator. Nested lists are expanded as well.
+        """
+        if getattr(self, 'allocator', None) is None:
+            self.allocator = CaseAllocator('%s.%s' %(self.suite_name, getattr(self, '_name', None)))
+        return self.allocator.expand(arguments)
+
+    def _archive_destinations(self, check_id, stdout_file, stderr_file):
+        """Return the log destinations of a check's output streams, the
+        log archive's writers in place of no file or the suite's log files
+        when a log archive is kept
+        """
+        sink = ExternalProgramTestSuite._get_log_sink()
+        if sink is None:
+            return stdout_file, stderr_file
+        key = (self.suite_name, self._name, check_id)
+        if stdout_file is None or stdout_file == self.stdout_file:
+            stdout_file = sink.writer(key, 'stdout')
+        if stderr_file is None or stderr_file == self.stderr_file:
+            stderr_file = sink.writer(key, 'stderr')
+        return stdout_file, stderr_file
+
     def check_subprocess(self,
                          executable_command,
                          command_arguments,
@@ -481,49 +1104,804 @@ class ExternalProgramTestSuite:
                          print_process_output = True,
                          stdout_file = None,
                          stderr_file = None,
-                         poll_seconds=.100):
+                         poll_seconds=.100,
+                         stdin = None,
+                         expect_stdout = None,
+                         expect_stderr = None,
+                         forbid_stdout = None,
+                         forbid_stderr = None,
+                         ordered = False,
+                         kill_on_forbidden = False,
+                         retries = None,
+                         pty = False):
+        """Run an external program and check its return code and,
+        optionally, its output. The output checks are evaluated line by
+        line as the output arrives so the output is never held in memory.
+
+        expect_stdout/expect_stderr -- lists of regexes, or (regex, min_count[, max_count])
+                                       tuples, which must match the stream's lines
+        forbid_stdout/forbid_stderr -- lists of regexes which must not match any line
+        ordered (bool) -- whether the expected patterns must first match in list order
+        kill_on_forbidden (bool) -- whether to terminate the process as soon as
+                                    a forbidden pattern matches
+        retries (int) -- number of reruns started in parallel when the check
+                         fails, overrides the retries case decorator and the
+                         check_retries suite variable. The check is flaky if
+                         any rerun passes. Every rerun gets ports and a working
+                         directory of its own and does not write the log files.
+        pty (bool) -- whether to run the program on a pseudo-terminal, with the
+                      ANSI escape sequences removed from its output. stdout and
+                      stderr then share the terminal, so both the stdout and
+                      stderr patterns are matched against all output lines.
+        """
+        start_ns = monotonic_ns() if Tracer.enabled else None
+        check_id = self._check_id(executable_command, command_arguments)
+        # run_differential compares the baseline and candidate instead
+        differential = ExternalProgramTestSuite._differential
+        if differential is not None and executable_command == differential['executable']:
+            self._check_differential(check_id, differential['baseline'], differential['candidate'],
+                                     command_arguments, None, differential['normalizers'], timeout,
+                                     stdin, False, None, print_process_output, stdout_file, stderr_file)
+            return
+        # reruns fill in ports and a working directory of their own
+        templates = [executable_command, command_arguments]
+        # fill in the case's ports, working directory and log paths
+        executable_command, command_arguments, stdout_file, stderr_file = self.expand_templates(
+            [executable_command, command_arguments, stdout_file, stderr_file])
+        stdout_file, stderr_file = self._archive_destinations(check_id, stdout_file, stderr_file)
+        run_arguments = [executable_command, command_arguments, expected_returncode, timeout,
+                         stdin, expect_stdout, expect_stderr, forbid_stdout, forbid_stderr,
+                         ordered, kill_on_forbidden, pty]
+        if self._timeline is not None:
+            self._timeline.stream('framework').record('CHECK: %s\n' %check_id)
+        passed, execution_time, messages = self._run_output_check(print_process_output,
+                                                                  stdout_file,
+                                                                  stderr_file,
+                                                                  poll_seconds,
+                                                                  *run_arguments,
+                                                                  timeline=self._timeline)
+        for message in messages:
+            self.log(message, True, Fore.RED)
+        # rerun a failed check to tell flaky failures from consistent ones
+        if retries is None:
+            retries = self._case_retries if self._case_retries is not None else self.check_retries
+        flaky = False
+        if not passed and retries > 0:
+            if stdin is None or isinstance(stdin, (StdinFile, str, bytearray, memoryview, buffer, list, tuple)):
+                reruns_passed = self._rerun_check(retries, poll_seconds, run_arguments, templates)
+                flaky = reruns_passed > 0
+                if flaky:
+                    self.log('FLAKY: %d/%d reruns passed' %(reruns_passed, retries), True, Fore.YELLOW)
+                else:
+                    self.log('CONSISTENT FAILURE: 0/%d reruns passed' %retries, True, Fore.RED)
+            else:
+                reruns_passed = 0
+                retries = 0
+                self.log('not rerun, stdin can only be read once', True, Fore.YELLOW)
+        else:
+            reruns_passed = 0
+            retries = 0 if passed else retries
+        quarantined = (self._case_quarantined
+                       or check_id in ExternalProgramTestSuite.quarantined_checks
+                       or ExternalProgramTestSuite._flaky_history(check_id))
+        ExternalProgramTestSuite._record_history(check_id, passed, flaky, retries, reruns_passed)
+        # print pass/fail, execution time
+        if passed:
+            self.log('CHECK PASS', False, Back.GREEN)
+        elif quarantined:
+            self.log('CHECK FAIL (QUARANTINED)', True, Back.YELLOW)
+        else:
+            self.log('CHECK FAIL', True, Back.RED)
+        if execution_time is not None:
+            self.log("%.4f seconds" %(execution_time))
+        if start_ns is not None:
+            Tracer.complete('check', 'check', start_ns, monotonic_ns(),
+                            {'check': check_id, 'passed': passed, 'flaky': flaky})
+        self._record_check(passed, flaky, quarantined, check_id, execution_time, messages)
+
+    def _run_output_check(self,
+                          print_process_output,
+                          stdout_file,
+                          stderr_file,
+                          poll_seconds,
+                          executable_command,
+                          command_arguments,
+                          expected_returncode,
+                          timeout,
+                          stdin,
+                          expect_stdout,
+                          expect_stderr,
+                          forbid_stdout,
+                          forbid_stderr,
+                          ordered,
+                          kill_on_forbidden,
+                          pty,
+                          timeline=None):
+        """Run the program of a check_subprocess check once and return whether
+        it passed, its execution time, None if it could not be run, and the
+        messages explaining the failure
+        """
         process = None
+        execution_time = None
+        messages = []
+        matchers = {}
         try:
+            # build the incremental output matchers
+            for stream, expect, forbid in [('stdout', expect_stdout, forbid_stdout),
+                                           ('stderr', expect_stderr, forbid_stderr)]:
+                if expect is not None or forbid is not None:
+                    matchers[stream] = OutputMatcher(expect, forbid, ordered)
+            callbacks = {}
+            for stream, matcher in matchers.items():
+                if kill_on_forbidden:
+                    callbacks[stream] = matcher.feed
+                else:
+                    # ignore the return value so the process is not terminated
+                    callbacks[stream] = lambda line, feed=matcher.feed: feed(line) and False
             process, execution_time = run_subprocess(executable_command,
                                                      command_arguments,
                                                      timeout,
                                                      print_process_output,
                                                      stdout_file,
                                                      stderr_file,
-                                                     poll_seconds)
+                                                     poll_seconds,
+                                                     stdin=stdin,
+                                                     process_callback=self._processes.add,
+                                                     stdout_callback=callbacks.get('stdout'),
+                                                     stderr_callback=callbacks.get('stderr'),
+                                                     keep_output=False,
+                                                     timeline=timeline,
+                                                     pty=pty,
+                                                     strip_ansi=pty)
         except OSError as e:            
+            messages.append('[%s] %s' %(type(e).__name__, e))
+        except IOError as e:
+            messages.append('[%s] %s' %(type(e).__name__, e))
+        except ValueError as e:
+            messages.append('[%s] %s' %(type(e).__name__, e))
+        except re.error as e:
+            messages.append('[%s] %s' %(type(e).__name__, e))
+        except TimeoutError as e:
+            messages.append('[%s] %s' %(type(e).__name__, e))
+        if process is None:
+            return False, None, messages
+        passed = process.returncode == expected_returncode
+        for stream in sorted(matchers):
+            for failure in matchers[stream].verify():
+                messages.append('%s: %s' %(stream, failure))
+                passed = False
+        return passed, execution_time, messages
+
+    def _rerun_check(self, retries, poll_seconds, run_arguments, templates):
+        """Rerun a failed check retries times in parallel, without printing
+        or logging the output, and return the number of reruns that passed.
+        Each rerun expands the executable and argument templates with its
+        own CaseAllocator, so the reruns do not collide on ports or files.
+        """
+        results = []
+        def rerun(number):
+            allocator = CaseAllocator('%s.%s.rerun%d' %(self.suite_name, self._name, number))
+            try:
+                arguments = allocator.expand(templates) + run_arguments[2:]
+                with Tracer.span('rerun', 'check', command=arguments[0]):
+                    results.append(self._run_output_check(False, None, None, poll_seconds, *arguments)[0])
+            finally:
+                allocator.release()
+        threads = [Thread(target=rerun, args=(i + 1,)) for i in range(retries)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len([x for x in results if x])
+
+    @staticmethod
+    def _get_history():
+        """Return the RunHistory of history_file, opened on first use
+        """
+        if ExternalProgramTestSuite.history_file is None:
+            return None
+        with ExternalProgramTestSuite._history_lock:
+            history = ExternalProgramTestSuite._history
+            if history is None or history.path != ExternalProgramTestSuite.history_file:
+                # sqlite3 is only imported when a history is kept
+                from run_history import RunHistory
+                history = RunHistory(ExternalProgramTestSuite.history_file)
+                history.start_run()
+                ExternalProgramTestSuite._history = history
+            return history
+
+    @staticmethod
+    def _get_log_sink():
+        """Return the LogSink of log_archive, created on first use
+        """
+        if ExternalProgramTestSuite.log_archive is None:
+            return None
+        with ExternalProgramTestSuite._log_sink_lock:
+            sink = ExternalProgramTestSuite._log_sink
+            if sink is None or ExternalProgramTestSuite._log_sink_archive != ExternalProgramTestSuite.log_archive:
+                from log_sink import LogSink
+                path = ExternalProgramTestSuite._log_archive_path()
+                sink = LogSink(path,
+                               ExternalProgramTestSuite.log_archive_compression,
+                               max_bytes=ExternalProgramTestSuite.log_archive_max_bytes,
+                               max_seconds=ExternalProgramTestSuite.log_archive_max_seconds,
+                               member_callback=ExternalProgramTestSuite._record_log_member)
+                ExternalProgramTestSuite._log_sink = sink
+                ExternalProgramTestSuite._log_sink_archive = ExternalProgramTestSuite.log_archive
+            return sink
+
+    @staticmethod
+    def _log_archive_path():
+        """Return the path of this run's archive of log_archive, which
+        does not exist yet if a history is kept
+        """
+        history = ExternalProgramTestSuite._get_history()
+        if history is None:
+            return ExternalProgramTestSuite.log_archive.replace('{run}', '%s-%d' %(time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+        template = ExternalProgramTestSuite.log_archive
+        if '{run}' not in template:
+            root, extension = os.path.splitext(template)
+            template = '%s.run{run}%s' %(root, extension)
+        # another run_all of the same process shares the run id
+        run = str(history.run_id)
+        path = template.replace('{run}', run)
+        attempt = 1
+        while os.path.exists(path) or os.path.exists(path + '.idx'):
+            attempt += 1
+            path = template.replace('{run}', '%s-%d' %(run, attempt))
+        return path
+
+    @staticmethod
+    def _close_log_sink():
+        with ExternalProgramTestSuite._log_sink_lock:
+            sink = ExternalProgramTestSuite._log_sink
+            ExternalProgramTestSuite._log_sink = None
+        if sink is not None:
+            sink.close()
+
+    @staticmethod
+    def _record_history(check_id, passed, flaky, reruns, reruns_passed):
+        history = ExternalProgramTestSuite._get_history()
+        if history is not None:
+            history.record_check(check_id, passed, flaky, reruns, reruns_passed)
+
+    @staticmethod
+    def _open_timeline(suite, case):
+        """Return the TimelineWriter of a case in timeline_dir
+        """
+        from stream_timeline import TimelineWriter
+        try:
+            os.makedirs(ExternalProgramTestSuite.timeline_dir)
+        except OSError:
+            # created by a case on another worker
+            if not os.path.isdir(ExternalProgramTestSuite.timeline_dir):
+                raise
+        return TimelineWriter(os.path.join(ExternalProgramTestSuite.timeline_dir,
+                                           '%s.%s.timeline' %(suite, case)))
+
+    @staticmethod
+    def _record_case_history(suite, case, passed, duration):
+        history = ExternalProgramTestSuite._get_history()
+        if history is not None:
+            history.record_case(suite, case, passed, duration)
+
+    @staticmethod
+    def _record_log_member(entry, archive):
+        """Keep where a member of the log archive is stored in the
+        history, so query_runs finds a case's output of previous runs
+        """
+        history = ExternalProgramTestSuite._get_history()
+        if history is not None:
+            history.record_log_member(entry, archive)
+
+    @staticmethod
+    def _flaky_history(check_id):
+        """Return True if the check was flaky often enough
+        in previous runs to be quarantined automatically
+        """
+        if ExternalProgramTestSuite.quarantine_flaky_rate is None:
+            return False
+        history = ExternalProgramTestSuite._get_history()
+        if history is None:
+            return False
+        rate = history.flakiness_rate(check_id)
+        return rate is not None and rate >= ExternalProgramTestSuite.quarantine_flaky_rate
+
+    def check_output_matches_golden(self,
+                                    executable_command,
+                                    command_arguments,
+                                    golden_path,
+                                    normalizers = None,
+                                    expected_returncode = 0,
+                                    timeout = None,
+                                    print_process_output = True,
+                                    stdout_file = None,
+                                    stderr_file = None,
+                                    poll_seconds = .100,
+                                    stdin = None,
+                                    kill_on_mismatch = False,
+                                    max_diff_lines = 40):
+        """Run an external program and compare its stdout line by line
+        with a golden file while it runs. Volatile fields are masked on
+        both sides by the normalizers, e.g. golden_comparator.TIMESTAMPS.
+        On mismatch a unified diff of at most max_diff_lines lines of
+        each side is logged.
+        """
+        process = None
+        check_id = self._check_id(executable_command, command_arguments)
+        messages = []
+        # fill in the case's ports, working directory and log paths
+        executable_command, command_arguments, stdout_file, stderr_file, golden_path = self.expand_templates(
+            [executable_command, command_arguments, stdout_file, stderr_file, golden_path])
+        stdout_file, stderr_file = self._archive_destinations(check_id, stdout_file, stderr_file)
+        comparator = None
+        try:
+            comparator = GoldenComparator(golden_path, normalizers, max_diff_lines=max_diff_lines)
+            if kill_on_mismatch:
+                stdout_callback = comparator.feed
+            else:
+                stdout_callback = lambda line: comparator.feed(line) and False
+            process, execution_time = run_subprocess(executable_command,
+                                                     command_arguments,
+                                                     timeout,
+                                                     print_process_output,
+                                                     stdout_file,
+                                                     stderr_file,
+                                                     poll_seconds,
+                                                     stdin=stdin,
+                                                     process_callback=self._processes.add,
+                                                     stdout_callback=stdout_callback,
+                                                     keep_output=False,
+                                                     timeline=self._timeline)
+        except OSError as e:
+            self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        except IOError as e:
             self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
         except ValueError as e:
             self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        except re.error as e:
+            self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
         except TimeoutError as e:
             self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
         # print pass/fail, execution time
-        if process is not None:                             
-            if process.returncode == expected_returncode:
+        if process is not None:
+            passed = process.returncode == expected_returncode
+            if not comparator.finish():
+                messages = (['output does not match golden file "%s" from line %d'
+                             %(golden_path, comparator.mismatch_line)]
+                            + comparator.diff())
+                for line in messages:
+                    self.log(line, True, Fore.RED)
+                passed = False
+            if passed:
                 self.log('CHECK PASS', False, Back.GREEN)
-                self._num_checks_passed += 1
             else:
-                self.log('CHECK FAIL', True, Back.RED)            
-            self.log("%.4f seconds" %(execution_time))   
+                self.log('CHECK FAIL', True, Back.RED)
+            self.log("%.4f seconds" %(execution_time))
         else:
-             self.log('CHECK FAIL', True, Back.RED)
-        self._num_checks += 1
+            passed = False
+            if comparator is not None:
+                comparator.finish()
+            self.log('CHECK FAIL', True, Back.RED)
+        self._record_check(passed, check_id=check_id,
+                           execution_time=execution_time if process is not None else None,
+                           messages=messages)
+
+    def start_daemon(self,
+                     executable_command,
+                     command_arguments,
+                     ready = None,
+                     ready_timeout = 30,
+                     print_process_output = True,
+                     stdout_file = None,
+                     stderr_file = None,
+                     stdin = None):
+        """Start a daemon process for the case and wait until the readiness
+        probes (see readiness_probes) pass. Becoming ready in time counts as
+        a check and the startup latency is logged and recorded in the suite
+        results. The process is returned, or None if it did not become ready,
+        and is terminated when the case ends.
+        """
+        process = None
+        check_id = self._check_id(executable_command, command_arguments)
+        # fill in the case's ports, working directory and log paths
+        executable_command, command_arguments, stdout_file, stderr_file = self.expand_templates(
+            [executable_command, command_arguments, stdout_file, stderr_file])
+        stdout_file, stderr_file = self._archive_destinations(check_id, stdout_file, stderr_file)
+        try:
+            process, startup_time = run_subprocess(executable_command,
+                                                   command_arguments,
+                                                   None,
+                                                   print_process_output,
+                                                   stdout_file,
+                                                   stderr_file,
+                                                   stdin=stdin,
+                                                   daemon=True,
+                                                   process_callback=self._processes.add,
+                                                   keep_output=False,
+                                                   ready=ready,
+                                                   ready_timeout=ready_timeout,
+                                                   timeline=self._timeline)
+        except OSError as e:
+            self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        except IOError as e:
+            self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        except ValueError as e:
+            self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        except ReadinessError as e:
+            self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+        if process is not None:
+            self._daemons.append(process)
+            ExternalProgramTestSuite._test_suites[self.suite_name]['startup_times'].append(
+                (self._name, executable_command, startup_time))
+            self.log('CHECK PASS: daemon ready in %.4f seconds' %startup_time, False, Back.GREEN)
+        else:
+            self.log('CHECK FAIL: daemon did not become ready', True, Back.RED)
+        self._record_check(process is not None, check_id=check_id,
+                           execution_time=startup_time if process is not None else None)
+        return process
+
+    def check_differential(self,
+                           executable_a,
+                           executable_b,
+                           command_arguments,
+                           expected_returncode = None,
+                           normalizers = None,
+                           timeout = None,
+                           stdin = None,
+                           compare_stderr = False,
+                           max_time_ratio = None,
+                           print_process_output = False,
+                           stdout_file = None,
+                           stderr_file = None):
+        """Run two versions of a program at the same time with the same
+        arguments and input, e.g. the production and a candidate binary,
+        and check that they behave the same: equal return codes and equal
+        stdout after the normalizers (see golden_comparator) mask volatile
+        fields. The first divergence and the wall time, CPU time and
+        memory of b relative to a are logged and kept in the suite results.
+        Returns the differential.DifferentialResult, None if the programs
+        could not be run.
+
+        expected_returncode (int) -- return code b must also return
+        compare_stderr (bool) -- whether stderr has to be equal as well
+        max_time_ratio (int/float) -- fail if b takes longer than this
+                                      multiple of a's wall time
+        """
+        check_id = self._check_id('%s|%s' %(executable_a, executable_b), command_arguments)
+        return self._check_differential(check_id, executable_a, executable_b, command_arguments,
+                                        expected_returncode, normalizers, timeout, stdin,
+                                        compare_stderr, max_time_ratio, print_process_output,
+                                        stdout_file, stderr_file)
+
+    def _check_differential(self, check_id, executable_a, executable_b, command_arguments,
+                            expected_returncode, normalizers, timeout, stdin, compare_stderr,
+                            max_time_ratio, print_process_output, stdout_file, stderr_file):
+        executable_a, executable_b, command_arguments, stdout_file, stderr_file = self.expand_templates(
+            [executable_a, executable_b, command_arguments, stdout_file, stderr_file])
+        result = None
+        messages = []
+        try:
+            result = compare_programs([executable_a] + command_arguments,
+                                      [executable_b] + command_arguments,
+                                      stdin,
+                                      normalizers,
+                                      timeout,
+                                      print_process_output,
+                                      stdout_file,
+                                      stderr_file,
+                                      self._processes.add)
+        except OSError as e:
+            messages.append('[%s] %s' %(type(e).__name__, e))
+        except ValueError as e:
+            messages.append('[%s] %s' %(type(e).__name__, e))
+        except DifferentialTimeout as e:
+            messages.append('[%s] %s' %(type(e).__name__, e))
+        if result is not None:
+            if result.a.returncode != result.b.returncode:
+                messages.append('return code: %s returned %s, %s returned %s'
+                                %(executable_a, result.a.returncode, executable_b, result.b.returncode))
+            for stream, divergence in [('stdout', result.divergence),
+                                       ('stderr', result.stderr_divergence if compare_stderr else None)]:
+                if divergence is not None:
+                    messages.append('%s: first difference at line %d, a: %r, b: %r'
+                                    %((stream,) + divergence))
+            if expected_returncode is not None and result.b.returncode != expected_returncode:
+                messages.append('return code: %s returned %s, expected %s'
+                                %(executable_b, result.b.returncode, expected_returncode))
+            time_ratio = result.time_ratio()
+            if max_time_ratio is not None and time_ratio is not None and time_ratio > max_time_ratio:
+                messages.append('time: b took %.2f times as long as a, more than %.2f'
+                                %(time_ratio, max_time_ratio))
+            ratios = tuple(['-' if r is None else '%.2f' %r
+                            for r in [time_ratio, result.cpu_ratio(), result.rss_ratio()]])
+            self.log('a %.4f seconds, b %.4f seconds, b/a time %s, cpu %s, rss %s'
+                     %((result.a.execution_time, result.b.execution_time) + ratios))
+        passed = result is not None and len(messages) == 0
+        for message in messages:
+            self.log(message, True, Fore.RED)
+        with self._case_lock:
+            ExternalProgramTestSuite._test_suites[self.suite_name]['differential_results'].append((check_id, result))
+        if passed:
+            self.log('CHECK PASS', False, Back.GREEN)
+        else:
+            self.log('CHECK FAIL', True, Back.RED)
+        self._record_check(passed, check_id=check_id,
+                           execution_time=result.b.execution_time if result is not None else None,
+                           messages=messages)
+        return result
+
+    def start_session(self,
+                      executable_command,
+                      command_arguments = [],
+                      timeout = 30,
+                      pty = False,
+                      strip_ansi = None,
+                      stdout_file = None):
+        """Start an interactive_session.InteractiveSession of a program for
+        the case, driven with send, expect and expect_any or check_expect.
+        The session is closed when the case ends. Returns None if the
+        program could not be started.
+
+        strip_ansi (bool) -- whether to remove ANSI escape sequences from the
+                             output, by default when running on a terminal
+        stdout_file (str) -- file the program's output is appended to
+        """
+        executable_command, command_arguments, stdout_file = self.expand_templates(
+            [executable_command, command_arguments, stdout_file])
+        try:
+            session = InteractiveSession(executable_command,
+                                         command_arguments,
+                                         timeout,
+                                         pty=pty,
+                                         strip_ansi=pty if strip_ansi is None else strip_ansi,
+                                         log_file=stdout_file,
+                                         process_callback=self._processes.add)
+        except OSError as e:
+            self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+            return None
+        except ValueError as e:
+            self.log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+            return None
+        self._sessions.append(session)
+        return session
+
+    def check_expect(self, session, patterns, timeout = None):
+        """Wait until the output of a session matches a pattern, or one
+        of a list of patterns, and count it as a check. Returns the index
+        of the pattern that matched, None if none matched in time.
+        """
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+        check_id = '%s.%s: expect %s' %(self.suite_name, self._name,
+                                        ' or '.join([getattr(p, 'pattern', p) for p in patterns]))
+        index = None
+        start_time = timeit.default_timer()
+        messages = []
+        try:
+            index = session.expect_any(patterns, timeout)[0]
+        except (ExpectTimeout, ExpectEOF, re.error) as e:
+            messages.append('[%s] %s' %(type(e).__name__, e))
+        execution_time = timeit.default_timer() - start_time
+        for message in messages:
+            self.log(message, True, Fore.RED)
+        if index is not None:
+            self.log('CHECK PASS: %s matched in %.4f seconds' %(session.match.group(0).strip() or 'output',
+                                                                execution_time), False, Back.GREEN)
+        else:
+            self.log('CHECK FAIL', True, Back.RED)
+        self._record_check(index is not None, check_id=check_id,
+                           execution_time=execution_time, messages=messages)
+        return index
 
     @staticmethod
-    def run_all():
+    def run_all(maxfail=None):
         """
         Run all registered test suites that have run
+
+        maxfail (int) -- number of failed cases after which all remaining
+                         cases and suites are cancelled, overrides the
+                         maxfail static variable
         """
         ExternalProgramTestSuite._has_run = False
+        if maxfail is not None:
+            assert_variable_type(maxfail, int)
+            ExternalProgramTestSuite.maxfail = maxfail
+        ExternalProgramTestSuite._num_failures = 0
+        if ExternalProgramTestSuite.trace_file is not None:
+            Tracer.start()
+        if ExternalProgramTestSuite.profile_framework:
+            Profiler.start()
+        if ExternalProgramTestSuite.async_console:
+            ConsoleRenderer().start()
+        exporter = None
+        # stop the exporter, tracer, profiler and renderer also when
+        # the run, the report or binding the metrics port raises
+        try:
+            if ExternalProgramTestSuite.metrics_port is not None or ExternalProgramTestSuite.metrics_textfile is not None:
+                from metrics_exporter import MetricsExporter
+                metrics = MetricsExporter(ExternalProgramTestSuite._collect_metrics,
+                                          ExternalProgramTestSuite.metrics_port,
+                                          ExternalProgramTestSuite.metrics_textfile,
+                                          ExternalProgramTestSuite.metrics_interval)
+                metrics.start()
+                exporter = metrics
+            ExternalProgramTestSuite._run_all_suites()
+        finally:
+            ExternalProgramTestSuite._run_all_scheduler = None
+            if exporter is not None:
+                exporter.stop()
+            if ExternalProgramTestSuite.trace_file is not None:
+                Tracer.stop()
+                Tracer.export(ExternalProgramTestSuite.trace_file)
+            if ExternalProgramTestSuite.profile_framework:
+                Profiler.stop()
+                ExternalProgramTestSuite._print("\r\n".join(Profiler.report()))
+            ExternalProgramTestSuite._close_log_sink()
+            if ConsoleRenderer.active is not None:
+                ConsoleRenderer.active.stop()
+
+    @staticmethod
+    def _run_all_suites():
+        """Run the registered suites, tear down the session fixtures
+        and print and write the results, see run_all
+        """
+        # schedule the suites after the suites they depend on
+        scheduler = DagScheduler(ExternalProgramTestSuite.suite_workers)
+        ExternalProgramTestSuite._run_all_scheduler = scheduler
         for suite, properties in ExternalProgramTestSuite._test_suites.items():
+            scheduler.add(suite,
+                          lambda properties=properties: ExternalProgramTestSuite._run_registered_suite(properties),
+                          properties['args'].get('depends_on'),
+                          properties['args'].get('produces'),
+                          properties['args'].get('consumes'))
+        try:
+            scheduler.run(ExternalProgramTestSuite._skip_suite,
+                          ExternalProgramTestSuite._cancel_suite)
+        except SchedulerError as e:
+            ExternalProgramTestSuite._print(Fore.RED
+                                            + '[%s] %s' %(type(e).__name__, e)
+                                            + Fore.RESET + Back.RESET + Style.RESET_ALL)
+        ExternalProgramTestSuite._run_all_scheduler = None
+        # report the chain of suites bounding the total wall time
+        if ExternalProgramTestSuite.suite_workers > 1 or [p for p in ExternalProgramTestSuite._test_suites.values()
+                                                          if 'depends_on' in p['args'] or 'consumes' in p['args']]:
+            path, path_time = scheduler.critical_path()
+            ExternalProgramTestSuite._print("CRITICAL PATH: %s in %.4f seconds" %(' -> '.join(path), path_time))
+        # tear down the fixtures shared by all suites
+        with Tracer.span('fixture teardown', 'fixture', scope='session'):
+            errors = FixtureManager.teardown_scope('session')
+        for error in errors:
+            ExternalProgramTestSuite._print(Fore.RED
+                                            + error
+                                            + Fore.RESET + Back.RESET + Style.RESET_ALL)
+        with Tracer.span('report', 'report'):
+            ExternalProgramTestSuite.print_total_results()
+        if ExternalProgramTestSuite.report_file is not None:
+            # the report libraries are only imported when a report is written
+            from report_writer import write_report
             try:
-                ExternalProgramTestSuite.run(properties['self'], properties['name'])
-            except Exception as e:
-                properties['self'].log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
-                # print test result
-                properties['self']._print_suite_results()       
-        ExternalProgramTestSuite.print_total_results()
-        
+                write_report(ExternalProgramTestSuite.report_file, ExternalProgramTestSuite._test_suites)
+            except (IOError, OSError, ImportError) as e:
+                ExternalProgramTestSuite._print(Fore.RED
+                                                + '[%s] %s' %(type(e).__name__, e)
+                                                + Fore.RESET + Back.RESET + Style.RESET_ALL)
+
+    @staticmethod
+    def run_differential(executable, baseline, candidate, normalizers=None, maxfail=None):
+        """Replay all registered test suites against two versions of a
+        program: every check_subprocess check running executable runs the
+        baseline and the candidate side by side instead, see
+        check_differential, and passes if they behave the same. A table
+        comparing their speed and behavior per check is printed at the
+        end and its rows, (check id, differential.DifferentialResult or
+        None), returned.
+
+        executable (str) -- executable the suites' checks run
+        baseline, candidate (str) -- the two versions to compare
+        normalizers -- list of (regex, replacement) tuples masking volatile output
+        """
+        assert_variable_type(executable, str)
+        assert_variable_type(baseline, str)
+        assert_variable_type(candidate, str)
+        for properties in ExternalProgramTestSuite._test_suites.values():
+            properties['differential_results'] = []
+        ExternalProgramTestSuite._differential = {'executable': executable,
+                                                  'baseline': baseline,
+                                                  'candidate': candidate,
+                                                  'normalizers': normalizers}
+        try:
+            ExternalProgramTestSuite.run_all(maxfail)
+        finally:
+            ExternalProgramTestSuite._differential = None
+        rows = []
+        for name in sorted(ExternalProgramTestSuite._test_suites):
+            rows += ExternalProgramTestSuite._test_suites[name]['differential_results']
+        ExternalProgramTestSuite._print(ExternalProgramTestSuite.suite_result_header_color
+                                        + 'DIFFERENTIAL RESULTS: a = %s, b = %s' %(baseline, candidate)
+                                        + Fore.RESET + Back.RESET + Style.RESET_ALL)
+        ExternalProgramTestSuite._print("\r\n".join(format_comparison_table(rows)))
+        return rows
+
+    @staticmethod
+    def _collect_metrics():
+        """
+        Gather the metrics exported while run_all runs from the suites'
+        own counters. Only reads values, so it takes none of their locks.
+        """
+        cases = []
+        checks = []
+        execution_time = []
+        processes = []
+        queue_depth = 0
+        for name, properties in sorted(ExternalProgramTestSuite._test_suites.items()):
+            suite = properties['self']
+            labels = {'suite': name}
+            done = {'passed': suite._num_tests_passed,
+                    'failed': suite._num_tests_failed,
+                    'skipped': suite._num_tests_skipped,
+                    'not_run': suite._num_tests_not_run}
+            done['pending'] = max(len(getattr(suite, 'test_cases', [])) - sum(done.values()), 0)
+            for state, value in sorted(done.items()):
+                cases.append((dict(labels, state=state), value))
+            checks.append((dict(labels, result='passed'), suite._total_checks_passed))
+            checks.append((dict(labels, result='failed'), suite._total_checks - suite._total_checks_passed))
+            checks.append((dict(labels, result='flaky'), suite._total_checks_flaky))
+            checks.append((dict(labels, result='quarantined'), suite._total_checks_quarantined))
+            execution_time.append((labels, properties['execution_time']))
+            processes += list(suite._processes)
+        running = [process for process in processes if process.returncode is None]
+        for process in running:
+            # a process on a terminal has one reader for both streams
+            for reader in set([getattr(process, 'stdout_reader', None), getattr(process, 'stderr_reader', None)]):
+                if reader is not None:
+                    queue_depth += reader.queue_depth()
+        return [('external_test_cases', 'gauge', 'Test cases by state.', cases),
+                ('external_test_checks_total', 'counter', 'Checks by result.', checks),
+                ('external_test_suite_execution_seconds', 'gauge',
+                 'Execution time of the finished suites.', execution_time),
+                ('external_test_running_processes', 'gauge',
+                 'Child processes still running.', [({}, len(running))]),
+                ('external_test_captured_bytes_total', 'counter',
+                 'Bytes read from the child processes\' output.',
+                 [({}, NBSRW.total_bytes_read())]),
+                ('external_test_output_queue_depth', 'gauge',
+                 'Output lines read but not consumed yet.', [({}, queue_depth)])]
+
+    @staticmethod
+    def _run_registered_suite(properties):
+        """
+        Run a registered test suite for run_all and return whether it passed
+        """
+        try:
+            ExternalProgramTestSuite.run(properties['self'], properties['name'])
+        except Exception as e:
+            properties['self'].log('[%s] %s' %(type(e).__name__, e), True, Fore.RED)
+            # print test result
+            properties['self']._print_suite_results()
+        return properties['passed']
+
+    @staticmethod
+    def _skip_suite(suite, dependency):
+        """
+        Report a test suite which is not run because a suite it depends on did not pass
+        """
+        properties = ExternalProgramTestSuite._test_suites[suite]
+        properties['skipped'] = True
+        properties['self'].log("SUITE SKIPPED: %s (depends on %s which did not pass)" %(suite, dependency),
+                               True,
+                               Fore.YELLOW)
+
+    @staticmethod
+    def _cancel_suite(suite):
+        """
+        Report a test suite which is not run because run_all was cancelled
+        """
+        properties = ExternalProgramTestSuite._test_suites[suite]
+        properties['not_run'] = True
+        properties['self'].log("SUITE NOT RUN: %s" %suite, True, Fore.YELLOW)
+
     @staticmethod
     def print_total_results():
         """
@@ -535,6 +1913,8 @@ class ExternalProgramTestSuite:
         total_num_passed = 0
         total_checks = 0
         total_checks_passed = 0
+        total_checks_flaky = 0
+        total_checks_quarantined = 0
         total_suites_passed = 0
         total_num_suites = 0
         total_execution_time = 0
@@ -555,9 +1935,17 @@ class ExternalProgramTestSuite:
                         total_suites_passed += 1
                     total_checks += results['num_checks']
                     total_checks_passed += results['num_checks_passed']
+                    total_checks_flaky += results['num_checks_flaky']
+                    total_checks_quarantined += results['num_checks_quarantined']
                     total_execution_time += results['execution_time']
                     self.log("_" * ExternalProgramTestSuite._num_formatting_chars)
                     total_num_suites += 1
+                elif results['skipped'] or results['not_run']:
+                    self.log("%s: %s" %(suite, 'SKIPPED' if results['skipped'] else 'NOT RUN'),
+                             False,
+                             Back.RED)
+                    self.log("_" * ExternalProgramTestSuite._num_formatting_chars)
+                    total_num_suites += 1
             # print cumulative total pass/fail            
             if total_num_tests > 0:
                 if total_checks > 0:
@@ -578,15 +1966,21 @@ class ExternalProgramTestSuite:
                            total_checks,
                            percentage_checks_passed,
                            total_execution_time)) 
+                # flaky checks count as failed, quarantined ones are not counted
+                if total_checks_flaky > 0:
+                    self.log("%d FLAKY CHECKS" %total_checks_flaky, False, Fore.YELLOW)
+                if total_checks_quarantined > 0:
+                    self.log("%d QUARANTINED CHECKS FAILED" %total_checks_quarantined, False, Fore.YELLOW)
             if percentage_passed == 100:
                 self.log("OK", False, Back.GREEN)
             else:
                 self.log("NOT OK", False, Back.RED)
             self.log("." * ExternalProgramTestSuite._num_formatting_chars)
         except Exception as e:
-            print(Fore.RED
-                  + '[%s] %s' %(type(e).__name__, e)
-                  + Fore.RESET + Back.RESET + Style.RESET_ALL)
+            ExternalProgramTestSuite._print(Fore.RED
+                                            + '[%s] %s' %(type(e).__name__, e)
+                                            + Fore.RESET + Back.RESET + Style.RESET_ALL)
 
 class SuiteError(Exception): pass
+class CaseAborted(Exception): pass
 class InvalidArgument(Exception): pass
\ No newline at end of file
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# Filename: fixture_manager.py
+
+import atexit
+from threading import Lock
+from types import *
+
+# fixture scopes, a case scoped fixture is set up and torn down around
+# every case, the others are shared until the end of the suite/session
+FIXTURE_SCOPES = ['case', 'suite', 'session']
+
+def call_fixture_function(function, case):
+    """Call a fixture setup or teardown function and return its result.
+    Unbound methods are passed the test case.
+    """
+    if isinstance(function, MethodType) and function.im_self is None:
+        return function(case)
+    return function()
+
+class FixtureManager:
+    """Registry of the suite and session scoped fixtures.
+
+    A scoped fixture is started lazily by the first case acquiring it and
+    shared by every case of its scope, including cases running concurrently
+    which wait for a single start. It is reference counted per case and
+    torn down when its scope ends, or by the last case releasing it if
+    cases still hold it then.
+    """
+    # (fixture, scope, scope key) -> fixture entry
+    _fixtures = {}
+    _lock = Lock()
+    _atexit_registered = False
+
+    @staticmethod
+    def acquire(fixture, scope, scope_key, case=None):
+        """Start the fixture if needed and return its setup function's result
+
+        Positional arguments:
+        fixture -- function returning a (setup, teardown) function tuple
+        scope -- 'suite' or 'session'
+        scope_key -- the suite name for suite scoped fixtures
+        case -- the test suite passed to unbound setup/teardown methods
+        """
+        key = (fixture, scope, scope_key)
+        with FixtureManager._lock:
+            entry = FixtureManager._fixtures.get(key)
+            if entry is None:
+                entry = {'lock': Lock(),
+                         'started': False,
+                         'error': None,
+                         'value': None,
+                         'teardown': None,
+                         'case': case,
+                         'refcount': 0,
+                         'scope_ended': False}
+                FixtureManager._fixtures[key] = entry
+                # session fixtures of suites run outside of run_all
+                # are torn down when the interpreter exits
+                if scope == 'session' and not FixtureManager._atexit_registered:
+                    atexit.register(FixtureManager.teardown_scope, 'session', None, True)
+                    FixtureManager._atexit_registered = True
+            entry['refcount'] += 1
+        # start outside of the registry lock so other fixtures are not held up
+        with entry['lock']:
+            if entry['error'] is not None:
+                entry['refcount'] -= 1
+                raise FixtureError('%s fixture "%s" failed to start: %s'
+                                   %(scope, fixture.__name__, entry['error']))
+            if not entry['started']:
+                try:
+                    setup, entry['teardown'] = fixture()
+                    if setup is not None:
+                        entry['value'] = call_fixture_function(setup, case)
+                    entry['started'] = True
+                except Exception as e:
+                    entry['error'] = '[%s] %s' %(type(e).__name__, e)
+                    entry['refcount'] -= 1
+                    raise FixtureError('%s fixture "%s" failed to start: %s'
+                                       %(scope, fixture.__name__, entry['error']))
+        return entry['value']
+
+    @staticmethod
+    def release(fixture, scope, scope_key):
+        """Drop a case's reference to a fixture, it keeps running until its
+        scope ends. Return a list of teardown error messages, which are only
+        reported here if the scope ended while the case held the fixture.
+        """
+        key = (fixture, scope, scope_key)
+        with FixtureManager._lock:
+            entry = FixtureManager._fixtures.get(key)
+            if entry is None or entry['refcount'] == 0:
+                return []
+            entry['refcount'] -= 1
+            if not entry['scope_ended'] or entry['refcount'] > 0:
+                return []
+            del FixtureManager._fixtures[key]
+        return FixtureManager._teardown(key, entry)
+
+    @staticmethod
+    def _teardown(key, entry):
+        """Call the teardown function of a started fixture entry.
+        Return a list of teardown error messages.
+        """
+        with entry['lock']:
+            if entry['started'] and entry['teardown'] is not None:
+                try:
+                    call_fixture_function(entry['teardown'], entry['case'])
+                except Exception as e:
+                    return ['%s fixture "%s" teardown failed: [%s] %s'
+                            %(key[1], key[0].__name__, type(e).__name__, e)]
+        return []
+
+    @staticmethod
+    def teardown_scope(scope, scope_key=None, force=False):
+        """Tear down the started fixtures of a scope. A fixture still held
+        by a case, e.g. one which outlived its suite's time limit, is torn
+        down when that case releases it instead, unless force is set.
+        Return a list of teardown error messages.
+        """
+        keys = []
+        entries = []
+        with FixtureManager._lock:
+            for key, entry in FixtureManager._fixtures.items():
+                if key[1] != scope or (scope_key is not None and key[2] != scope_key):
+                    continue
+                if entry['refcount'] > 0 and not force:
+                    entry['scope_ended'] = True
+                    continue
+                keys.append(key)
+                entries.append(FixtureManager._fixtures.pop(key))
+        errors = []
+        for key, entry in zip(keys, entries):
+            errors += FixtureManager._teardown(key, entry)
+        return errors
+
+class FixtureError(Exception): pass
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# Filename: framework_profiler.py
+
+import timeit
+from threading import Lock
+
+class _Histogram:
+    """Count, total, maximum and power of two buckets of durations,
+    kept in constant memory however many values are observed
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        # bucket i counts values below 2**i microseconds
+        self.buckets = [0] * 40
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+        bucket = min(int(seconds * 1000000).bit_length(), len(self.buckets) - 1)
+        self.buckets[bucket] += 1
+
+    def percentile(self, fraction):
+        """Return the upper bound in seconds of the bucket holding the percentile
+        """
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min((2 ** bucket) / 1000000.0, self.maximum)
+        return self.maximum
+
+class Profiler:
+    """Counters and duration histograms of the framework's own operations,
+    e.g. lines captured, bytes logged, log flushes, argument validations,
+    spawn latency and decorator source scans.
+
+    Instrumented code guards every update with "if Profiler.enabled:" so
+    that a disabled profiler costs one attribute lookup per operation.
+    """
+    enabled = False
+    _counters = {}
+    _histograms = {}
+    _lock = Lock()
+    _start_time = None
+
+    @staticmethod
+    def start():
+        """Reset the counters and histograms and start collecting
+        """
+        with Profiler._lock:
+            Profiler._counters = {}
+            Profiler._histograms = {}
+        Profiler._start_time = timeit.default_timer()
+        Profiler.enabled = True
+
+    @staticmethod
+    def stop():
+        Profiler.enabled = False
+
+    @staticmethod
+    def count(name, amount=1):
+        """Add amount to a counter
+        """
+        with Profiler._lock:
+            Profiler._counters[name] = Profiler._counters.get(name, 0) + amount
+
+    @staticmethod
+    def observe(name, seconds):
+        """Add a duration to a histogram
+        """
+        with Profiler._lock:
+            if name not in Profiler._histograms:
+                Profiler._histograms[name] = _Histogram()
+            Profiler._histograms[name].add(seconds)
+
+    @staticmethod
+    def counter(name):
+        return Profiler._counters.get(name, 0)
+
+    @staticmethod
+    def report():
+        """Return the lines of the overhead report: the counters, the
+        histograms and the share of the wall time the timed framework
+        operations took
+        """
+        wall_time = timeit.default_timer() - (Profiler._start_time or timeit.default_timer())
+        with Profiler._lock:
+            counters = sorted(Profiler._counters.items())
+            histograms = sorted(Profiler._histograms.items())
+        lines = ['FRAMEWORK PROFILE (%.4f seconds)' %wall_time]
+        for name, value in counters:
+            lines.append('%-32s %d' %(name, value))
+        if histograms:
+            lines.append('%-32s %8s %10s %10s %10s %10s %10s'
+                         %('', 'count', 'total s', 'mean ms', 'p50 ms', 'p95 ms', 'max ms'))
+        overhead = 0.0
+        for name, histogram in histograms:
+            lines.append('%-32s %8d %10.4f %10.3f %10.3f %10.3f %10.3f'
+                         %(name,
+                           histogram.count,
+                           histogram.total,
+                           histogram.total * 1000 / histogram.count,
+                           histogram.percentile(.5) * 1000,
+                           histogram.percentile(.95) * 1000,
+                           histogram.maximum * 1000))
+            overhead += histogram.total
+        if wall_time > 0:
+            # operations on concurrent threads can add up to more than the wall time
+            lines.append('timed framework operations: %.4f seconds, %.2f%% of the wall time'
+                         %(overhead, overhead * 100 / wall_time))
+        return lines
@@ -0,0 +1,169 @@
+#!/usr/bin/python
+# Filename: golden_comparator.py
+
+import re
+import mmap
+from collections import deque
+from threading import Lock
+from assert_variable_type import *
+
+# normalizers masking commonly volatile output fields
+TIMESTAMPS = (r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'
+              r'|\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b', '<TIMESTAMP>')
+ADDRESSES = (r'\b0x[0-9a-fA-F]+\b', '<ADDRESS>')
+UUIDS = (r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b', '<UUID>')
+
+def compile_normalizers(normalizers):
+    """Return a list of (compiled regex, replacement) tuples
+
+    Positional arguments:
+    normalizers -- list of (regex, replacement) tuples, where regex
+                   is a pattern string or a compiled pattern
+    """
+    if normalizers is None:
+        return []
+    assert_variable_type(normalizers, list)
+    compiled = []
+    for normalizer in normalizers:
+        assert_variable_type(normalizer, tuple)
+        pattern, replacement = normalizer
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        compiled.append((pattern, replacement))
+    return compiled
+
+def normalize_line(line, normalizers):
+    """Strip the line ending and mask the volatile fields of a line
+    """
+    line = line.rstrip('\r\n')
+    for regex, replacement in normalizers:
+        line = regex.sub(replacement, line)
+    return line
+
+class GoldenComparator:
+    """Compare output lines against a golden file as they arrive.
+
+    The golden file is memory-mapped and read one line ahead of the
+    output, so neither side is ever held in memory as a whole. After the
+    first mismatch only a bounded window of lines is kept for the diff.
+    feed and finish may be called from different threads, lines fed
+    after finish are ignored.
+    """
+
+    def __init__(self, golden_path, normalizers=None, context_lines=3, max_diff_lines=40):
+        """Open the golden file
+
+        Positional arguments:
+        golden_path -- path of the file holding the expected output
+        normalizers -- list of (regex, replacement) tuples applied to
+                       both the output and the golden lines
+        context_lines -- number of equal lines shown around the first mismatch
+        max_diff_lines -- maximum number of lines of each side kept after the
+                          first mismatch, which bounds the size of the diff
+        """
+        assert_variable_type(golden_path, str)
+        assert_variable_type(context_lines, int)
+        assert_variable_type(max_diff_lines, int)
+        self.golden_path = golden_path
+        self._normalizers = compile_normalizers(normalizers)
+        self._context_lines = context_lines
+        self._max_diff_lines = max_diff_lines
+        self._file = open(golden_path, 'rb')
+        # mmap can not map an empty file
+        self._golden = None
+        if len(self._file.read(1)):
+            self._golden = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._context = deque(maxlen=context_lines)
+        self._line_number = 0
+        # line number of the first mismatch and the lines kept from there on
+        self.mismatch_line = None
+        self._golden_tail = []
+        self._actual_tail = []
+        self._finished = False
+        # finish closes the mapping while the reader thread may still feed
+        self._lock = Lock()
+
+    def _next_golden_line(self):
+        if self._golden is None:
+            return None
+        line = self._golden.readline()
+        if not line:
+            return None
+        return normalize_line(line, self._normalizers)
+
+    def feed(self, line):
+        """Compare the next output line with the golden file.
+        Return True once the diff window is complete or the comparison
+        has finished, and the rest of the output is no longer needed.
+        """
+        actual = normalize_line(line, self._normalizers)
+        with self._lock:
+            if self._finished:
+                return True
+            return self._feed(actual)
+
+    def _feed(self, actual):
+        if self.mismatch_line is None:
+            self._line_number += 1
+            expected = self._next_golden_line()
+            if expected == actual:
+                self._context.append(actual)
+                return False
+            self.mismatch_line = self._line_number
+            if expected is not None:
+                self._golden_tail.append(expected)
+        if len(self._actual_tail) < self._max_diff_lines:
+            self._actual_tail.append(actual)
+            return False
+        return True
+
+    def finish(self):
+        """Compare the end of the output with the end of the golden file.
+        Return True if the output matched.
+        """
+        with self._lock:
+            if not self._finished:
+                self._finished = True
+                if self.mismatch_line is None:
+                    # golden lines left over mean the output was too short
+                    expected = self._next_golden_line()
+                    if expected is not None:
+                        self.mismatch_line = self._line_number + 1
+                        self._golden_tail.append(expected)
+                if self.mismatch_line is not None:
+                    while len(self._golden_tail) < self._max_diff_lines:
+                        expected = self._next_golden_line()
+                        if expected is None:
+                            break
+                        self._golden_tail.append(expected)
+                if self._golden is not None:
+                    self._golden.close()
+                self._file.close()
+            return self.mismatch_line is None
+
+    def diff(self):
+        """Return the unified diff lines around the first mismatch
+        """
+        if not self.finish():
+            # only imported when there is a diff to show
+            import difflib
+            context = list(self._context)
+            # line number of the first line of the diff window
+            first_line = self.mismatch_line - len(context)
+            lines = ['--- %s' %self.golden_path, '+++ output']
+            for line in difflib.unified_diff(context + self._golden_tail,
+                                             context + self._actual_tail,
+                                             n=self._context_lines,
+                                             lineterm=''):
+                hunk = re.match(r'@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@', line)
+                if hunk:
+                    # shift the hunk to the position in the whole file
+                    line = '@@ -%d%s +%d%s @@' %(int(hunk.group(1)) + first_line - 1,
+                                                 hunk.group(2) or '',
+                                                 int(hunk.group(3)) + first_line - 1,
+                                                 hunk.group(4) or '')
+                elif line.startswith('---') or line.startswith('+++'):
+                    continue
+                lines.append(line)
+            return lines
+        return []
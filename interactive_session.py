@@ -0,0 +1,215 @@
+#!/usr/bin/python
+# Filename: interactive_session.py
+
+import os
+import re
+import timeit
+import errno
+import select
+import subprocess
+from assert_variable_type import *
+from pty_stream import open_pty, strip_ansi as _strip_ansi
+from run_subprocess import stop_process
+
+class InteractiveSession(object):
+    """Drives an interactive program, e.g. a REPL, by sending it input and
+    waiting for its output to match patterns, like expect.
+
+    The output is read in the calling thread by select and os.read, without
+    a reader thread or line queue, into a buffer which is searched from a
+    sliding window before the newly read data, so waiting for a prompt takes
+    one search per read instead of one per line. Input and output are kept
+    in a transcript with their times.
+    """
+
+    def __init__(self, executable_command, command_arguments=[], timeout=30,
+                 pty=False, terminal_size=(24, 80), strip_ansi=False,
+                 log_file=None, match_window=4096, max_buffer=1024 * 1024,
+                 process_callback=None):
+        """Start the program
+
+        Positional arguments:
+        executable_command (str) -- executable command to run
+        command_arguments (list) -- command line arguments
+        timeout (int/float) -- default seconds expect waits for a pattern
+        pty (bool) -- whether to run the program on a pseudo-terminal instead
+                      of pipes. The terminal echoes the input sent.
+        terminal_size -- (rows, columns) of the pseudo-terminal
+        strip_ansi (bool) -- whether to remove ANSI escape sequences from the output
+        log_file (str) -- file the output is appended to
+        match_window (int) -- bytes before the newly read data a match may start in
+        max_buffer (int) -- bytes of unmatched output kept, older output is dropped
+        process_callback -- function called with the process right after it was created
+        """
+        assert_variable_type(executable_command, str)
+        assert_variable_type(command_arguments, list)
+        assert_variable_type(timeout, [int, float])
+        assert_variable_type(pty, bool)
+        assert_variable_type(strip_ansi, bool)
+        assert_variable_type(log_file, [str, NoneType])
+        self.timeout = timeout
+        self.strip_ansi = strip_ansi
+        self.log_file = log_file
+        self.match_window = match_window
+        self.max_buffer = max_buffer
+        # (seconds since the start, "send" or "recv", data)
+        self.transcript = []
+        # output before and the match object of the last expect
+        self.before = ''
+        self.match = None
+        self.eof = False
+        self._buffer = ''
+        self._scan_from = 0
+        self._start_time = timeit.default_timer()
+        command = [executable_command] + command_arguments
+        if pty:
+            master, slave = open_pty(*terminal_size)
+            try:
+                self.process = subprocess.Popen(command, stdin=slave, stdout=slave, stderr=slave,
+                                                close_fds=True)
+            except:
+                os.close(master)
+                raise
+            finally:
+                os.close(slave)
+            self._read_fd = self._write_fd = master
+        else:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.STDOUT, bufsize=0, close_fds=True)
+            self._read_fd = self.process.stdout.fileno()
+            self._write_fd = self.process.stdin.fileno()
+        if process_callback is not None:
+            process_callback(self.process)
+
+    def _elapsed(self):
+        return timeit.default_timer() - self._start_time
+
+    def send(self, data):
+        """Write data to the program's input
+        """
+        self.transcript.append((self._elapsed(), 'send', data))
+        view = memoryview(data)
+        while len(view):
+            written = os.write(self._write_fd, view)
+            view = view[written:]
+
+    def sendline(self, line=''):
+        self.send(line + '\n')
+
+    def _read(self, timeout):
+        """Read the output available within timeout seconds into the
+        buffer, return False if none arrived
+        """
+        if not select.select([self._read_fd], [], [], max(timeout, 0))[0]:
+            return False
+        try:
+            data = os.read(self._read_fd, 65536)
+        except OSError as e:
+            # EIO from a terminal whose program has exited
+            if e.errno != errno.EIO:
+                raise
+            data = ''
+        if not data:
+            self.eof = True
+            return True
+        if self.strip_ansi:
+            data = _strip_ansi(data)
+        self.transcript.append((self._elapsed(), 'recv', data))
+        if self.log_file is not None:
+            with open(self.log_file, 'a') as f:
+                f.write(data)
+        # search from the window before the new data only
+        self._scan_from = max(0, len(self._buffer) - self.match_window)
+        self._buffer += data
+        if len(self._buffer) > self.max_buffer:
+            dropped = len(self._buffer) - self.max_buffer
+            self._buffer = self._buffer[dropped:]
+            self._scan_from = max(0, self._scan_from - dropped)
+        return True
+
+    def _search(self, patterns):
+        """Return (index, match) of the earliest match
+        of the patterns in the unsearched buffer
+        """
+        best = None
+        for index, pattern in enumerate(patterns):
+            match = pattern.search(self._buffer, self._scan_from)
+            if match is not None and (best is None or match.start() < best[1].start()):
+                best = (index, match)
+        return best
+
+    def expect_any(self, patterns, timeout=None):
+        """Wait until one of the patterns matches the output and return
+        (index of the pattern, match). The output up to the end of the match
+        is consumed, the output before it is kept in before.
+        Raise ExpectTimeout or ExpectEOF if no pattern matched in time.
+
+        Positional arguments:
+        patterns -- list of regexes, as strings or compiled
+        timeout (int/float) -- seconds to wait, the session's timeout if None
+        """
+        patterns = [re.compile(p) if isinstance(p, basestring) else p for p in patterns]
+        if timeout is None:
+            timeout = self.timeout
+        deadline = timeit.default_timer() + timeout
+        # output left over from the previous expect is searched in full
+        self._scan_from = 0
+        while True:
+            found = self._search(patterns)
+            if found is not None:
+                index, match = found
+                self.before = self._buffer[:match.start()]
+                self.match = match
+                self._buffer = self._buffer[match.end():]
+                self._scan_from = 0
+                return index, match
+            if self.eof:
+                raise ExpectEOF('end of output before %s matched, last output: %r'
+                                %(' or '.join([p.pattern for p in patterns]), self._buffer[-200:]))
+            remaining = deadline - timeit.default_timer()
+            if remaining <= 0:
+                raise ExpectTimeout('%s did not match within %.4f seconds, last output: %r'
+                                    %(' or '.join([p.pattern for p in patterns]), timeout, self._buffer[-200:]))
+            self._read(remaining)
+
+    def expect(self, pattern, timeout=None):
+        """Wait until a pattern matches the output and return the match,
+        see expect_any
+        """
+        return self.expect_any([pattern], timeout)[1]
+
+    def transcript_text(self):
+        """Return the transcript as text, the sent input prefixed with >
+        and the received output with <
+        """
+        lines = []
+        for elapsed, direction, data in self.transcript:
+            prefix = '>' if direction == 'send' else '<'
+            lines.append('%10.4f %s %r' %(elapsed, prefix, data))
+        return '\n'.join(lines)
+
+    def close(self, timeout=1):
+        """Terminate the program if it is still running and wait for it,
+        killing it if it does not exit within timeout seconds.
+        Return its return code.
+        """
+        stop_process(self.process, timeout)
+        if self._read_fd == self._write_fd:
+            try:
+                os.close(self._read_fd)
+            except OSError:
+                pass
+        else:
+            self.process.stdin.close()
+            self.process.stdout.close()
+        return self.process.returncode
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+class ExpectTimeout(Exception): pass
+class ExpectEOF(Exception): pass
@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# Filename: log_sink.py
+
+import os
+import time
+import zlib
+import json
+from threading import Lock
+from assert_variable_type import *
+
+COMPRESSIONS = ['gzip', 'zstd']
+
+def _part_path(path, part):
+    """Return the path of a rotated part of the archive,
+    run.log.gz, run.log.1.gz, run.log.2.gz, ...
+    """
+    if part == 0:
+        return path
+    root, extension = os.path.splitext(path)
+    return '%s.%d%s' %(root, part, extension)
+
+def _load_zstandard():
+    # optional dependency, only needed for zstd archives
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError('zstd compression requires the zstandard module')
+    return zstandard
+
+class LogWriter(object):
+    """The output of one stream of a check written to a LogSink, passed
+    to run_subprocess in place of a stdout_file or stderr_file path
+    """
+
+    def __init__(self, sink, key, stream):
+        self.sink = sink
+        self.key = key
+        self.stream = stream
+
+    def write(self, data):
+        self.sink.write(self.key, self.stream, data)
+
+    def close(self):
+        """Compress and index the output written so far
+        """
+        self.sink.flush_buffer(self.key, self.stream)
+
+class LogSink(object):
+    """A compressed, rotated and indexed replacement of the plain log files.
+
+    The output is buffered per (suite, case, check) key and stream and
+    written as independently compressed gzip members or zstd frames,
+    which concatenate to a valid archive that zcat or zstdcat read as a
+    whole. Every member is recorded in a JSON lines index next to the
+    archive with its key, part file, offset and length, so that the
+    output of one case is extracted by seeking to its members instead of
+    decompressing the whole archive, see extract.
+    """
+
+    def __init__(self, path, compression='gzip', level=6, max_bytes=None,
+                 max_seconds=None, member_bytes=1024 * 1024, member_callback=None):
+        """Create the archive and its index, overwriting existing ones
+
+        Positional arguments:
+        path -- path of the archive, e.g. run.log.gz, the index is path + ".idx"
+        compression -- "gzip" or "zstd", zstd requires the zstandard module
+        level -- compression level
+        max_bytes (int) -- size after which a new part of the archive is started
+        max_seconds (int/float) -- age after which a new part of the archive is started
+        member_bytes (int) -- buffered bytes of a key and stream after which
+                              they are written as a member
+        member_callback -- function called with the index entry and the
+                           absolute part path of every member written
+        """
+        assert_variable_type(path, str)
+        assert_variable_type(level, int)
+        assert_variable_type(max_bytes, [int, NoneType])
+        assert_variable_type(max_seconds, [int, float, NoneType])
+        assert_variable_type(member_bytes, int)
+        if compression not in COMPRESSIONS:
+            raise ValueError('compression "%s" is not one of %s' %(compression, ', '.join(COMPRESSIONS)))
+        self.path = path
+        self.index_path = path + '.idx'
+        self.compression = compression
+        self.level = level
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.member_bytes = member_bytes
+        self.member_callback = member_callback
+        self._compressor = None
+        if compression == 'zstd':
+            self._compressor = _load_zstandard().ZstdCompressor(level=level)
+        self._buffers = {}
+        self._buffer_lock = Lock()
+        self._write_lock = Lock()
+        self._part = 0
+        self._file = open(path, 'wb')
+        self._started = time.time()
+        self._index = open(self.index_path, 'w')
+
+    def writer(self, key, stream):
+        """Return a LogWriter for the output of a stream
+
+        Positional arguments:
+        key -- (suite, case, check) tuple, case and check may be None
+        stream -- name of the stream, e.g. "stdout" or "stderr"
+        """
+        return LogWriter(self, tuple(key), stream)
+
+    def write(self, key, stream, data):
+        """Buffer data of a key and stream, writing a member once
+        member_bytes were buffered
+        """
+        buffer_key = (tuple(key), stream)
+        with self._buffer_lock:
+            buffer = self._buffers.get(buffer_key)
+            if buffer is None:
+                buffer = self._buffers[buffer_key] = [[], 0]
+            buffer[0].append(data)
+            buffer[1] += len(data)
+            if buffer[1] < self.member_bytes:
+                return
+            del self._buffers[buffer_key]
+        self._write_member(buffer_key, buffer[0])
+
+    def flush_buffer(self, key, stream):
+        """Write the buffered data of a key and stream as a member
+        """
+        with self._buffer_lock:
+            buffer = self._buffers.pop((tuple(key), stream), None)
+        if buffer is not None:
+            self._write_member((tuple(key), stream), buffer[0])
+
+    def flush(self, suite=None, case=None):
+        """Write the buffered data of a suite or case, or of all keys, as members
+        """
+        with self._buffer_lock:
+            buffer_keys = [buffer_key for buffer_key in self._buffers
+                           if (suite is None or buffer_key[0][0] == suite)
+                           and (case is None or buffer_key[0][1] == case)]
+            buffers = [(buffer_key, self._buffers.pop(buffer_key)) for buffer_key in buffer_keys]
+        for buffer_key, buffer in buffers:
+            self._write_member(buffer_key, buffer[0])
+
+    def close(self):
+        self.flush()
+        with self._write_lock:
+            if not self._file.closed:
+                self._file.close()
+                self._index.close()
+
+    def _compress(self, data):
+        if self._compressor is not None:
+            return self._compressor.compress(data)
+        # a window size of 16 + 15 writes a complete gzip member
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def _rotate(self):
+        """Start a new part if the current one is too large or too old
+        """
+        offset = self._file.tell()
+        if offset == 0:
+            return
+        if ((self.max_bytes is not None and offset >= self.max_bytes)
+            or (self.max_seconds is not None and time.time() - self._started >= self.max_seconds)):
+            self._file.close()
+            self._part += 1
+            self._file = open(_part_path(self.path, self._part), 'wb')
+            self._started = time.time()
+
+    def _write_member(self, buffer_key, chunks):
+        (suite, case, check), stream = buffer_key
+        data = ''.join(chunks)
+        # compress outside the lock so the members of different
+        # keys are compressed in parallel
+        member = self._compress(data)
+        with self._write_lock:
+            if self._file.closed:
+                raise ValueError('log sink "%s" is closed' %self.path)
+            self._rotate()
+            offset = self._file.tell()
+            self._file.write(member)
+            self._file.flush()
+            part_path = _part_path(self.path, self._part)
+            entry = {'suite': suite,
+                     'case': case,
+                     'check': check,
+                     'stream': stream,
+                     'part': os.path.basename(part_path),
+                     'offset': offset,
+                     'length': len(member),
+                     'size': len(data),
+                     'time': time.time()}
+            self._index.write(json.dumps(entry) + '\n')
+            self._index.flush()
+            if self.member_callback is not None:
+                self.member_callback(entry, os.path.abspath(part_path))
+
+def read_index(path, suite=None, case=None, check=None, stream=None):
+    """Return the index entries of an archive's members, optionally only
+    those of a suite, case, check or stream, in the order they were written
+
+    Positional arguments:
+    path -- path of the archive
+    """
+    entries = []
+    with open(path + '.idx') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if ((suite is None or entry['suite'] == suite)
+                and (case is None or entry['case'] == case)
+                and (check is None or entry['check'] == check)
+                and (stream is None or entry['stream'] == stream)):
+                entries.append(entry)
+    return entries
+
+def read_member(path, entry):
+    """Return the decompressed data of one index entry of an archive
+    """
+    return decompress_member(os.path.join(os.path.dirname(path), entry['part']),
+                             entry['offset'], entry['length'])
+
+def decompress_member(part_path, offset, length):
+    """Return the decompressed data of the member at offset of an archive part
+    """
+    with open(part_path, 'rb') as f:
+        f.seek(offset)
+        member = f.read(length)
+    if len(member) < length:
+        raise IOError('member at offset %d of "%s" is truncated' %(offset, part_path))
+    if member[:2] == '\x1f\x8b':
+        return zlib.decompress(member, 31)
+    if member[:4] != '\x28\xb5\x2f\xfd':
+        raise IOError('no gzip or zstd member at offset %d of "%s"' %(offset, part_path))
+    return _load_zstandard().ZstdDecompressor().decompress(member)
+
+def extract(path, suite=None, case=None, check=None, stream=None):
+    """Return the output of a suite, case, check or stream of an archive
+    without decompressing the members of other keys
+    """
+    return ''.join([read_member(path, entry)
+                    for entry in read_index(path, suite, case, check, stream)])
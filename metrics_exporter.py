@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# Filename: metrics_exporter.py
+
+import os
+import BaseHTTPServer
+from threading import Thread, Event
+from assert_variable_type import *
+
+# content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_metrics(metrics):
+    """Return metrics in the Prometheus text exposition format
+
+    Positional arguments:
+    metrics -- list of (name, type, help, samples) tuples, type being
+               'counter' or 'gauge' and samples a list of (labels dict, value)
+    """
+    lines = []
+    for name, metric_type, help_text, samples in metrics:
+        lines.append('# HELP %s %s' %(name, help_text))
+        lines.append('# TYPE %s %s' %(name, metric_type))
+        for labels, value in samples:
+            if labels:
+                label_text = ','.join(['%s="%s"' %(key, _escape(labels[key])) for key in sorted(labels)])
+                lines.append('%s{%s} %s' %(name, label_text, repr(float(value))))
+            else:
+                lines.append('%s %s' %(name, repr(float(value))))
+    return '\n'.join(lines) + '\n'
+
+def write_textfile(path, text):
+    """Replace the file atomically so the node exporter's textfile
+    collector never reads a partly written file
+    """
+    temporary = '%s.%d.tmp' %(path, os.getpid())
+    with open(temporary, 'w') as f:
+        f.write(text)
+    os.rename(temporary, path)
+
+class MetricsExporter:
+    """Exposes metrics gathered by a collect function, either on a local
+    HTTP endpoint scraped by Prometheus or in a node exporter textfile
+    rewritten on a timer.
+
+    The metrics are gathered when they are scraped or written, so the code
+    producing the values only keeps its own counters up to date and takes
+    no locks for the exporter.
+    """
+
+    def __init__(self, collect, port=None, textfile=None, interval=5, host='127.0.0.1'):
+        """Positional arguments:
+        collect -- function returning the metrics, see format_metrics
+        port -- port of the HTTP endpoint, 0 for any free port
+        textfile -- path of the .prom file to write
+        interval -- seconds between textfile writes
+        host -- address the HTTP endpoint listens on
+        """
+        assert_variable_type(port, [int, NoneType])
+        assert_variable_type(textfile, [str, NoneType])
+        assert_variable_type(interval, [int, float])
+        if port is None and textfile is None:
+            raise ValueError('either a port or a textfile is needed to export metrics')
+        self.collect = collect
+        self.port = port
+        self.textfile = textfile
+        self.interval = interval
+        self.host = host
+        self._server = None
+        self._stopped = Event()
+        self._threads = []
+
+    def render(self):
+        return format_metrics(self.collect())
+
+    def start(self):
+        if self.port is not None:
+            exporter = self
+            class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = exporter.render()
+                    self.send_response(200)
+                    self.send_header('Content-Type', CONTENT_TYPE)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                def log_message(self, *args):
+                    pass
+            self._server = BaseHTTPServer.HTTPServer((self.host, self.port), Handler)
+            # the actual port when any free port was asked for
+            self.port = self._server.server_address[1]
+            self._threads.append(Thread(target=self._server.serve_forever))
+        if self.textfile is not None:
+            self._threads.append(Thread(target=self._write_periodically))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def _write_periodically(self):
+        while not self._stopped.is_set():
+            write_textfile(self.textfile, self.render())
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        """Stop serving and write the final values to the textfile
+        """
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self.textfile is not None:
+            write_textfile(self.textfile, self.render())
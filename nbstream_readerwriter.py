@@ -2,45 +2,131 @@
 # Filename: nbstream_readerwriter.py
 
 import shutil
-from threading import Thread
+from threading import Thread, Lock
 from Queue import Queue, Empty
 from assert_variable_type import *
+from trace_events import Tracer, monotonic_ns
+from framework_profiler import Profiler
+from console_renderer import ConsoleRenderer
+from type_validator import compile_validator
+from log_sink import LogWriter
+from pty_stream import PtyStream
+
+_validate_arguments = compile_validator([('log_file', [str, LogWriter, NoneType]),
+                                         ('stream', [FileType, PtyStream]),
+                                         ('keep_output', bool)])
 
 class NonBlockingStreamReaderWriter:
     """A non-blocking stream reader/writer              
     """
+    # readers still reading, whose byte counts are only written by their
+    # own threads, and the bytes read by the readers which have finished
+    _live_readers = set()
+    _finished_bytes = 0
+    _counters_lock = Lock()
 
-    def __init__(self, stream, print_stream=True, log_file=None):
+    def __init__(self, stream, print_stream=True, log_file=None,
+                 line_callback=None, keep_output=True, timeline=None):
         """Initialize the stream reader/writer
         
         Positional arguments:
         stream -- the stream to read from.
-                  Usually a process' stdout or stderr.
-        log_file -- the file to write the stream output to               
+                  Usually a process' stdout or stderr, or a
+                  pty_stream.PtyStream of its terminal.
+        log_file -- the file to write the stream output to, or a
+                    log_sink.LogWriter closed at the end of the stream
+        line_callback -- function called with every line read from the stream
+        keep_output -- whether to keep the output for get_all_output and readline.
+                       Disable when the output is only checked through
+                       line_callback to keep memory use constant.
+        timeline -- stream_timeline.TimelineStream every line is recorded
+                    to with the time it was read
         """
         # Queue to hold stream
         self._q = Queue()
-        # string to hold cumulative output
-        self._output = ""
+        # list of lines holding the cumulative output
+        self._output = []
+        self._bytes_read = [0]
+        with NonBlockingStreamReaderWriter._counters_lock:
+            NonBlockingStreamReaderWriter._live_readers.add(self)
         # verify arguments
-        assert_variable_type(log_file, [str, NoneType])
-        assert_variable_type(stream, FileType)
+        _validate_arguments.check(log_file, stream, keep_output)
+        # print through the console renderer if one is running, in the
+        # output group of the thread creating the reader
+        console = None
+        if print_stream and ConsoleRenderer.active is not None:
+            console = ConsoleRenderer.active.stream()
         
         def _populate_queue(stream, queue, log_file):
             """ Collect lines from 'stream', put them in 'queue'.
             Write the stream output to the log_file if it was supplied.
             """
+            # when tracing, the reader's lifetime is recorded as one event
+            # with the number of lines and the time spent writing the log
+            tracing = Tracer.enabled
+            if tracing:
+                start_ns = monotonic_ns()
+                num_lines = 0
+                log_ns = 0
+            # when profiling, the counts are kept locally and added at the end
+            profiling = Profiler.enabled
+            if profiling:
+                num_bytes = 0
+                num_captured = 0
+            bytes_read = self._bytes_read
             while True:
                 line = stream.readline()
                 if line:
-                    queue.put(line)
-                    if print_stream:
+                    if timeline is not None:
+                        timeline.record(line)
+                    bytes_read[0] += len(line)
+                    if profiling:
+                        num_bytes += len(line)
+                        num_captured += 1
+                    if keep_output:
+                        queue.put(line)
+                        self._output.append(line)
+                    if console is not None:
+                        console.write(line + '\n')
+                    elif print_stream:
                         print(line)
-                    self._output += line + "\r\n"
+                    if line_callback is not None:
+                        line_callback(line)
                     if log_file is not None:
-                        with open(log_file, 'a') as f:
-                            f.write(line)                   
+                        if tracing or profiling:
+                            log_start_ns = monotonic_ns()
+                        if isinstance(log_file, LogWriter):
+                            log_file.write(line)
+                        else:
+                            # every line opens, appends to and flushes the log file
+                            with open(log_file, 'a') as f:
+                                f.write(line)
+                        if tracing or profiling:
+                            log_write_ns = monotonic_ns() - log_start_ns
+                            log_ns += log_write_ns
+                            if profiling:
+                                Profiler.observe('output log flush', log_write_ns / 1000000000.0)
+                    if tracing:
+                        num_lines += 1
                 else:
+                    with NonBlockingStreamReaderWriter._counters_lock:
+                        NonBlockingStreamReaderWriter._live_readers.discard(self)
+                        NonBlockingStreamReaderWriter._finished_bytes += bytes_read[0]
+                    if console is not None:
+                        console.close()
+                    if isinstance(log_file, LogWriter):
+                        log_file.close()
+                    if profiling:
+                        Profiler.count('lines captured', num_captured)
+                        Profiler.count('bytes captured', num_bytes)
+                        if print_stream:
+                            Profiler.count('lines printed', num_captured)
+                        if log_file is not None:
+                            Profiler.count('bytes logged', num_bytes)
+                    if tracing:
+                        Tracer.complete('read output', 'io', start_ns, monotonic_ns(),
+                                        {'lines': num_lines, 'log_file': log_file,
+                                         'log_write_ms': log_ns / 1000000.0})
                     return
 
         self._t = Thread(target = _populate_queue,
@@ -48,8 +134,32 @@ class NonBlockingStreamReaderWriter:
         self._t.daemon = True
         self._t.start() #start collecting lines from the stream
 
+    @property
+    def bytes_read(self):
+        return self._bytes_read[0]
+
+    @staticmethod
+    def total_bytes_read():
+        """Return the bytes read by all readers so far
+        """
+        with NonBlockingStreamReaderWriter._counters_lock:
+            return (NonBlockingStreamReaderWriter._finished_bytes
+                    + sum([reader._bytes_read[0] for reader in NonBlockingStreamReaderWriter._live_readers]))
+
+    def queue_depth(self):
+        """Return the number of lines read but not taken with readline yet
+        """
+        return self._q.qsize()
+
     def get_all_output(self):
-        return self._output
+        return "".join([line + "\r\n" for line in self._output])
+
+    def join(self, timeout = None):
+        """Wait until the stream has been read to the end.
+        Return False if the timeout expired first.
+        """
+        self._t.join(timeout)
+        return not self._t.is_alive()
 
     def readline(self, timeout = 0.1):
         """Try to read a line from the stream queue.
@@ -60,4 +170,4 @@ class NonBlockingStreamReaderWriter:
         except Empty:
             return None
 
-class UnexpectedEndOfStream(Exception): pass
\ No newline at end of file
+class UnexpectedEndOfStream(Exception): pass
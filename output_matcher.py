@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# Filename: output_matcher.py
+
+import re
+from assert_variable_type import *
+
+# backreferences, named groups, group conditions and inline flags, which
+# change their meaning once a pattern is renumbered into an alternation
+_NOT_COMBINABLE = re.compile(r'\\[1-9]|\(\?P[<=]|\(\?\(|\(\?[iLmsux]+\)')
+
+class OutputMatcher:
+    """Check a stream of output lines against expected and forbidden
+    regular expressions as the lines arrive, without keeping the output.
+
+    All patterns are combined into a single compiled alternation which
+    rejects the common non-matching line in one search. Only lines that
+    match it are checked against the individual patterns. Patterns with
+    backreferences, named groups or inline flags are not combined, every
+    line is then checked against the individual patterns.
+    """
+
+    def __init__(self, expect=None, forbid=None, ordered=False):
+        """Compile the patterns
+
+        Positional arguments:
+        expect -- list of expected patterns. An entry is a regex string,
+                  which must match at least once, or a tuple of
+                  (regex, min_count) or (regex, min_count, max_count)
+                  where a max_count of None means no upper limit.
+        forbid -- list of regex strings which must not match any line
+        ordered -- whether the expected patterns must first match
+                   in the order they are listed
+        """
+        if expect is None:
+            expect = []
+        if forbid is None:
+            forbid = []
+        assert_variable_type(expect, list)
+        assert_variable_type(forbid, list)
+        assert_variable_type(ordered, bool)
+        self.ordered = ordered
+        # (pattern string, compiled pattern, min count, max count)
+        self._expect = []
+        for entry in expect:
+            if isinstance(entry, tuple):
+                pattern = entry[0]
+                min_count = entry[1]
+                max_count = entry[2] if len(entry) > 2 else None
+            else:
+                pattern, min_count, max_count = entry, 1, None
+            assert_variable_type(pattern, str)
+            assert_variable_type(min_count, int)
+            assert_variable_type(max_count, [int, NoneType])
+            self._expect.append((pattern, re.compile(pattern), min_count, max_count))
+        self._forbid = []
+        for pattern in forbid:
+            assert_variable_type(pattern, str)
+            self._forbid.append((pattern, re.compile(pattern)))
+        patterns = [e[0] for e in self._expect] + [f[0] for f in self._forbid]
+        self._combined = None
+        if patterns and not any([_NOT_COMBINABLE.search(p) for p in patterns]):
+            self._combined = re.compile('|'.join(['(?:%s)' % p for p in patterns]))
+        # match state
+        self.counts = [0] * len(self._expect)
+        self.forbidden_lines = []
+        self._next_ordered = 0
+        self._line_number = 0
+
+    def feed(self, line):
+        """Check a line of output.
+        Return True if the line matched a forbidden pattern.
+        """
+        self._line_number += 1
+        if not self._expect and not self._forbid:
+            return False
+        # both passes search the line without its line ending
+        line = line.rstrip('\r\n')
+        if self._combined is not None and self._combined.search(line) is None:
+            return False
+        for index, (pattern, regex, min_count, max_count) in enumerate(self._expect):
+            if regex.search(line):
+                self.counts[index] += 1
+                if self.ordered and index == self._next_ordered:
+                    self._next_ordered += 1
+        forbidden = False
+        for pattern, regex in self._forbid:
+            if regex.search(line):
+                forbidden = True
+                # keep the first few offending lines for the report
+                if len(self.forbidden_lines) < 10:
+                    self.forbidden_lines.append((self._line_number, pattern, line[:200]))
+        return forbidden
+
+    def verify(self):
+        """Return a list of failure messages, empty if all constraints were met
+        """
+        failures = []
+        for index, (pattern, regex, min_count, max_count) in enumerate(self._expect):
+            count = self.counts[index]
+            if count < min_count:
+                failures.append('expected "%s" at least %d time(s), matched %d'
+                                %(pattern, min_count, count))
+            elif max_count is not None and count > max_count:
+                failures.append('expected "%s" at most %d time(s), matched %d'
+                                %(pattern, max_count, count))
+        if self.ordered and self._next_ordered < len(self._expect):
+            failures.append('expected "%s" after the previous pattern but it was not found in order'
+                            %self._expect[self._next_ordered][0])
+        for line_number, pattern, line in self.forbidden_lines:
+            failures.append('forbidden "%s" matched line %d: %s' %(pattern, line_number, line))
+        return failures
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# Filename: parameter_table.py
+
+import os
+from threading import Lock
+from assert_variable_type import *
+
+def load_rows(rows, base_directory=None):
+    """Return the parameter rows of a parametrize decorator as a list.
+    A string is the path of a CSV file, whose rows become dicts keyed by
+    the header line, or of a JSON file holding a list of rows.
+
+    Positional arguments:
+    rows -- list of rows or path of a .csv or .json file
+    base_directory -- directory relative paths are also looked up in
+    """
+    if isinstance(rows, list):
+        return rows
+    # only needed for parameter files, not imported with the framework
+    import csv
+    import json
+    assert_variable_type(rows, str)
+    path = rows
+    if not os.path.exists(path) and base_directory is not None and not os.path.isabs(path):
+        path = os.path.join(base_directory, path)
+    if path.lower().endswith('.csv'):
+        with open(path, 'rb') as f:
+            return [row for row in csv.DictReader(f)]
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            table = json.load(f)
+        if not isinstance(table, list):
+            raise ValueError('parameter table "%s" does not hold a list of rows' %path)
+        return table
+    raise ValueError('parameter table "%s" is not a .csv or .json file' %path)
+
+def row_ids(rows, ids=None):
+    """Return the ids of the rows used in the sub-case names,
+    the row indexes unless ids are given
+    """
+    if ids is None:
+        return [str(index) for index in range(len(rows))]
+    if len(ids) != len(rows):
+        raise ValueError('%d ids were given for %d parameter rows' %(len(ids), len(rows)))
+    return [str(x) for x in ids]
+
+def call_with_row(function, row):
+    """Call a case with a parameter row, a dict is passed
+    as keyword arguments, a list or tuple as positional ones
+    """
+    if isinstance(row, dict):
+        return function(**row)
+    if isinstance(row, (list, tuple)):
+        return function(*row)
+    return function(row)
+
+class ResultTable:
+    """Results of the sub-cases of a parametrized case, kept in parallel
+    columns instead of one dict per sub-case. Sub-cases finishing on
+    different workers append their results under a lock.
+    """
+    COLUMNS = ['name', 'row', 'passed', 'num_checks', 'num_checks_passed', 'execution_time']
+
+    def __init__(self, case):
+        """Positional arguments:
+        case -- name of the parametrized case
+        """
+        self.case = case
+        self.name = []
+        self.row = []
+        self.passed = []
+        self.num_checks = []
+        self.num_checks_passed = []
+        self.execution_time = []
+        self._lock = Lock()
+
+    def append(self, name, row, passed, num_checks, num_checks_passed, execution_time):
+        with self._lock:
+            self.name.append(name)
+            self.row.append(row)
+            self.passed.append(passed)
+            self.num_checks.append(num_checks)
+            self.num_checks_passed.append(num_checks_passed)
+            self.execution_time.append(execution_time)
+
+    def __len__(self):
+        return len(self.name)
+
+    def num_passed(self):
+        return self.passed.count(True)
+
+    def failed(self):
+        """Return the names of the failed sub-cases in row order
+        """
+        return [self.name[i] for i in sorted(range(len(self.name)), key=lambda i: self.row[i])
+                if not self.passed[i]]
+
+    def total_time(self):
+        return sum(self.execution_time)
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# Filename: pty_stream.py
+
+import os
+import re
+import errno
+import fcntl
+import select
+import struct
+import termios
+
+# CSI sequences (colors, cursor movement), OSC sequences (window titles)
+# terminated by BEL or ST, and two character escape sequences
+ANSI_ESCAPE = re.compile(r'\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])')
+
+def strip_ansi(text):
+    """Return text without ANSI escape sequences
+    """
+    return ANSI_ESCAPE.sub('', text)
+
+def set_terminal_size(fd, rows, columns):
+    """Set the window size of the terminal of a file descriptor
+    """
+    fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack('HHHH', rows, columns, 0, 0))
+
+def open_pty(rows=24, columns=80):
+    """Return the master and slave file descriptors of
+    a new pseudo-terminal of the given size
+    """
+    master, slave = os.openpty()
+    set_terminal_size(slave, rows, columns)
+    return master, slave
+
+class PtyStream(object):
+    """Line reader over the master side of a pseudo-terminal, read by
+    NonBlockingStreamReaderWriter in place of a pipe. All output of the
+    process arrives on the one terminal, so a single reader waiting in
+    select serves both stdout and stderr.
+    """
+
+    def __init__(self, master_fd, strip_ansi=False, read_size=65536, poll_seconds=0.1):
+        """Positional arguments:
+        master_fd -- master file descriptor of the pseudo-terminal, closed at the end
+        strip_ansi (bool) -- whether to remove ANSI escape sequences from the lines
+        read_size (int) -- maximum number of bytes taken from the terminal at once
+        poll_seconds (int/float) -- how often to check whether the stream was closed
+        """
+        self.fd = master_fd
+        self.strip_ansi = strip_ansi
+        self.read_size = read_size
+        self.poll_seconds = poll_seconds
+        self.closed = False
+        self._buffer = ''
+        self._eof = False
+
+    def _line(self, line):
+        # the terminal turns every \n into \r\n
+        if line.endswith('\r\n'):
+            line = line[:-2] + '\n'
+        if self.strip_ansi:
+            line = strip_ansi(line)
+        return line
+
+    def readline(self):
+        """Return the next line including its newline, the remaining
+        output at the end of the stream, and '' once it has ended
+        """
+        while True:
+            end = self._buffer.find('\n')
+            if end >= 0:
+                line, self._buffer = self._buffer[:end + 1], self._buffer[end + 1:]
+                return self._line(line)
+            if self._eof or self.closed:
+                line, self._buffer = self._buffer, ''
+                if not line:
+                    self.close()
+                return self._line(line)
+            readable = select.select([self.fd], [], [], self.poll_seconds)[0]
+            if not readable:
+                continue
+            try:
+                data = os.read(self.fd, self.read_size)
+            except OSError as e:
+                # EIO once every process holding the slave side has exited
+                if e.errno != errno.EIO:
+                    raise
+                data = ''
+            if not data:
+                self._eof = True
+            self._buffer += data
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            os.close(self.fd)
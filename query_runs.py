@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# Filename: query_runs.py
+
+"""Query the results and archived output of previous runs kept in a
+history file (ExternalProgramTestSuite.history_file) and log archives
+(ExternalProgramTestSuite.log_archive). Only the indexed rows and the
+archive members a query needs are read.
+
+e.g. python query_runs.py history.db regressions --days 7 --threshold 20
+     python query_runs.py history.db output MyCase --stream stderr --runs 30
+     python query_runs.py history.db grep "Segmentation fault" --runs 100
+"""
+import re
+import sys
+import time
+import zlib
+import argparse
+from run_history import RunHistory
+from log_sink import decompress_member
+
+def regressions(history, days=7, threshold=20.0, baseline_days=28):
+    """Return (suite, case, baseline seconds, recent seconds, percent change)
+    of the cases whose mean duration of the last days is more than
+    threshold percent above their mean of the baseline_days before,
+    largest regression first
+    """
+    now = time.time()
+    since = now - days * 86400
+    rows = history.duration_changes(since, since - baseline_days * 86400)
+    results = []
+    for suite, case, recent_runs, recent, baseline in rows:
+        if not recent_runs or not baseline:
+            continue
+        change = (recent - baseline) * 100.0 / baseline
+        if change > threshold:
+            results.append((suite, case, baseline, recent, change))
+    return sorted(results, key=lambda x: -x[4])
+
+def _read(archive, offset, length, missing):
+    try:
+        return decompress_member(archive, offset, length)
+    except (IOError, OSError, zlib.error):
+        # archives of old runs may have been deleted or truncated
+        if archive not in missing:
+            missing.add(archive)
+            sys.stderr.write('archive "%s" cannot be read\n' %archive)
+        return ''
+
+def case_output(history, case, stream=None, last_runs=30, suite=None):
+    """Yield (run id, run start, check id, stream, output) of a case's
+    archived output in its last runs
+    """
+    missing = set()
+    for run_id, started, check_id, member_stream, archive, offset, length in \
+            history.case_log_members(case, stream, last_runs, suite):
+        yield run_id, started, check_id, member_stream, _read(archive, offset, length, missing)
+
+def grep_failed_checks(history, pattern, last_runs=30, stream=None):
+    """Yield (run id, check id, stream, line) of the lines matching a
+    regex in the archived output of the failed checks of the last runs
+    """
+    regex = re.compile(pattern)
+    missing = set()
+    for run_id, check_id, member_stream, archive, offset, length in \
+            history.failed_check_log_members(last_runs, stream):
+        for line in _read(archive, offset, length, missing).splitlines():
+            if regex.search(line):
+                yield run_id, check_id, member_stream, line
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('history', help='history file of the runs')
+    subparsers = parser.add_subparsers(dest='command')
+    parser_regressions = subparsers.add_parser('regressions', help='cases whose duration regressed')
+    parser_regressions.add_argument('--days', type=float, default=7)
+    parser_regressions.add_argument('--baseline-days', type=float, default=28)
+    parser_regressions.add_argument('--threshold', type=float, default=20.0,
+                                    help='percentage the mean duration has to grow by')
+    parser_output = subparsers.add_parser('output', help='archived output of a case across runs')
+    parser_output.add_argument('case')
+    parser_output.add_argument('--suite')
+    parser_output.add_argument('--stream', choices=['stdout', 'stderr'])
+    parser_output.add_argument('--runs', type=int, default=30)
+    parser_grep = subparsers.add_parser('grep', help='search the archived output of failed checks')
+    parser_grep.add_argument('pattern')
+    parser_grep.add_argument('--stream', choices=['stdout', 'stderr'])
+    parser_grep.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+    history = RunHistory(args.history)
+    try:
+        if args.command == 'regressions':
+            for suite, case, baseline, recent, change in regressions(history, args.days, args.threshold,
+                                                                      args.baseline_days):
+                print('%s.%s: %.4f -> %.4f seconds (+%.1f%%)' %(suite, case, baseline, recent, change))
+        elif args.command == 'output':
+            run = None
+            for run_id, started, check_id, stream, output in case_output(history, args.case, args.stream,
+                                                                         args.runs, args.suite):
+                if run_id != run:
+                    run = run_id
+                    print('=== run %d, %s' %(run_id, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))))
+                sys.stdout.write(output)
+        else:
+            for run_id, check_id, stream, line in grep_failed_checks(history, args.pattern, args.runs,
+                                                                     args.stream):
+                print('run %d %s [%s]: %s' %(run_id, check_id, stream, line))
+    finally:
+        history.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# Filename: readiness_probes.py
+
+import os
+import re
+import socket
+import timeit
+from threading import Thread, Event
+from assert_variable_type import *
+
+class ReadinessProbe(object):
+    """Base class of the conditions run_subprocess waits for
+    before returning a daemon process.
+    """
+    description = 'ready'
+
+    def feed(self, stream, line):
+        """Called with every line the process writes.
+        Return True if the line made the probe ready.
+        """
+        return False
+
+    def is_ready(self):
+        """Return True once the condition is met
+        """
+        return False
+
+class LogLineProbe(ReadinessProbe):
+    """Ready when a line of the process output matches a pattern
+    """
+
+    def __init__(self, pattern, stream='stdout'):
+        """Positional arguments:
+        pattern -- regex a line of output has to match
+        stream -- 'stdout' or 'stderr'
+        """
+        assert_variable_type(pattern, str)
+        assert_variable_type(stream, str)
+        if stream not in ('stdout', 'stderr'):
+            raise ValueError('stream argument "%s" is not "stdout" or "stderr"' %stream)
+        self._regex = re.compile(pattern)
+        self._stream = stream
+        self._ready = False
+        self.description = 'log line "%s" on %s' %(pattern, stream)
+
+    def feed(self, stream, line):
+        if not self._ready and stream == self._stream and self._regex.search(line):
+            self._ready = True
+            return True
+        return False
+
+    def is_ready(self):
+        return self._ready
+
+class SocketProbe(ReadinessProbe):
+    """Ready when a TCP port or Unix socket accepts connections
+    """
+
+    def __init__(self, port=None, host='127.0.0.1', path=None):
+        """Positional arguments:
+        port -- TCP port to connect to
+        host -- host of the TCP port
+        path -- path of a Unix socket, used instead of host and port
+        """
+        assert_variable_type(port, [int, NoneType])
+        assert_variable_type(host, str)
+        assert_variable_type(path, [str, NoneType])
+        if (port is None) == (path is None):
+            raise ValueError('exactly one of the port and path arguments must be given')
+        self._port = port
+        self._host = host
+        self._path = path
+        if path is not None:
+            self.description = 'unix socket %s' %path
+        else:
+            self.description = 'tcp %s:%d' %(host, port)
+
+    def is_ready(self):
+        if self._path is not None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = self._path
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = (self._host, self._port)
+        sock.settimeout(1)
+        try:
+            sock.connect(address)
+            return True
+        except (socket.error, socket.timeout):
+            return False
+        finally:
+            sock.close()
+
+class FileProbe(ReadinessProbe):
+    """Ready when a file exists, e.g. a pid file
+    """
+
+    def __init__(self, path):
+        assert_variable_type(path, str)
+        self._path = path
+        self.description = 'file %s' %path
+
+    def is_ready(self):
+        return os.path.exists(self._path)
+
+class CallableProbe(ReadinessProbe):
+    """Ready when a function returns a true value
+    """
+
+    def __init__(self, function, description=None):
+        self._function = function
+        self.description = description or 'callable %s' %getattr(function, '__name__', function)
+
+    def is_ready(self):
+        return bool(self._function())
+
+class ReadinessWaiter:
+    """Wait for all probes of a daemon process to become ready.
+
+    Log line probes and the process exiting wake the waiter up as soon as
+    they happen. Socket, file and callable conditions have no event to
+    wait on, they are re-evaluated with an exponential backoff which the
+    events cut short.
+    """
+    # bounds of the backoff between condition evaluations
+    min_interval = .001
+    max_interval = .1
+
+    def __init__(self, probes):
+        """Positional arguments:
+        probes -- a ReadinessProbe or a list of probes which all have to be ready
+        """
+        if not isinstance(probes, list):
+            probes = [probes]
+        for probe in probes:
+            assert_variable_type(probe, ReadinessProbe)
+        self._probes = probes
+        self._changed = Event()
+
+    def stdout_line(self, line):
+        self._feed('stdout', line)
+
+    def stderr_line(self, line):
+        self._feed('stderr', line)
+
+    def _feed(self, stream, line):
+        for probe in self._probes:
+            if probe.feed(stream, line):
+                self._changed.set()
+
+    def wait(self, process, timeout):
+        """Block until all probes are ready and return the seconds taken.
+        Raise ReadinessError if the process exits or the timeout expires first.
+
+        Positional arguments:
+        process -- the process returned by run_subprocess
+        timeout -- seconds to wait for
+        """
+        start_time = timeit.default_timer()
+        deadline = start_time + timeout
+        # the stdout reader reaching the end of the stream means the
+        # process exited, wake up without reaping the process here
+        def _watch_exit():
+            process.stdout_reader.join()
+            self._changed.set()
+        watcher = Thread(target=_watch_exit)
+        watcher.daemon = True
+        watcher.start()
+        interval = self.min_interval
+        pending = list(self._probes)
+        while True:
+            pending = [probe for probe in pending if not probe.is_ready()]
+            if not pending:
+                return timeit.default_timer() - start_time
+            if process.poll() is not None:
+                raise ReadinessError('process exited with return code %d before %s'
+                                     %(process.returncode, pending[0].description))
+            remaining = deadline - timeit.default_timer()
+            if remaining <= 0:
+                raise ReadinessError('%s not ready within %.4f seconds'
+                                     %(pending[0].description, timeout))
+            self._changed.wait(min(interval, remaining))
+            self._changed.clear()
+            interval = min(interval * 2, self.max_interval)
+
+class ReadinessError(Exception): pass
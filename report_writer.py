@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# Filename: report_writer.py
+
+# jinja2 and xhtml2pdf take hundreds of milliseconds to import, so they
+# are only imported by the functions writing a report, never by importing
+# this module or the framework
+
+_TEMPLATE = """<html>
+<head>
+<meta charset="utf-8">
+<title>{{ title }}</title>
+<style>
+body { font-family: Helvetica, sans-serif; font-size: 10pt; }
+table { border-collapse: collapse; }
+th, td { border: 1px solid #999999; padding: 3px 6px; text-align: left; }
+.ok { background-color: #c8f0c8; }
+.notok { background-color: #f0c8c8; }
+.notrun { background-color: #f0f0c8; }
+</style>
+</head>
+<body>
+<h1>{{ title }}</h1>
+<table>
+<tr><th>Suite</th><th>Description</th><th>Tests</th><th>Checks</th><th>Seconds</th><th>Result</th></tr>
+{% for suite in suites %}
+<tr class="{{ suite.css }}">
+<td>{{ suite.name }}</td>
+<td>{{ suite.description or '' }}</td>
+<td>{{ suite.num_passed }}/{{ suite.num_tests }}</td>
+<td>{{ suite.num_checks_passed }}/{{ suite.num_checks }}</td>
+<td>{{ '%.4f'|format(suite.execution_time) }}</td>
+<td>{{ suite.result }}</td>
+</tr>
+{% endfor %}
+</table>
+<p>{{ num_passed }}/{{ num_suites }} suites passed</p>
+</body>
+</html>
+"""
+
+def _suite_rows(test_suites):
+    rows = []
+    for name, results in sorted(test_suites.items()):
+        row = dict(results)
+        row['name'] = name
+        if results.get('skipped') or results.get('not_run'):
+            row['result'] = 'SKIPPED' if results.get('skipped') else 'NOT RUN'
+            row['css'] = 'notrun'
+        elif not results.get('has_run'):
+            continue
+        else:
+            row['result'] = 'OK' if results.get('passed') else 'NOT OK'
+            row['css'] = 'ok' if results.get('passed') else 'notok'
+        rows.append(row)
+    return rows
+
+def render_html(test_suites, title='Test Results'):
+    """Return the HTML summary of the suite results
+
+    Positional arguments:
+    test_suites -- dict of suite name to results, as ExternalProgramTestSuite._test_suites
+    title -- heading of the report
+    """
+    import jinja2
+    suites = _suite_rows(test_suites)
+    template = jinja2.Template(_TEMPLATE, autoescape=True)
+    return template.render(title=title,
+                           suites=suites,
+                           num_suites=len(suites),
+                           num_passed=len([s for s in suites if s['result'] == 'OK']))
+
+def write_report(path, test_suites, title='Test Results'):
+    """Write the summary of the suite results to path,
+    as a PDF if path ends with .pdf and as HTML otherwise
+    """
+    html = render_html(test_suites, title)
+    if path.lower().endswith('.pdf'):
+        from xhtml2pdf import pisa
+        with open(path, 'wb') as f:
+            status = pisa.CreatePDF(html, dest=f)
+        if status.err:
+            raise IOError('could not write the PDF report "%s"' %path)
+    else:
+        with open(path, 'w') as f:
+            f.write(html.encode('utf-8'))
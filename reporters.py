@@ -0,0 +1,199 @@
+#!/usr/bin/python
+# Filename: reporters.py
+
+import re
+import json
+import time
+from threading import Lock
+from xml.sax.saxutils import quoteattr, escape
+from assert_variable_type import *
+from pty_stream import strip_ansi
+
+# characters XML 1.0 does not allow, even escaped
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# case states reported by case_finished
+CASE_STATES = ['passed', 'failed', 'skipped', 'not_run']
+
+class Reporter(object):
+    """Base class of the machine readable reporters. The suites call the
+    event methods as checks, cases and suites finish, from the threads
+    running them. A reporter writes and flushes each event right away and
+    keeps no more than the checks of the cases still running in memory.
+    """
+
+    def __init__(self, path):
+        """Positional arguments:
+        path -- file the report is written to, truncated first
+        """
+        assert_variable_type(path, str)
+        self.path = path
+        self._file = open(path, 'w')
+        self._lock = Lock()
+
+    def suite_started(self, suite):
+        pass
+
+    def check_finished(self, suite, case, check_id, passed, execution_time=None,
+                       messages=None, flaky=False, quarantined=False):
+        pass
+
+    def case_finished(self, suite, case, state, num_checks, num_checks_passed, execution_time):
+        pass
+
+    def suite_finished(self, suite, results):
+        pass
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class _TrailerReporter(Reporter):
+    """A reporter whose file always ends with a trailer closing the
+    document. Each new entry overwrites the trailer and writes it again,
+    so the file is complete whenever the run stops.
+    """
+
+    def _trailer(self):
+        return ''
+
+    def _append(self, text):
+        """Write text in front of the trailer and flush, the lock must be held
+        """
+        self._file.seek(self._trailer_offset)
+        self._file.write(text)
+        self._trailer_offset = self._file.tell()
+        self._file.write(self._trailer())
+        self._file.truncate()
+        self._file.flush()
+
+def _xml_text(text):
+    """Return program output as valid XML 1.0 text before escaping:
+    without ANSI escape sequences, illegal control characters and
+    invalid UTF-8
+    """
+    text = _XML_ILLEGAL.sub('', strip_ansi(text))
+    return text.decode('utf-8', 'replace').encode('utf-8')
+
+class JUnitReporter(_TrailerReporter):
+    """JUnit XML report, one testcase per case in a single testsuite
+    whose counts are rewritten in place after every case
+    """
+    # fixed width of the counts rewritten in place
+    _COUNTS = 'tests="%010d" failures="%010d" skipped="%010d" time="%016.4f"'
+
+    def __init__(self, path, name='external_program_tests'):
+        Reporter.__init__(self, path)
+        self._checks = {}
+        self._tests = self._failures = self._skipped = 0
+        self._time = 0.0
+        self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n<testsuite name=%s '
+                         %quoteattr(name))
+        self._counts_offset = self._file.tell()
+        self._file.write(self._COUNTS %(0, 0, 0, 0) + '>\n')
+        self._trailer_offset = self._file.tell()
+        self._file.write(self._trailer())
+        self._file.flush()
+
+    def _trailer(self):
+        return '</testsuite>\n</testsuites>\n'
+
+    def check_finished(self, suite, case, check_id, passed, execution_time=None,
+                       messages=None, flaky=False, quarantined=False):
+        with self._lock:
+            self._checks.setdefault((suite, case), []).append(
+                (check_id, passed, messages or [], flaky, quarantined))
+
+    def case_finished(self, suite, case, state, num_checks, num_checks_passed, execution_time):
+        with self._lock:
+            checks = self._checks.pop((suite, case), [])
+            element = '<testcase classname=%s name=%s time="%.4f">\n' %(quoteattr(_xml_text(suite)),
+                                                                      quoteattr(_xml_text(case)),
+                                                                      execution_time or 0)
+            if state in ['skipped', 'not_run']:
+                element += '<skipped message=%s/>\n' %quoteattr(state.replace('_', ' '))
+                self._skipped += 1
+            elif state == 'failed':
+                failed = [c for c in checks if not c[1] and not c[4]]
+                message = '%d/%d checks passed' %(num_checks_passed, num_checks)
+                details = '\n'.join(['%s%s\n%s' %(c[0], ' (flaky)' if c[3] else '', '\n'.join(c[2]))
+                                     for c in failed])
+                element += '<failure message=%s>%s</failure>\n' %(quoteattr(_xml_text(message)),
+                                                                   escape(_xml_text(details)))
+                self._failures += 1
+            quarantined = [c[0] for c in checks if not c[1] and c[4]]
+            if quarantined:
+                element += '<system-out>%s</system-out>\n' %escape(_xml_text(
+                    '\n'.join(['quarantined failure: %s' %c for c in quarantined])))
+            element += '</testcase>\n'
+            self._tests += 1
+            self._time += execution_time or 0
+            self._append(element)
+            self._file.seek(self._counts_offset)
+            self._file.write(self._COUNTS %(self._tests, self._failures, self._skipped, self._time))
+            self._file.seek(0, 2)
+            self._file.flush()
+
+class JsonLinesReporter(Reporter):
+    """One JSON object per line for every check, case and suite event
+    """
+
+    def _write(self, event):
+        event['timestamp'] = time.time()
+        with self._lock:
+            self._file.write(json.dumps(event, sort_keys=True) + '\n')
+            self._file.flush()
+
+    def suite_started(self, suite):
+        self._write({'event': 'suite_started', 'suite': suite})
+
+    def check_finished(self, suite, case, check_id, passed, execution_time=None,
+                       messages=None, flaky=False, quarantined=False):
+        self._write({'event': 'check', 'suite': suite, 'case': case, 'check': check_id,
+                     'passed': passed, 'execution_time': execution_time,
+                     'messages': messages or [], 'flaky': flaky, 'quarantined': quarantined})
+
+    def case_finished(self, suite, case, state, num_checks, num_checks_passed, execution_time):
+        self._write({'event': 'case', 'suite': suite, 'case': case, 'state': state,
+                     'num_checks': num_checks, 'num_checks_passed': num_checks_passed,
+                     'execution_time': execution_time})
+
+    def suite_finished(self, suite, results):
+        event = {'event': 'suite', 'suite': suite}
+        for key in ['num_tests', 'num_passed', 'num_skipped', 'num_not_run', 'num_checks',
+                    'num_checks_passed', 'num_checks_flaky', 'num_checks_quarantined',
+                    'execution_time', 'passed']:
+            event[key] = results.get(key)
+        self._write(event)
+
+class TapReporter(_TrailerReporter):
+    """TAP version 13, one test point per case with the checks as
+    diagnostics. The plan is kept at the end of the file.
+    """
+
+    def __init__(self, path):
+        Reporter.__init__(self, path)
+        self._count = 0
+        self._file.write('TAP version 13\n')
+        self._trailer_offset = self._file.tell()
+        self._file.write(self._trailer())
+        self._file.flush()
+
+    def _trailer(self):
+        return '1..%d\n' %self._count
+
+    def check_finished(self, suite, case, check_id, passed, execution_time=None,
+                       messages=None, flaky=False, quarantined=False):
+        status = 'pass' if passed else ('quarantined' if quarantined else ('flaky' if flaky else 'fail'))
+        lines = ['# %s.%s check %s: %s' %(suite, case, status, check_id)]
+        lines += ['#   %s' %message for message in messages or []]
+        with self._lock:
+            self._append(''.join([line.replace('\n', ' ') + '\n' for line in lines]))
+
+    def case_finished(self, suite, case, state, num_checks, num_checks_passed, execution_time):
+        with self._lock:
+            self._count += 1
+            line = '%s %d - %s.%s' %('ok' if state != 'failed' else 'not ok', self._count, suite, case)
+            if state in ['skipped', 'not_run']:
+                line += ' # SKIP %s' %state.replace('_', ' ')
+            self._append(line + '\n')
@@ -0,0 +1,115 @@
+#!/usr/bin/python
+# Filename: resource_pool.py
+
+import os
+from threading import Lock
+from assert_variable_type import *
+
+# requirements of a case that does not declare any
+DEFAULT_REQUIREMENTS = {'cpus': 1, 'mem_mb': 0, 'exclusive': []}
+
+def host_cpus():
+    """Return the number of CPUs of the host
+    """
+    try:
+        return os.sysconf('SC_NPROCESSORS_ONLN')
+    except (ValueError, OSError, AttributeError):
+        pass
+    # multiprocessing is slow to import, only fall back on it
+    import multiprocessing
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+def host_mem_mb():
+    """Return the physical memory of the host in MB, None if unknown
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def validate_requirements(cpus, mem_mb, exclusive):
+    """Validate resource requirements and return them as a dict
+    """
+    assert_variable_type(cpus, [int, float])
+    assert_variable_type(mem_mb, [int, float])
+    assert_variable_type(exclusive, list)
+    [assert_variable_type(x, str) for x in exclusive]
+    if cpus < 0 or mem_mb < 0:
+        raise ValueError('resource requirements can not be negative')
+    return {'cpus': cpus, 'mem_mb': mem_mb, 'exclusive': list(exclusive)}
+
+class ResourcePool:
+    """The CPU slots, memory budget and named exclusive tokens of the host.
+
+    Requirements larger than the capacity are clamped to it, so such a case
+    runs alone instead of never. Schedulers register a condition with
+    listen() to be woken up whenever resources are released, including
+    releases by other schedulers sharing the pool.
+    """
+
+    def __init__(self, cpus=None, mem_mb=None):
+        """Positional arguments:
+        cpus -- number of CPU slots, defaults to the host's CPUs
+        mem_mb -- memory budget in MB, defaults to the host's memory,
+                  None if the host's memory is unknown means no budget
+        """
+        self.cpus = cpus if cpus is not None else host_cpus()
+        self.mem_mb = mem_mb if mem_mb is not None else host_mem_mb()
+        self._used_cpus = 0
+        self._used_mem_mb = 0
+        self._held_tokens = set()
+        self._lock = Lock()
+        self._listeners = []
+
+    def _clamp(self, requirements):
+        if requirements is None:
+            requirements = DEFAULT_REQUIREMENTS
+        cpus = min(requirements.get('cpus', 1), self.cpus)
+        mem_mb = requirements.get('mem_mb', 0)
+        if self.mem_mb is not None:
+            mem_mb = min(mem_mb, self.mem_mb)
+        return cpus, mem_mb, requirements.get('exclusive', [])
+
+    def try_acquire(self, requirements):
+        """Reserve the resources if they are available and return True,
+        otherwise return False without reserving anything.
+        """
+        cpus, mem_mb, tokens = self._clamp(requirements)
+        with self._lock:
+            if self._used_cpus + cpus > self.cpus:
+                return False
+            if self.mem_mb is not None and self._used_mem_mb + mem_mb > self.mem_mb:
+                return False
+            if [token for token in tokens if token in self._held_tokens]:
+                return False
+            self._used_cpus += cpus
+            self._used_mem_mb += mem_mb
+            self._held_tokens.update(tokens)
+            return True
+
+    def release(self, requirements):
+        """Give back resources reserved with try_acquire and wake up the listeners
+        """
+        cpus, mem_mb, tokens = self._clamp(requirements)
+        with self._lock:
+            self._used_cpus -= cpus
+            self._used_mem_mb -= mem_mb
+            self._held_tokens.difference_update(tokens)
+            listeners = list(self._listeners)
+        for condition in listeners:
+            with condition:
+                condition.notify_all()
+
+    def listen(self, condition):
+        """Notify the threading.Condition whenever resources are released
+        """
+        with self._lock:
+            self._listeners.append(condition)
+
+    def unlisten(self, condition):
+        with self._lock:
+            if condition in self._listeners:
+                self._listeners.remove(condition)
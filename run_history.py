@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# Filename: run_history.py
+
+import time
+import sqlite3
+from threading import Lock
+from assert_variable_type import *
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS check_results (
+    run_id INTEGER NOT NULL,
+    check_id TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    flaky INTEGER NOT NULL,
+    reruns INTEGER NOT NULL,
+    reruns_passed INTEGER NOT NULL,
+    recorded REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS check_results_check_id ON check_results (check_id, run_id);
+CREATE INDEX IF NOT EXISTS check_results_failed ON check_results (passed, run_id);
+CREATE TABLE IF NOT EXISTS case_results (
+    run_id INTEGER NOT NULL,
+    suite TEXT NOT NULL,
+    case_name TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    recorded REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS case_results_case ON case_results (suite, case_name, run_id);
+CREATE INDEX IF NOT EXISTS case_results_recorded ON case_results (recorded);
+CREATE TABLE IF NOT EXISTS log_members (
+    run_id INTEGER NOT NULL,
+    suite TEXT,
+    case_name TEXT,
+    check_id TEXT,
+    stream TEXT NOT NULL,
+    archive TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS log_members_case ON log_members (case_name, stream, run_id);
+CREATE INDEX IF NOT EXISTS log_members_check ON log_members (run_id, check_id);
+"""
+
+class RunHistory:
+    """Results of previous runs kept in a SQLite database,
+    used to compute how flaky a check has been.
+    """
+
+    def __init__(self, path):
+        """Open or create the history database
+
+        Positional arguments:
+        path -- path of the SQLite database file
+        """
+        assert_variable_type(path, str)
+        self.path = path
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self.run_id = None
+
+    def start_run(self):
+        """Start recording a new run and return its id
+        """
+        with self._lock:
+            cursor = self._connection.execute('INSERT INTO runs (started) VALUES (?)', (time.time(),))
+            self._connection.commit()
+            self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def record_check(self, check_id, passed, flaky=False, reruns=0, reruns_passed=0):
+        """Record the result of a check in the current run
+        """
+        if self.run_id is None:
+            self.start_run()
+        with self._lock:
+            self._connection.execute('INSERT INTO check_results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                     (self.run_id, check_id, int(passed), int(flaky),
+                                      reruns, reruns_passed, time.time()))
+            self._connection.commit()
+
+    def record_case(self, suite, case, passed, duration):
+        """Record the result and duration of a case in the current run
+        """
+        if self.run_id is None:
+            self.start_run()
+        with self._lock:
+            self._connection.execute('INSERT INTO case_results VALUES (?, ?, ?, ?, ?, ?)',
+                                     (self.run_id, suite, case, int(passed), duration, time.time()))
+            self._connection.commit()
+
+    def record_log_member(self, entry, archive):
+        """Record where a member of the run's log archive is stored
+
+        Positional arguments:
+        entry -- index entry of the member, see log_sink.LogSink
+        archive -- absolute path of the archive part holding the member
+        """
+        if self.run_id is None:
+            self.start_run()
+        with self._lock:
+            self._connection.execute('INSERT INTO log_members VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                     (self.run_id, entry['suite'], entry['case'], entry['check'],
+                                      entry['stream'], archive, entry['offset'], entry['length'],
+                                      entry['size']))
+            self._connection.commit()
+
+    def flakiness_rate(self, check_id, last_runs=50):
+        """Return the fraction of the check's recent results that were flaky,
+        None if the check has no history.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT COUNT(*), SUM(flaky) FROM '
+                '(SELECT flaky FROM check_results WHERE check_id = ? ORDER BY run_id DESC LIMIT ?)',
+                (check_id, last_runs)).fetchone()
+        if not row[0]:
+            return None
+        return (row[1] or 0) * 1.0 / row[0]
+
+    def duration_changes(self, since, baseline_since):
+        """Return (suite, case, recent runs, mean recent duration, mean
+        baseline duration) of the cases recorded since a time, the
+        baseline being the results from baseline_since up to since
+        """
+        with self._lock:
+            return self._connection.execute(
+                'SELECT suite, case_name, '
+                'SUM(recorded >= ?), '
+                'AVG(CASE WHEN recorded >= ? THEN duration END), '
+                'AVG(CASE WHEN recorded < ? THEN duration END) '
+                'FROM case_results WHERE recorded >= ? '
+                'GROUP BY suite, case_name',
+                (since, since, since, baseline_since)).fetchall()
+
+    def case_log_members(self, case, stream=None, last_runs=30, suite=None):
+        """Return (run id, run start, check id, stream, archive, offset,
+        length) of the log members of a case in its last runs, in the
+        order they were written
+        """
+        with self._lock:
+            return self._connection.execute(
+                'SELECT m.run_id, r.started, m.check_id, m.stream, m.archive, m.offset, m.length '
+                'FROM log_members m JOIN runs r ON r.id = m.run_id '
+                'WHERE m.case_name = ? AND (? IS NULL OR m.stream = ?) AND (? IS NULL OR m.suite = ?) '
+                'AND m.run_id IN (SELECT DISTINCT run_id FROM log_members WHERE case_name = ? '
+                'ORDER BY run_id DESC LIMIT ?) '
+                'ORDER BY m.run_id, m.rowid',
+                (case, stream, stream, suite, suite, case, last_runs)).fetchall()
+
+    def failed_check_log_members(self, last_runs=30, stream=None):
+        """Return (run id, check id, stream, archive, offset, length) of
+        the log members of the failed checks of the last runs, once each
+        also when a check failed several times in a run
+        """
+        with self._lock:
+            return self._connection.execute(
+                'SELECT m.run_id, m.check_id, m.stream, m.archive, m.offset, m.length '
+                'FROM log_members m '
+                'WHERE EXISTS (SELECT 1 FROM check_results c WHERE c.run_id = m.run_id '
+                'AND c.check_id = m.check_id AND c.passed = 0) '
+                'AND (? IS NULL OR m.stream = ?) '
+                'AND m.run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?) '
+                'ORDER BY m.run_id, m.rowid',
+                (stream, stream, last_runs)).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
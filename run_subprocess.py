@@ -1,11 +1,37 @@
 #!/usr/bin/python
 # Filename: run_subprocess.py
 
+import os
 import time
 import timeit
 import subprocess
 from assert_variable_type import *
 from nbstream_readerwriter import NonBlockingStreamReaderWriter as NBSRW
+from stdin_feeder import StdinFeeder, StdinFile, open_stdin_source
+from readiness_probes import ReadinessWaiter, ReadinessError
+from trace_events import Tracer
+from framework_profiler import Profiler
+from type_validator import compile_validator, ListOf
+from log_sink import LogWriter
+from pty_stream import PtyStream, open_pty
+
+# seconds to wait for the output readers and the stdin feeder after the
+# process has exited, a grandchild may keep the pipes open indefinitely
+DRAIN_TIMEOUT = 10
+# seconds a terminated process gets to exit before it is killed
+KILL_GRACE = 1
+
+_validate_arguments = compile_validator([('command_arguments', ListOf([str, NoneType])),
+                                         ('executable_command', str),
+                                         ('stdout_file', [str, LogWriter, NoneType]),
+                                         ('stderr_file', [str, LogWriter, NoneType]),
+                                         ('print_process_output', bool),
+                                         ('keep_output', bool),
+                                         ('timeout', [int, float, NoneType]),
+                                         ('poll_seconds', [int, float, NoneType]),
+                                         ('ready_timeout', [int, float, NoneType]),
+                                         ('pty', bool),
+                                         ('strip_ansi', bool)])
 
 def run_subprocess(executable_command,
                    command_arguments = [],
@@ -15,7 +41,18 @@ def run_subprocess(executable_command,
                    stderr_file=None,
                    poll_seconds=.100,
                    buffer_size=-1,
-                   daemon=False):
+                   daemon=False,
+                   stdin=None,
+                   stdout_callback=None,
+                   stderr_callback=None,
+                   keep_output=True,
+                   ready=None,
+                   ready_timeout=30,
+                   process_callback=None,
+                   timeline=None,
+                   pty=False,
+                   terminal_size=(24, 80),
+                   strip_ansi=False):
     """Create and run a subprocess and return the process and
     execution time after it has completed.  The execution time
     does not include the time taken for file i/o when logging
@@ -26,39 +63,128 @@ def run_subprocess(executable_command,
     command_arguments (list) -- command line arguments
     timeout (int/float) -- how many seconds to allow for process completion
     print_process_output (bool) -- whether to print the process' live output 
-    stdout_file (str) -- file to log stdout to
-    stderr_file (str) -- file to log stderr to
+    stdout_file (str) -- file to log stdout to, or a log_sink.LogWriter
+    stderr_file (str) -- file to log stderr to, or a log_sink.LogWriter
     poll_seconds(int/float) -- how often in seconds to poll the subprocess 
                                 to check for completion
     daemon(bool) -- whether the process is a daemon. If True, returns process 
                     immediately after creation along with start time rather than
                     execution time.                                
+    stdin -- input for the process. A stdin_feeder.StdinFile of a file handed
+             to the process as its stdin, an open file or file descriptor,
+             a str/bytearray/memoryview/buffer, or an iterable of byte chunks
+             which is written from a separate thread as the process reads it.
+    stdout_callback -- function called with each line of stdout as it is read.
+                       The process is terminated if it returns True.
+    stderr_callback -- function called with each line of stderr as it is read.
+                       The process is terminated if it returns True.
+    keep_output (bool) -- whether the stream readers attached to the returned
+                          process as stdout_reader and stderr_reader keep
+                          the output in memory
+    ready -- a readiness_probes.ReadinessProbe or list of probes a daemon process
+             has to satisfy before it is returned. The time it took to become
+             ready is returned instead of the start time.
+    ready_timeout (int/float) -- seconds to wait for the daemon to become ready.
+                                 The process is terminated and a ReadinessError
+                                 raised if it is not ready in time.
+    process_callback -- function called with the process right after it was
+                        created, e.g. to register it for cancellation
+    timeline -- a stream_timeline.TimelineWriter the stdout and stderr lines
+                are recorded to with the time they were read
+    pty (bool) -- whether to run the process on a pseudo-terminal instead of
+                  pipes, for programs which buffer or behave differently when
+                  their output is not a terminal. stdout and stderr then share
+                  the terminal: both callbacks see every line, the output is
+                  logged to stdout_file and stdout_reader and stderr_reader
+                  are the same single reader.
+    terminal_size -- (rows, columns) of the pseudo-terminal
+    strip_ansi (bool) -- whether to remove ANSI escape sequences from the
+                         terminal output
     """
     # validate arguments
-    # list
-    assert_variable_type(command_arguments, list)     
-    # strings
-    assert_variable_type(executable_command, str) 
-    _string_vars = [stdout_file,
-                    stderr_file]
-    [assert_variable_type(x, [str, NoneType]) for x in _string_vars + command_arguments]
-    # bools 
-    assert_variable_type(print_process_output, bool) 
-    # floats
-    _float_vars = [timeout,
-                   poll_seconds]     
-    [assert_variable_type(x, [int, float, NoneType]) for x in _float_vars]
-    global process, _nbsr_stdout, _nbsr_stderr
-    process = None
-    _nbsr_stdout = None
-    _nbsr_stderr = None
+    _validate_arguments.check(command_arguments,
+                              executable_command,
+                              stdout_file,
+                              stderr_file,
+                              print_process_output,
+                              keep_output,
+                              timeout,
+                              poll_seconds,
+                              ready_timeout,
+                              pty,
+                              strip_ansi)
+    # resolve the stdin argument before starting the clock
+    popen_stdin, stdin_source = open_stdin_source(stdin)
+    # feed the daemon output to the readiness probes as well
+    waiter = None
+    if daemon and ready is not None:
+        waiter = ReadinessWaiter(ready)
+        stdout_callback = _chain_callbacks(stdout_callback, waiter.stdout_line)
+        stderr_callback = _chain_callbacks(stderr_callback, waiter.stderr_line)
+    # state shared with _exec_subprocess, kept local so that
+    # concurrent calls do not overwrite each other's process
+    state = {'process': None, 'feeder': None, 'terminated': False}
+    def _line_callback(callback):
+        # terminate the process as soon as the callback asks for it
+        if callback is None:
+            return None
+        def _call(line):
+            process = state['process']
+            if callback(line) and process.poll() is None:
+                state['terminated'] = True
+                process.terminate()
+        return _call
     def _exec_subprocess():
-        # create the subprocess to run the external program
-        global process, _nbsr_stdout, _nbsr_stderr
-        process = subprocess.Popen([executable_command] + command_arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=buffer_size)
-        # wrap p.stdout with a NonBlockingStreamReader object:
-        _nbsr_stdout = NBSRW(process.stdout, print_process_output, stdout_file)
-        _nbsr_stderr = NBSRW(process.stderr, print_process_output, stderr_file)
+        with Tracer.span('spawn', 'process', command=executable_command) as span:
+            profiling = Profiler.enabled
+            if profiling:
+                spawn_start_time = timeit.default_timer()
+            # create the subprocess to run the external program
+            if pty:
+                master, slave = open_pty(*terminal_size)
+                try:
+                    process = subprocess.Popen([executable_command] + command_arguments,
+                                               stdin=(subprocess.PIPE if popen_stdin == -1 else popen_stdin),
+                                               stdout=slave,
+                                               stderr=slave,
+                                               bufsize=buffer_size)
+                except:
+                    os.close(master)
+                    raise
+                finally:
+                    # the terminal reports the end of the output once
+                    # the process' copy of the slave side is closed
+                    os.close(slave)
+            else:
+                process = subprocess.Popen([executable_command] + command_arguments,
+                                           stdin=(subprocess.PIPE if popen_stdin == -1 else popen_stdin),
+                                           stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE,
+                                           bufsize=buffer_size)
+            if profiling:
+                Profiler.observe('spawn latency', timeit.default_timer() - spawn_start_time)
+            span.args['pid'] = process.pid
+            state['process'] = process
+            if process_callback is not None:
+                process_callback(process)
+            if pty:
+                # one reader for the terminal, which carries both streams
+                process.stdout_reader = NBSRW(PtyStream(master, strip_ansi), print_process_output, stdout_file,
+                                              _line_callback(_both_callbacks(stdout_callback, stderr_callback)),
+                                              keep_output,
+                                              timeline.stream('terminal') if timeline is not None else None)
+                process.stderr_reader = process.stdout_reader
+            else:
+                # wrap p.stdout with a NonBlockingStreamReader object:
+                process.stdout_reader = NBSRW(process.stdout, print_process_output, stdout_file,
+                                              _line_callback(stdout_callback), keep_output,
+                                              timeline.stream('stdout') if timeline is not None else None)
+                process.stderr_reader = NBSRW(process.stderr, print_process_output, stderr_file,
+                                              _line_callback(stderr_callback), keep_output,
+                                              timeline.stream('stderr') if timeline is not None else None)
+            # feed stdin from its own thread
+            if stdin_source is not None:
+                state['feeder'] = StdinFeeder(process.stdin, stdin_source)
         # if the process is a dameon break
         # execution time returned is start time
         if daemon:
@@ -67,18 +193,87 @@ def run_subprocess(executable_command,
         _deadline = None
         if timeout is not None:           
             _deadline = timeit.default_timer() + timeout
-        # poll process while it runs
-        while process.poll() is None:
-            # throw TimeoutError if timeout was specified and deadline has passed           
-            if _deadline is not None and timeit.default_timer() > _deadline and process.poll() is None:
-                process.terminate()
-                raise TimeoutError("Sub-process did not complete before %.4f seconds elapsed" %(timeout))
-            # sleep to yield for other processes           
-            time.sleep(poll_seconds)
-    execution_time = timeit.timeit(_exec_subprocess, number=1)                             
+        with Tracer.span('run', 'process', command=executable_command, pid=process.pid):
+            # poll process while it runs
+            while process.poll() is None:
+                # throw TimeoutError if timeout was specified and deadline has passed           
+                if _deadline is not None and timeit.default_timer() > _deadline and process.poll() is None:
+                    process.terminate()
+                    raise TimeoutError("Sub-process did not complete before %.4f seconds elapsed" %(timeout))
+                # sleep to yield for other processes           
+                time.sleep(poll_seconds)
+    try:
+        execution_time = timeit.timeit(_exec_subprocess, number=1)
+    finally:
+        # the child holds its own copy of a file passed by path
+        if isinstance(stdin, StdinFile) and popen_stdin is not None:
+            popen_stdin.close()
+    # wait for the daemon to become ready,
+    # the startup latency replaces the start time
+    process = state['process']
+    if waiter is not None:
+        try:
+            with Tracer.span('ready', 'process', command=executable_command, pid=process.pid):
+                execution_time += waiter.wait(process, ready_timeout)
+        except ReadinessError:
+            stop_process(process)
+            raise
+    # wait for the readers to drain the output still in the pipes
+    # unless a callback already decided to terminate the process
+    if not daemon and not state['terminated']:
+        with Tracer.span('drain', 'process', command=executable_command, pid=process.pid):
+            process.stdout_reader.join(DRAIN_TIMEOUT)
+            process.stderr_reader.join(DRAIN_TIMEOUT)
+    # surface errors raised by a stdin chunk iterator
+    feeder = state['feeder']
+    if feeder is not None and not daemon:
+        if feeder.join(DRAIN_TIMEOUT) and feeder.error is not None:
+            raise feeder.error
     # return process to allow application to communicate with it
     # and extract whatever info like stdout, stderr, returncode
     # also return execution_time to allow 
     return process, execution_time
 
+def stop_process(process, grace=KILL_GRACE):
+    """Terminate a process and wait for it, killing it if it has not
+    exited within grace seconds. Return its return code.
+    """
+    if process.poll() is None:
+        try:
+            process.terminate()
+        except OSError:
+            pass
+        deadline = timeit.default_timer() + grace
+        while process.poll() is None and timeit.default_timer() < deadline:
+            time.sleep(0.01)
+        if process.poll() is None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+            process.wait()
+    return process.returncode
+
+def _chain_callbacks(first, second):
+    """Return a line callback calling both callbacks, the
+    return value of the first one decides on termination.
+    """
+    if first is None:
+        return lambda line: second(line) and False
+    def _call(line):
+        second(line)
+        return first(line)
+    return _call
+
+def _both_callbacks(first, second):
+    """Return a line callback calling both callbacks,
+    terminating the process if either of them asks for it
+    """
+    if first is None or second is None:
+        return first or second
+    def _call(line):
+        terminate = first(line)
+        return second(line) or terminate
+    return _call
+
 class TimeoutError(Exception): pass
@@ -0,0 +1,115 @@
+#!/usr/bin/python
+# Filename: stdin_feeder.py
+
+import os
+import errno
+from threading import Thread
+from types import *
+
+# size of the slices written from in-memory buffers
+FEED_CHUNK_SIZE = 64 * 1024
+
+class StdinFile(object):
+    """Path of a file a process reads as its stdin. The file's descriptor
+    is handed to the child directly, the data is not copied through the parent.
+    """
+
+    def __init__(self, path):
+        if not isinstance(path, str):
+            raise ValueError('path argument "%s" is not a str' %type(path).__name__)
+        self.path = path
+
+    def __repr__(self):
+        return 'StdinFile(%r)' %self.path
+
+def open_stdin_source(stdin):
+    """Return the value to pass as Popen's stdin argument and the
+    StdinFeeder data source (if any) for a run_subprocess stdin argument.
+
+    Positional arguments:
+    stdin -- None to inherit the parent's stdin,
+             a StdinFile of a file whose descriptor is handed to the
+             child directly (no copy through the parent),
+             an open file object or int file descriptor,
+             a str/bytearray/memoryview/buffer holding the input in memory,
+             or an iterable/generator yielding chunks of bytes
+    """
+    if stdin is None:
+        return None, None
+    # file path, the child reads straight from the file
+    if isinstance(stdin, StdinFile):
+        return open(stdin.path, 'rb'), None
+    # already open file or file descriptor
+    if isinstance(stdin, (FileType, int)):
+        return stdin, None
+    # in-memory buffers are fed through a pipe without copying
+    if isinstance(stdin, (str, bytearray, memoryview, BufferType)):
+        return -1, memoryview(stdin)
+    # anything else must be an iterable of chunks
+    try:
+        return -1, iter(stdin)
+    except TypeError:
+        raise ValueError('stdin argument "%s" is not a StdinFile, file, buffer or iterable of chunks'
+                         %type(stdin).__name__)
+
+class StdinFeeder:
+    """Write data to a child process' stdin from a separate thread.
+
+    Writes block while the pipe is full, which throttles the producer to
+    the speed of the child. The stdout/stderr reader threads keep draining
+    the child's output meanwhile, so a child that only reads more input
+    after writing output can not deadlock against the feeder.
+    """
+
+    def __init__(self, pipe, source, chunk_size=FEED_CHUNK_SIZE):
+        """Start feeding the pipe
+
+        Positional arguments:
+        pipe -- the process' stdin file object
+        source -- a memoryview or an iterator of chunks
+        chunk_size -- size of the slices written from a memoryview
+        """
+        self.broken_pipe = False
+        self.bytes_written = 0
+        self.error = None
+        self._pipe = pipe
+        self._t = Thread(target=self._feed, args=(source, chunk_size))
+        self._t.daemon = True
+        self._t.start()
+
+    def _write(self, fd, chunk):
+        view = memoryview(chunk)
+        while len(view):
+            written = os.write(fd, view)
+            self.bytes_written += written
+            view = view[written:]
+
+    def _feed(self, source, chunk_size):
+        fd = self._pipe.fileno()
+        try:
+            if isinstance(source, memoryview):
+                for offset in range(0, len(source), chunk_size):
+                    self._write(fd, source[offset:offset + chunk_size])
+            else:
+                for chunk in source:
+                    self._write(fd, chunk)
+        except (IOError, OSError) as e:
+            # the child exited or closed its stdin before
+            # consuming all the input, stop feeding
+            if e.errno in (errno.EPIPE, errno.EINVAL):
+                self.broken_pipe = True
+            else:
+                self.error = e
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                self._pipe.close()
+            except (IOError, OSError):
+                self.broken_pipe = True
+
+    def join(self, timeout=None):
+        """Wait for the feeder to finish writing
+        """
+        self._t.join(timeout)
+        return not self._t.is_alive()
@@ -0,0 +1,165 @@
+#!/usr/bin/python
+# Filename: stream_timeline.py
+
+"""Record the chunks of several output streams with their monotonic read
+times in one binary file, and merge them back in chronological order.
+
+A timeline starts with MAGIC and the varint start time in nanoseconds,
+followed by records which begin with a varint stream id:
+  0 -- a stream definition: varint id, varint name length, name
+  n -- a chunk of stream n: zigzag varint nanoseconds since the previous
+       chunk, varint data length, data
+The time deltas are signed since the reader threads of different streams
+may take their time before and write their chunk after one another.
+
+e.g. python stream_timeline.py logs/MySuite.my_case.timeline
+"""
+import sys
+import heapq
+import argparse
+from threading import Lock
+from trace_events import monotonic_ns
+
+MAGIC = 'EPTTIMELINE1\n'
+
+def encode_varint(value):
+    """Return an unsigned integer as a little endian base 128 varint
+    """
+    data = bytearray()
+    while value > 0x7f:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+    return str(data)
+
+def _zigzag(value):
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+class TimelineStream(object):
+    """One named stream of a TimelineWriter, passed to the stream readers
+    """
+
+    def __init__(self, writer, stream_id, name):
+        self.writer = writer
+        self.stream_id = stream_id
+        self.name = name
+
+    def record(self, data):
+        """Record a chunk read now
+        """
+        self.writer.record(self.stream_id, monotonic_ns(), data)
+
+class TimelineWriter(object):
+    """Timeline file the chunks of several streams are recorded to
+    """
+
+    def __init__(self, path):
+        """Positional arguments:
+        path -- path of the timeline file, overwritten if it exists
+        """
+        self.path = path
+        self._lock = Lock()
+        self._streams = {}
+        self._last_ns = monotonic_ns()
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + encode_varint(self._last_ns))
+
+    def stream(self, name):
+        """Return the TimelineStream of a name, defined on first use
+        """
+        with self._lock:
+            stream = self._streams.get(name)
+            if stream is None:
+                stream = self._streams[name] = TimelineStream(self, len(self._streams) + 1, name)
+                self._file.write(encode_varint(0)
+                                 + encode_varint(stream.stream_id)
+                                 + encode_varint(len(name))
+                                 + name)
+            return stream
+
+    def record(self, stream_id, timestamp_ns, data):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(encode_varint(stream_id)
+                             + encode_varint(_zigzag(timestamp_ns - self._last_ns))
+                             + encode_varint(len(data))
+                             + data)
+            self._last_ns = timestamp_ns
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def _read_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = ord(data[position])
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+def read_timeline(path):
+    """Return the (timestamp ns, stream name, data) chunks of a timeline
+    in chronological order, chunks read at the same time keep their order
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError('"%s" is not a timeline file' %path)
+    timestamp, position = _read_varint(data, len(MAGIC))
+    names = {}
+    chunks = []
+    # a record cut short by a crash ends the timeline
+    try:
+        while position < len(data):
+            stream_id, position = _read_varint(data, position)
+            if stream_id == 0:
+                stream_id, position = _read_varint(data, position)
+                length, position = _read_varint(data, position)
+                names[stream_id] = data[position:position + length]
+                position += length
+                continue
+            delta, position = _read_varint(data, position)
+            length, position = _read_varint(data, position)
+            if position + length > len(data):
+                break
+            timestamp += _unzigzag(delta)
+            chunks.append((timestamp, len(chunks), names.get(stream_id, str(stream_id)),
+                           data[position:position + length]))
+            position += length
+    except IndexError:
+        pass
+    return [(t, name, chunk) for t, i, name, chunk in sorted(chunks)]
+
+def merge_timelines(paths):
+    """Return the chunks of several timelines merged in chronological
+    order as (timestamp ns, timeline path, stream name, data)
+    """
+    timelines = [[(t, path, name, chunk) for t, name, chunk in read_timeline(path)]
+                 for path in paths]
+    return list(heapq.merge(*timelines))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('timelines', nargs='+', help='timeline files to merge')
+    parser.add_argument('--streams', help='comma separated names of the streams to show')
+    args = parser.parse_args()
+    streams = args.streams.split(',') if args.streams else None
+    chunks = merge_timelines(args.timelines)
+    start_ns = chunks[0][0] if chunks else 0
+    for timestamp, path, name, chunk in chunks:
+        if streams is not None and name not in streams:
+            continue
+        label = name if len(args.timelines) == 1 else '%s %s' %(path, name)
+        for line in chunk.rstrip('\r\n').split('\n'):
+            sys.stdout.write('%12.3f ms [%s] %s\n' %((timestamp - start_ns) / 1000000.0, label, line.rstrip('\r')))
+
+if __name__ == '__main__':
+    main()
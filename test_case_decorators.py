@@ -1,17 +1,29 @@
 from assert_variable_type import *
+from resource_pool import validate_requirements
+
+# decorators which call case_header once they have all run,
+# other decorators only attach attributes to the case function
+HEADER_DECORATORS = ['@name', '@description', '@timelimit', '@fixture']
+
+def _copy_attributes(wrapper, function):
+    """ Keep the attributes set by the attribute decorators
+    on the wrapped case function
+    """
+    wrapper.__dict__.update(function.__dict__)
 
 def name(name):
     """ Test case name decorator 
     """
     def decorator(function):
-        def wrapper(self):
+        def wrapper(self, *args, **kwargs):
             self._name = name
             self._wait_sem += -1
             # if semaphor is 0 print
             # case header now
             if self._wait_sem == 0:
                 self.case_header()
-            function(self)
+            function(self, *args, **kwargs)
+        _copy_attributes(wrapper, function)
         return wrapper
     return decorator
           
@@ -19,14 +31,15 @@ def description(description):
     """ Test case description decorator 
     """    
     def decorator(function):
-        def wrapper(self):
+        def wrapper(self, *args, **kwargs):
             self._description = description
             self._wait_sem += -1
             # if semaphor is 0 print
             # case header now
             if self._wait_sem == 0:
                 self.case_header()
-            function(self)
+            function(self, *args, **kwargs)
+        _copy_attributes(wrapper, function)
         return wrapper
     return decorator
 
@@ -34,36 +47,117 @@ def timelimit(timelimit):
     """ Test case timelimit decorator 
     """    
     def decorator(function):
-        def wrapper(self):
+        def wrapper(self, *args, **kwargs):
             self._timelimit = timelimit
             self._wait_sem += -1
             # if semaphor is 0 print
             # case header now
             if self._wait_sem == 0:
                 self.case_header()            
-            function(self)
+            function(self, *args, **kwargs)
+        _copy_attributes(wrapper, function)
         return wrapper
     return decorator
 
 def fixture(fixture, **kwargs):
-    """ Test case timelimit decorator 
+    """ Test case fixture decorator 
+    The scope keyword argument ('case', 'suite' or 'session')
+    decides how long the fixture is shared, see fixture_manager.
     """    
+    # the decorator's options, not to be confused with the
+    # keyword arguments of a parametrized case's call
+    options = kwargs
     def decorator(function):
-        def wrapper(self):
+        def wrapper(self, *call_args, **call_kwargs):
             self._fixture = fixture
+            self._fixture_scope = options.get('scope', 'case')
             # check for setup override
             # otherwise take from fixture
-            if 'setup' in kwargs:
-                self._case_setup = kwargs['setup']
+            if 'setup' in options:
+                self._case_setup = options['setup']
             # check for teardown override
             # otherwise take from fixture
-            if 'teardown' in kwargs:
-                self._case_teardown = kwargs['teardown']
+            if 'teardown' in options:
+                self._case_teardown = options['teardown']
             self._wait_sem += -1
             # if semaphor is 0 print
             # case header now
             if self._wait_sem == 0:
                 self.case_header()                         
-            function(self)         
+            function(self, *call_args, **call_kwargs)
+        _copy_attributes(wrapper, function)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+def depends_on(*case_names):
+    """ Test case dependency decorator
+    The case only runs after the named cases of the suite have passed
+    and is skipped if one of them fails.
+    """
+    def decorator(function):
+        function._depends_on = getattr(function, '_depends_on', []) + list(case_names)
+        return function
+    return decorator
+
+def produces(*artifacts):
+    """ Test case produced artifacts decorator
+    Cases consuming one of the artifacts run after this case has passed.
+    """
+    def decorator(function):
+        function._produces = getattr(function, '_produces', []) + list(artifacts)
+        return function
+    return decorator
+
+def consumes(*artifacts):
+    """ Test case consumed artifacts decorator
+    The case only runs after the cases producing the artifacts have passed.
+    """
+    def decorator(function):
+        function._consumes = getattr(function, '_consumes', []) + list(artifacts)
+        return function
+    return decorator
+
+def resources(cpus=1, mem_mb=0, exclusive=[]):
+    """ Test case resource requirements decorator
+    The case only starts when the CPU slots and memory are free in the
+    suite's resource pool and none of the exclusive tokens are held.
+    """
+    requirements = validate_requirements(cpus, mem_mb, exclusive)
+    def decorator(function):
+        function._resources = requirements
+        return function
+    return decorator
+
+def parametrize(rows, ids=None):
+    """ Test case parameter decorator
+    The case is expanded into one sub-case per row, named case[id], which
+    are reported individually and run on the suite's case workers. A row
+    is passed to the case as keyword arguments if it is a dict, as
+    positional arguments if it is a list, and as one argument otherwise.
+    rows may also be the path of a CSV or JSON file, see parameter_table.
+    """
+    assert_variable_type(rows, [list, str])
+    assert_variable_type(ids, [list, NoneType])
+    def decorator(function):
+        function._parameters = rows
+        function._parameter_ids = ids
+        return function
+    return decorator
+
+def retries(count):
+    """ Test case retry policy decorator
+    A failed check of the case is rerun count times in parallel to tell
+    flaky failures from consistent ones.
+    """
+    assert_variable_type(count, int)
+    def decorator(function):
+        function._retries = count
+        return function
+    return decorator
+
+def quarantine(function):
+    """ Test case quarantine decorator
+    The failed checks of the case are reported but not counted.
+    """
+    function._quarantined = True
+    return function
@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# Filename: test_case_allocator.py
+
+import os
+import sys
+import socket
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import case_allocator
+from case_allocator import CaseAllocator
+
+class CaseAllocatorTest(unittest.TestCase):
+    def setUp(self):
+        self.allocator = CaseAllocator('Suite.case name')
+
+    def tearDown(self):
+        self.allocator.release()
+
+    def test_named_ports(self):
+        port = self.allocator.port()
+        self.assertEqual(self.allocator.port(), port)
+        self.assertNotEqual(self.allocator.port('admin'), port)
+        # the port is free to bind
+        sock = socket.socket()
+        try:
+            sock.bind(('127.0.0.1', port))
+        finally:
+            sock.close()
+
+    def test_allocators_do_not_share_ports(self):
+        other = CaseAllocator('Suite.other')
+        try:
+            ports = set([self.allocator.port(str(i)) for i in range(10)])
+            self.assertFalse(ports & set([other.port(str(i)) for i in range(10)]))
+        finally:
+            other.release()
+
+    def test_port_is_locked_until_released(self):
+        port = self.allocator.port()
+        lock_file = os.path.join(case_allocator.PORT_LOCK_DIR, '%d.lock' %port)
+        with open(lock_file) as f:
+            self.assertEqual(f.read(), str(os.getpid()))
+        self.assertFalse(case_allocator._reserve_port(port))
+        self.allocator.release()
+        self.assertFalse(os.path.exists(lock_file))
+
+    def test_stale_lock_is_taken_over(self):
+        port = self.allocator.port()
+        self.allocator.release()
+        lock_file = os.path.join(case_allocator.PORT_LOCK_DIR, '%d.lock' %port)
+        # a pid above the kernel's limit is never alive
+        with open(lock_file, 'w') as f:
+            f.write('99999999')
+        self.assertTrue(case_allocator._reserve_port(port))
+        case_allocator._release_port(port)
+
+    def test_workdir_and_logs(self):
+        workdir = self.allocator.workdir
+        self.assertTrue(os.path.isdir(workdir))
+        self.assertTrue(os.path.basename(workdir).startswith('Suite.case_name-'))
+        self.assertEqual(self.allocator.log_path('server'), os.path.join(workdir, 'server.log'))
+        self.allocator.release()
+        self.assertFalse(os.path.exists(workdir))
+
+    def test_expand(self):
+        arguments = self.allocator.expand(['--port={port}', '--admin={port:admin}',
+                                           '--dir={workdir}', '--log={log:server}', 7, None])
+        self.assertEqual(arguments[0], '--port=%d' %self.allocator.port())
+        self.assertEqual(arguments[1], '--admin=%d' %self.allocator.port('admin'))
+        self.assertEqual(arguments[2], '--dir=' + self.allocator.workdir)
+        self.assertEqual(arguments[3], '--log=' + self.allocator.log_path('server'))
+        self.assertEqual(arguments[4:], [7, None])
+        self.assertEqual(self.allocator.expand('{unknown}'), '{unknown}')
+
+if __name__ == '__main__':
+    unittest.main()
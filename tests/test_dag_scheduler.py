@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# Filename: test_dag_scheduler.py
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dag_scheduler import DagScheduler, SchedulerError, PASSED, FAILED, SKIPPED, CANCELLED
+
+class DagSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.order = []
+
+    def node(self, name, passed=True, seconds=0):
+        def run():
+            if seconds:
+                time.sleep(seconds)
+            self.order.append(name)
+            return passed
+        return run
+
+    def test_dependencies_run_first(self):
+        scheduler = DagScheduler()
+        scheduler.add('c', self.node('c'), depends_on=['b'])
+        scheduler.add('b', self.node('b'), depends_on=['a'])
+        scheduler.add('a', self.node('a'))
+        self.assertEqual(scheduler.run(), {'a': PASSED, 'b': PASSED, 'c': PASSED})
+        self.assertEqual(self.order, ['a', 'b', 'c'])
+
+    def test_artifacts(self):
+        scheduler = DagScheduler()
+        scheduler.add('consumer', self.node('consumer'), consumes=['build'])
+        scheduler.add('producer', self.node('producer'), produces=['build'])
+        scheduler.run()
+        self.assertEqual(self.order, ['producer', 'consumer'])
+
+    def test_failure_skips_dependents(self):
+        skipped = []
+        scheduler = DagScheduler()
+        scheduler.add('a', self.node('a', passed=False))
+        scheduler.add('b', self.node('b'), depends_on=['a'])
+        scheduler.add('c', self.node('c'), depends_on=['b'])
+        scheduler.add('d', self.node('d'))
+        states = scheduler.run(lambda name, failed: skipped.append((name, failed)))
+        self.assertEqual(states, {'a': FAILED, 'b': SKIPPED, 'c': SKIPPED, 'd': PASSED})
+        self.assertEqual(self.order, ['a', 'd'])
+        self.assertEqual([name for name, failed in skipped], ['b', 'c'])
+
+    def test_exception_fails_node(self):
+        def boom():
+            raise RuntimeError('boom')
+        scheduler = DagScheduler()
+        scheduler.add('a', boom)
+        self.assertEqual(scheduler.run(), {'a': FAILED})
+
+    def test_cycle_and_unknown_dependency(self):
+        scheduler = DagScheduler()
+        scheduler.add('a', self.node('a'), depends_on=['b'])
+        scheduler.add('b', self.node('b'), depends_on=['a'])
+        self.assertRaises(SchedulerError, scheduler.resolve)
+        scheduler = DagScheduler()
+        scheduler.add('a', self.node('a'), depends_on=['missing'])
+        self.assertRaises(SchedulerError, scheduler.resolve)
+        scheduler = DagScheduler()
+        scheduler.add('a', self.node('a'), consumes=['nothing'])
+        self.assertRaises(SchedulerError, scheduler.resolve)
+
+    def test_duplicate_node(self):
+        scheduler = DagScheduler()
+        scheduler.add('a', self.node('a'))
+        self.assertRaises(SchedulerError, scheduler.add, 'a', self.node('a'))
+
+    def test_invalid_max_workers(self):
+        self.assertRaises(ValueError, DagScheduler, 0)
+        self.assertRaises(ValueError, DagScheduler, -1)
+
+    def test_parallel_workers(self):
+        scheduler = DagScheduler(4)
+        for name in 'abcd':
+            scheduler.add(name, self.node(name, seconds=0.2))
+        start = time.time()
+        scheduler.run()
+        self.assertLess(time.time() - start, 0.6)
+        self.assertEqual(sorted(self.order), ['a', 'b', 'c', 'd'])
+
+    def test_cancel(self):
+        cancelled = []
+        scheduler = DagScheduler()
+        def cancel():
+            scheduler.cancel()
+            return True
+        scheduler.add('a', cancel)
+        scheduler.add('b', self.node('b'))
+        states = scheduler.run(on_cancel=cancelled.append)
+        self.assertEqual(states, {'a': PASSED, 'b': CANCELLED})
+        self.assertEqual(cancelled, ['b'])
+
+    def test_critical_path(self):
+        scheduler = DagScheduler(2)
+        scheduler.add('a', self.node('a', seconds=0.1))
+        scheduler.add('b', self.node('b', seconds=0.2), depends_on=['a'])
+        scheduler.add('c', self.node('c'))
+        scheduler.run()
+        path, seconds = scheduler.critical_path()
+        self.assertEqual(path, ['a', 'b'])
+        self.assertGreaterEqual(seconds, 0.3)
+
+if __name__ == '__main__':
+    unittest.main()
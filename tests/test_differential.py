@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# Filename: test_differential.py
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from differential import ChunkComparator, compare_programs, DifferentialTimeout
+
+class ChunkComparatorTest(unittest.TestCase):
+    def test_equal_sides(self):
+        comparator = ChunkComparator()
+        for line in ['a\n', 'b\n']:
+            comparator.feed('a', line)
+        for line in ['a\n', 'b\r\n']:
+            comparator.feed('b', line)
+        self.assertEqual(comparator.finish(), None)
+        self.assertEqual(comparator.lines, {'a': 2, 'b': 2})
+
+    def test_interleaved_divergence(self):
+        comparator = ChunkComparator()
+        comparator.feed('a', 'same\n')
+        comparator.feed('b', 'same\n')
+        comparator.feed('b', 'new\n')
+        comparator.feed('a', 'old\n')
+        self.assertEqual(comparator.divergence, (2, 'old', 'new'))
+        comparator.feed('a', 'ignored\n')
+        self.assertEqual(comparator.finish(), (2, 'old', 'new'))
+
+    def test_one_side_longer(self):
+        comparator = ChunkComparator()
+        comparator.feed('a', 'x\n')
+        comparator.feed('b', 'x\n')
+        comparator.feed('b', 'extra\n')
+        self.assertEqual(comparator.finish(), (2, None, 'extra'))
+
+    def test_lead_is_the_only_state_kept(self):
+        comparator = ChunkComparator()
+        for i in range(100):
+            comparator.feed('a', '%d\n' %i)
+        for i in range(100):
+            comparator.feed('b', '%d\n' %i)
+        self.assertEqual(comparator._pending, {'a': [], 'b': []})
+        self.assertEqual(comparator.finish(), None)
+
+    def test_normalizers(self):
+        comparator = ChunkComparator([(r'pid \d+', 'pid <PID>')])
+        comparator.feed('a', 'pid 12\n')
+        comparator.feed('b', 'pid 345\n')
+        self.assertEqual(comparator.finish(), None)
+
+class CompareProgramsTest(unittest.TestCase):
+    def test_same_behavior(self):
+        result = compare_programs(['cat'], ['cat'], stdin='one\ntwo\n')
+        self.assertTrue(result.same_behavior())
+        self.assertEqual(result.a.returncode, 0)
+        self.assertTrue(result.time_ratio() > 0)
+
+    def test_different_output_and_return_code(self):
+        result = compare_programs(['sh', '-c', 'echo 1; echo 2'], ['sh', '-c', 'echo 1; echo 3; exit 2'])
+        self.assertFalse(result.same_behavior())
+        self.assertEqual(result.divergence, (2, '2', '3'))
+        self.assertEqual((result.a.returncode, result.b.returncode), (0, 2))
+
+    def test_labelled_log(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            compare_programs(['echo', 'x'], ['echo', 'y'], stdout_file=path)
+            with open(path) as f:
+                self.assertEqual(sorted(f.read().splitlines()), ['a: x', 'b: y'])
+        finally:
+            os.remove(path)
+
+    def test_timeout_kills_programs_ignoring_sigterm(self):
+        stubborn = [sys.executable, '-c', 'import signal, time\n'
+                    'signal.signal(signal.SIGTERM, signal.SIG_IGN)\n'
+                    'time.sleep(30)']
+        start = time.time()
+        self.assertRaises(DifferentialTimeout, compare_programs, stubborn, ['true'], timeout=0.2)
+        self.assertTrue(time.time() - start < 10)
+
+    def test_single_use_stdin(self):
+        self.assertRaises(ValueError, compare_programs, ['cat'], ['cat'], stdin=iter(['x\n']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/python
+# Filename: test_fixture_manager.py
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fixture_manager import FixtureManager
+
+calls = []
+
+def counting_fixture():
+    def setup():
+        calls.append('setup')
+        return 'value'
+    def teardown():
+        calls.append('teardown')
+    return setup, teardown
+
+class FixtureManagerTest(unittest.TestCase):
+    def setUp(self):
+        del calls[:]
+
+    def test_released_fixture_is_torn_down_at_scope_end(self):
+        self.assertEqual(FixtureManager.acquire(counting_fixture, 'suite', 'Released'), 'value')
+        self.assertEqual(FixtureManager.release(counting_fixture, 'suite', 'Released'), [])
+        self.assertEqual(calls, ['setup'])
+        self.assertEqual(FixtureManager.teardown_scope('suite', 'Released'), [])
+        self.assertEqual(calls, ['setup', 'teardown'])
+
+    def test_held_fixture_is_torn_down_by_the_last_release(self):
+        FixtureManager.acquire(counting_fixture, 'suite', 'Held')
+        FixtureManager.acquire(counting_fixture, 'suite', 'Held')
+        self.assertEqual(FixtureManager.teardown_scope('suite', 'Held'), [])
+        FixtureManager.release(counting_fixture, 'suite', 'Held')
+        self.assertEqual(calls, ['setup'])
+        FixtureManager.release(counting_fixture, 'suite', 'Held')
+        self.assertEqual(calls, ['setup', 'teardown'])
+
+    def test_forced_teardown_ignores_references(self):
+        FixtureManager.acquire(counting_fixture, 'suite', 'Forced')
+        FixtureManager.teardown_scope('suite', 'Forced', True)
+        self.assertEqual(calls, ['setup', 'teardown'])
+        self.assertEqual(FixtureManager.release(counting_fixture, 'suite', 'Forced'), [])
+        self.assertEqual(calls, ['setup', 'teardown'])
+
+if __name__ == '__main__':
+    unittest.main()
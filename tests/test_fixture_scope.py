@@ -0,0 +1,38 @@
+#!/usr/bin/python
+# Filename: test_fixture_scope.py
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from external_program_test_framework import *
+
+calls = []
+
+def counting_fixture():
+    def setup():
+        calls.append('setup')
+    def teardown():
+        calls.append('teardown')
+    return setup, teardown
+
+class SuiteScopedFixture(ExternalProgramTestSuite):
+    @fixture(counting_fixture, scope='suite')
+    def first_case(self):
+        self.check_subprocess('true', [], 0, print_process_output=False)
+
+    @fixture(counting_fixture, scope='suite')
+    def second_case(self):
+        self.check_subprocess('true', [], 0, print_process_output=False)
+
+class FixtureScopeTest(unittest.TestCase):
+
+    def test_suite_fixture_is_set_up_once_per_suite(self):
+        suite = SuiteScopedFixture(stdout_file=os.devnull, stderr_file=os.devnull)
+        suite.run()
+        self.assertEqual(calls.count('setup'), 1)
+        self.assertEqual(calls.count('teardown'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# Filename: test_golden_comparator.py
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from golden_comparator import GoldenComparator, TIMESTAMPS
+
+class GoldenComparatorTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def golden(self, text):
+        path = os.path.join(self.directory, 'golden.txt')
+        with open(path, 'wb') as f:
+            f.write(text)
+        return path
+
+    def compare(self, golden, lines, **kwargs):
+        comparator = GoldenComparator(self.golden(golden), **kwargs)
+        for line in lines:
+            comparator.feed(line)
+        return comparator
+
+    def test_equal_output(self):
+        comparator = self.compare('a\nb\n', ['a\n', 'b\r\n'])
+        self.assertTrue(comparator.finish())
+        self.assertEqual(comparator.diff(), [])
+
+    def test_empty_golden_file(self):
+        self.assertTrue(self.compare('', []).finish())
+        self.assertFalse(self.compare('', ['extra\n']).finish())
+
+    def test_mismatch_diff(self):
+        comparator = self.compare('a\nb\nc\n', ['a\n', 'x\n', 'c\n'])
+        self.assertFalse(comparator.finish())
+        self.assertEqual(comparator.mismatch_line, 2)
+        diff = comparator.diff()
+        self.assertIn('-b', diff)
+        self.assertIn('+x', diff)
+
+    def test_short_and_long_output(self):
+        comparator = self.compare('a\nb\n', ['a\n'])
+        self.assertFalse(comparator.finish())
+        self.assertEqual(comparator.mismatch_line, 2)
+        comparator = self.compare('a\n', ['a\n', 'b\n'])
+        self.assertFalse(comparator.finish())
+        self.assertEqual(comparator.mismatch_line, 2)
+
+    def test_normalizers(self):
+        comparator = self.compare('started at <TIMESTAMP>\n', ['started at 2024-01-02 03:04:05\n'],
+                                  normalizers=[TIMESTAMPS])
+        self.assertTrue(comparator.finish())
+
+    def test_diff_window_is_bounded(self):
+        comparator = GoldenComparator(self.golden('a\n'), max_diff_lines=5)
+        results = [comparator.feed('line %d\n' %i) for i in range(10)]
+        self.assertTrue(results[-1])
+        self.assertEqual(len(comparator._actual_tail), 5)
+
+    def test_feed_after_finish(self):
+        comparator = GoldenComparator(self.golden('a\n' * 1000))
+        def feed():
+            for i in range(10000):
+                comparator.feed('a\n')
+        thread = Thread(target=feed)
+        thread.start()
+        comparator.finish()
+        thread.join()
+        self.assertTrue(comparator.feed('a\n'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/python
+# Filename: test_output_matcher.py
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from output_matcher import OutputMatcher
+
+def feed(matcher, lines):
+    for line in lines:
+        matcher.feed(line)
+    return matcher
+
+class OutputMatcherTest(unittest.TestCase):
+    def test_expected_counts(self):
+        matcher = feed(OutputMatcher(['ready', ('error', 0, 0), ('tick', 2, 3)]),
+                       ['ready\n', 'tick\n', 'other\n', 'tick\n'])
+        self.assertEqual(matcher.counts, [1, 0, 2])
+        self.assertEqual(matcher.verify(), [])
+
+    def test_count_limits(self):
+        matcher = feed(OutputMatcher([('tick', 2, 2)]), ['tick\n'] * 3)
+        self.assertEqual(len(matcher.verify()), 1)
+        matcher = feed(OutputMatcher([('tick', 2, 2)]), ['tick\n'])
+        self.assertEqual(len(matcher.verify()), 1)
+
+    def test_forbidden(self):
+        matcher = OutputMatcher(forbid=['Traceback'])
+        self.assertFalse(matcher.feed('fine\n'))
+        self.assertTrue(matcher.feed('Traceback (most recent call last):\n'))
+        self.assertEqual(matcher.forbidden_lines, [(2, 'Traceback', 'Traceback (most recent call last):')])
+
+    def test_ordered(self):
+        self.assertEqual(feed(OutputMatcher(['first', 'second'], ordered=True),
+                              ['first\n', 'second\n']).verify(), [])
+        self.assertEqual(len(feed(OutputMatcher(['first', 'second'], ordered=True),
+                                  ['second\n', 'first\n']).verify()), 1)
+
+    def test_crlf_line_end(self):
+        matcher = feed(OutputMatcher(['done$']), ['done\r\n'])
+        self.assertEqual(matcher.counts, [1])
+
+    def test_backreferences_and_named_groups(self):
+        matcher = feed(OutputMatcher([r'(a)\1', r'(b)\1']), ['bb\n'])
+        self.assertEqual(matcher.counts, [0, 1])
+        matcher = feed(OutputMatcher([r'(?P<x>a)', r'(?P<x>b)']), ['b\n'])
+        self.assertEqual(matcher.counts, [0, 1])
+
+    def test_inline_flags_stay_with_their_pattern(self):
+        matcher = feed(OutputMatcher(['(?i)warning', 'ERROR']), ['WARNING\n', 'error\n'])
+        self.assertEqual(matcher.counts, [1, 0])
+
+if __name__ == '__main__':
+    unittest.main()
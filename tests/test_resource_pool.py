@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# Filename: test_resource_pool.py
+
+import os
+import sys
+import time
+import unittest
+from threading import Lock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resource_pool import ResourcePool, validate_requirements
+from dag_scheduler import DagScheduler
+
+class ResourcePoolTest(unittest.TestCase):
+    def test_cpu_slots(self):
+        pool = ResourcePool(cpus=2, mem_mb=100)
+        self.assertTrue(pool.try_acquire({'cpus': 1}))
+        self.assertTrue(pool.try_acquire({'cpus': 1}))
+        self.assertFalse(pool.try_acquire({'cpus': 1}))
+        pool.release({'cpus': 1})
+        self.assertTrue(pool.try_acquire({'cpus': 1}))
+
+    def test_memory_budget(self):
+        pool = ResourcePool(cpus=8, mem_mb=100)
+        self.assertTrue(pool.try_acquire({'cpus': 1, 'mem_mb': 60}))
+        self.assertFalse(pool.try_acquire({'cpus': 1, 'mem_mb': 60}))
+        self.assertTrue(pool.try_acquire({'cpus': 1, 'mem_mb': 40}))
+
+    def test_exclusive_tokens(self):
+        pool = ResourcePool(cpus=8, mem_mb=100)
+        self.assertTrue(pool.try_acquire({'cpus': 1, 'exclusive': ['gpu']}))
+        self.assertFalse(pool.try_acquire({'cpus': 1, 'exclusive': ['gpu']}))
+        self.assertTrue(pool.try_acquire({'cpus': 1, 'exclusive': ['database']}))
+        pool.release({'cpus': 1, 'exclusive': ['gpu']})
+        self.assertTrue(pool.try_acquire({'cpus': 1, 'exclusive': ['gpu']}))
+
+    def test_oversized_requirements_are_clamped(self):
+        pool = ResourcePool(cpus=2, mem_mb=100)
+        self.assertTrue(pool.try_acquire({'cpus': 16, 'mem_mb': 1000}))
+        self.assertFalse(pool.try_acquire({'cpus': 1}))
+
+    def test_validate_requirements(self):
+        self.assertEqual(validate_requirements(2, 10, ['gpu']),
+                         {'cpus': 2, 'mem_mb': 10, 'exclusive': ['gpu']})
+        self.assertRaises(ValueError, validate_requirements, -1, 0, [])
+
+    def test_scheduler_respects_capacity(self):
+        pool = ResourcePool(cpus=2, mem_mb=100)
+        lock = Lock()
+        state = {'running': 0, 'most': 0}
+        def node():
+            with lock:
+                state['running'] += 1
+                state['most'] = max(state['most'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+            return True
+        scheduler = DagScheduler(0, pool)
+        for i in range(6):
+            scheduler.add('node%d' %i, node, resources={'cpus': 1, 'mem_mb': 0, 'exclusive': []})
+        scheduler.run()
+        self.assertEqual(state['most'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
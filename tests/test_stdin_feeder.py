@@ -0,0 +1,56 @@
+#!/usr/bin/python
+# Filename: test_stdin_feeder.py
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from run_subprocess import run_subprocess
+from stdin_feeder import StdinFile, open_stdin_source
+
+def cat(stdin):
+    """Return the output of cat reading stdin"""
+    lines = []
+    run_subprocess('cat', [], print_process_output=False, stdin=stdin,
+                   stdout_callback=lambda line: lines.append(line), keep_output=False)
+    return ''.join(lines)
+
+class StdinFeederTest(unittest.TestCase):
+    def test_str_is_data(self):
+        self.assertEqual(cat('hello\n'), 'hello\n')
+
+    def test_buffers(self):
+        self.assertEqual(cat(bytearray('bytearray\n')), 'bytearray\n')
+        self.assertEqual(cat(memoryview('memoryview\n')), 'memoryview\n')
+
+    def test_large_buffer_is_fed_in_chunks(self):
+        data = ''.join(['%07d\n' %i for i in range(100000)])
+        self.assertEqual(cat(data), data)
+
+    def test_path(self):
+        fd, path = tempfile.mkstemp()
+        try:
+            os.write(fd, 'from a file\n')
+            os.close(fd)
+            self.assertEqual(cat(StdinFile(path)), 'from a file\n')
+        finally:
+            os.remove(path)
+
+    def test_iterator(self):
+        def chunks():
+            for i in range(3):
+                yield 'chunk %d\n' %i
+        self.assertEqual(cat(chunks()), 'chunk 0\nchunk 1\nchunk 2\n')
+        self.assertEqual(cat(['a\n', 'b\n']), 'a\nb\n')
+
+    def test_inherited_stdin(self):
+        self.assertEqual(open_stdin_source(None), (None, None))
+
+    def test_invalid_source(self):
+        self.assertRaises(ValueError, open_stdin_source, 1.5)
+        self.assertRaises(ValueError, StdinFile, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# Filename: test_stream_timeline.py
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream_timeline import (TimelineWriter, encode_varint, read_timeline, merge_timelines,
+                             _read_varint, _zigzag, _unzigzag)
+
+class VarintTest(unittest.TestCase):
+    def test_round_trip(self):
+        for value in [0, 1, 127, 128, 255, 300, 16383, 16384, 2 ** 32, 2 ** 63 + 5]:
+            data = encode_varint(value)
+            self.assertEqual(_read_varint(data, 0), (value, len(data)))
+
+    def test_encoding(self):
+        self.assertEqual(encode_varint(0), '\x00')
+        self.assertEqual(encode_varint(127), '\x7f')
+        self.assertEqual(encode_varint(300), '\xac\x02')
+
+    def test_zigzag_round_trip(self):
+        for value in [0, 1, -1, 2, -2, 1000000, -1000000, 2 ** 40, -(2 ** 40)]:
+            self.assertTrue(_zigzag(value) >= 0)
+            self.assertEqual(_unzigzag(_zigzag(value)), value)
+        self.assertEqual([_zigzag(v) for v in [0, -1, 1, -2, 2]], [0, 1, 2, 3, 4])
+
+class TimelineTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_and_read(self):
+        path = os.path.join(self.directory, 'case.timeline')
+        writer = TimelineWriter(path)
+        stdout = writer.stream('stdout')
+        stderr = writer.stream('stderr')
+        self.assertTrue(writer.stream('stdout') is stdout)
+        writer.record(stdout.stream_id, 2000, 'out 1\n')
+        writer.record(stderr.stream_id, 1000, 'err 1\n')
+        writer.record(stdout.stream_id, 3000, 'out 2\n')
+        writer.close()
+        self.assertEqual(read_timeline(path), [(1000, 'stderr', 'err 1\n'),
+                                               (2000, 'stdout', 'out 1\n'),
+                                               (3000, 'stdout', 'out 2\n')])
+
+    def test_truncated_record_ends_the_timeline(self):
+        path = os.path.join(self.directory, 'case.timeline')
+        writer = TimelineWriter(path)
+        stream = writer.stream('stdout')
+        writer.record(stream.stream_id, 1000, 'complete\n')
+        writer.record(stream.stream_id, 2000, 'cut short\n')
+        writer.close()
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:-4])
+        self.assertEqual(read_timeline(path), [(1000, 'stdout', 'complete\n')])
+
+    def test_not_a_timeline(self):
+        path = os.path.join(self.directory, 'other')
+        with open(path, 'wb') as f:
+            f.write('plain text\n')
+        self.assertRaises(ValueError, read_timeline, path)
+
+    def test_merge(self):
+        paths = []
+        for name, times in [('a', [1000, 3000]), ('b', [2000])]:
+            path = os.path.join(self.directory, name)
+            writer = TimelineWriter(path)
+            stream = writer.stream('stdout')
+            for timestamp in times:
+                writer.record(stream.stream_id, timestamp, '%s %d\n' %(name, timestamp))
+            writer.close()
+            paths.append(path)
+        self.assertEqual([(t, os.path.basename(p)) for t, p, name, data in merge_timelines(paths)],
+                         [(1000, 'a'), (2000, 'b'), (3000, 'a')])
+
+if __name__ == '__main__':
+    unittest.main()
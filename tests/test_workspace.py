@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# Filename: test_workspace.py
+
+import os
+import sys
+import errno
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import workspace
+from workspace import Workspace
+
+class WorkspaceTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, 'fixture')
+        os.makedirs(os.path.join(self.source, 'sub'))
+        for name, data in [('data.bin', 'data'), ('db.dat', 'rows'), ('sub/nested.txt', 'nested')]:
+            with open(os.path.join(self.source, name), 'w') as f:
+                f.write(data)
+        os.symlink('data.bin', os.path.join(self.source, 'link'))
+        self.spaces = []
+
+    def tearDown(self):
+        for space in self.spaces:
+            if space.path is not None:
+                shutil.rmtree(space.path, True)
+        shutil.rmtree(self.root, True)
+
+    def provision(self, **kwargs):
+        space = Workspace(self.source, root=self.root, **kwargs)
+        self.spaces.append(space)
+        return space, space.provision()
+
+    def test_copy(self):
+        space, path = self.provision(mode='copy')
+        self.assertEqual(space.used_mode, 'copy')
+        with open(os.path.join(path, 'sub', 'nested.txt')) as f:
+            self.assertEqual(f.read(), 'nested')
+        self.assertEqual(os.readlink(os.path.join(path, 'link')), 'data.bin')
+        self.assertEqual(os.stat(os.path.join(path, 'data.bin')).st_nlink, 1)
+
+    def test_hardlink_copies_writable_files(self):
+        space, path = self.provision(mode='hardlink', writable=['*.dat'])
+        self.assertEqual(space.used_mode, 'hardlink')
+        self.assertEqual(os.stat(os.path.join(path, 'data.bin')).st_nlink, 2)
+        self.assertEqual(os.stat(os.path.join(path, 'db.dat')).st_nlink, 1)
+        space.copy_up('data.bin')
+        self.assertEqual(os.stat(os.path.join(path, 'data.bin')).st_nlink, 1)
+
+    def test_auto_mode_resolves(self):
+        space, path = self.provision()
+        self.assertIn(space.used_mode, ['reflink', 'hardlink', 'copy'])
+        with open(os.path.join(path, 'data.bin')) as f:
+            self.assertEqual(f.read(), 'data')
+
+    def test_hardlink_falls_back_to_copy(self):
+        link = os.link
+        def cross_device(source, destination):
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+        os.link = cross_device
+        try:
+            space, path = self.provision(mode='hardlink')
+        finally:
+            os.link = link
+        self.assertEqual(space.used_mode, 'copy')
+        self.assertEqual(os.stat(os.path.join(path, 'data.bin')).st_nlink, 1)
+
+    def test_failed_provision_removes_the_tree(self):
+        space = Workspace(self.source, mode='copy', root=self.root)
+        copy2 = shutil.copy2
+        def fail(source, destination):
+            raise IOError(errno.ENOSPC, 'No space left on device')
+        workspace.shutil.copy2 = fail
+        try:
+            self.assertRaises(IOError, space.provision)
+        finally:
+            workspace.shutil.copy2 = copy2
+        self.assertEqual(space.path, None)
+        self.assertEqual(sorted(os.listdir(self.root)), ['fixture'])
+
+    def test_teardown(self):
+        space, path = self.provision(mode='copy')
+        space.teardown()
+        self.assertEqual(space.path, None)
+        self.assertFalse(os.path.exists(path))
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, Workspace, self.source, mode='overlay')
+        self.assertRaises(ValueError, Workspace, os.path.join(self.root, 'missing'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# Filename: trace_events.py
+
+import os
+import timeit
+import threading
+
+# clock id of clock_gettime from linux/time.h
+CLOCK_MONOTONIC = 1
+
+# clock_gettime, its timespec argument type and byref, loaded
+# on first use so that importing the module does not import ctypes
+_clock = None
+
+def _load_clock_gettime():
+    import ctypes
+    import ctypes.util
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+    try:
+        library = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        clock_gettime = library.clock_gettime
+    except (OSError, AttributeError):
+        return (None, None, None)
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    return (clock_gettime, timespec, ctypes.byref)
+
+def monotonic_ns():
+    """Return a monotonic clock reading in nanoseconds
+    """
+    global _clock
+    if _clock is None:
+        _clock = _load_clock_gettime()
+    clock_gettime, timespec, byref = _clock
+    if clock_gettime is not None:
+        value = timespec()
+        if clock_gettime(CLOCK_MONOTONIC, byref(value)) == 0:
+            return value.tv_sec * 1000000000 + value.tv_nsec
+    return int(timeit.default_timer() * 1000000000)
+
+class _Span(object):
+    """A phase recorded as one complete event when it ends
+    """
+    __slots__ = ['name', 'category', 'args', 'start']
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = monotonic_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        Tracer.complete(self.name, self.category, self.start, monotonic_ns(), self.args)
+        return False
+
+class _NullSpan(object):
+    """Span returned while tracing is disabled
+    """
+
+    @property
+    def args(self):
+        # a fresh dict, so arguments set on the shared span are dropped
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class Tracer:
+    """Records the phases of a run as Chrome Trace Event Format
+    complete events, which load in chrome://tracing and Perfetto.
+
+    Every event carries its monotonic start time and duration in
+    nanoseconds and the id of the thread it ran on, so the time spent in
+    the framework can be told apart from the time spent in the programs
+    under test, also when cases run on several workers.
+    """
+    enabled = False
+    _events = []
+    _thread_names = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def start():
+        """Discard the events recorded so far and start recording
+        """
+        with Tracer._lock:
+            Tracer._events = []
+            Tracer._thread_names = {}
+        Tracer.enabled = True
+
+    @staticmethod
+    def stop():
+        Tracer.enabled = False
+
+    @staticmethod
+    def span(name, category, **args):
+        """Return a context manager recording the enclosed phase
+
+        Positional arguments:
+        name -- name of the phase, e.g. "spawn"
+        category -- group of the phase, e.g. "process"
+        args -- details shown with the event, may be added to
+                through the args dict of the returned span
+        """
+        if not Tracer.enabled:
+            return _NULL_SPAN
+        return _Span(name, category, args)
+
+    @staticmethod
+    def complete(name, category, start_ns, end_ns, args=None):
+        """Record a phase that ran from start_ns to end_ns on the current thread
+        """
+        if not Tracer.enabled:
+            return
+        thread = threading.current_thread()
+        with Tracer._lock:
+            Tracer._events.append((name, category, start_ns, end_ns - start_ns, thread.ident, args))
+            Tracer._thread_names[thread.ident] = thread.name
+
+    @staticmethod
+    def export(path):
+        """Write the recorded events to a Chrome Trace Event JSON file
+        """
+        import json
+        pid = os.getpid()
+        with Tracer._lock:
+            events = list(Tracer._events)
+            thread_names = dict(Tracer._thread_names)
+        trace_events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                         'args': {'name': thread_name}}
+                        for tid, thread_name in sorted(thread_names.items())]
+        # the format's timestamps are microseconds, fractions keep the nanoseconds
+        for name, category, start_ns, duration_ns, tid, args in events:
+            event = {'name': name,
+                     'cat': category,
+                     'ph': 'X',
+                     'ts': start_ns / 1000.0,
+                     'dur': duration_ns / 1000.0,
+                     'pid': pid,
+                     'tid': tid}
+            if args:
+                event['args'] = args
+            trace_events.append(event)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ns'}, f, default=str)
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# Filename: type_validator.py
+
+import timeit
+from types import *
+from framework_profiler import Profiler
+
+class ListOf(object):
+    """Schema entry of a list whose items are all of the given type or types
+    """
+
+    def __init__(self, types):
+        self.types = _type_tuple(types)
+
+def _type_tuple(types):
+    """Return the type or list of types as a tuple,
+    checking once that every entry is a type
+    """
+    if not isinstance(types, (list, tuple)):
+        types = [types]
+    for t in types:
+        if not isinstance(t, type):
+            raise ValueError('expected_type argument "%s" is not a type' %str(t))
+    return tuple(types)
+
+def _describe(value, limit=200):
+    text = str(value)
+    if len(text) > limit:
+        text = text[:limit] + '...'
+    return text
+
+class Validator(object):
+    """Checks the arguments of a function against a schema of argument
+    names and types, compiled once into a function of plain isinstance
+    tests. The error message of an argument is only formatted when it
+    fails.
+
+    Validation is skipped altogether while Validator.enabled is False,
+    which it is when Python runs optimized (python -O).
+    """
+    enabled = __debug__
+
+    def __init__(self, schema):
+        """Positional arguments:
+        schema -- list of (argument name, type, list of types or ListOf)
+        """
+        self.names = [name for name, types in schema]
+        self._specs = [types if isinstance(types, ListOf) else _type_tuple(types)
+                       for name, types in schema]
+        self._first_failure = self._compile()
+
+    def _compile(self):
+        """Generate a function returning the index of the first
+        invalid argument, -1 if all arguments are valid
+        """
+        arguments = ['v%d' %i for i in range(len(self._specs))]
+        namespace = {}
+        lines = ['def first_failure(%s):' %', '.join(arguments)]
+        for i, spec in enumerate(self._specs):
+            if isinstance(spec, ListOf):
+                namespace['T%d' %i] = spec.types
+                lines.append('    if not isinstance(v%d, list): return %d' %(i, i))
+                lines.append('    for item in v%d:' %i)
+                lines.append('        if not isinstance(item, T%d): return %d' %(i, i))
+            else:
+                namespace['T%d' %i] = spec
+                lines.append('    if not isinstance(v%d, T%d): return %d' %(i, i, i))
+        lines.append('    return -1')
+        exec compile('\n'.join(lines) + '\n', '<validator>', 'exec') in namespace
+        return namespace['first_failure']
+
+    def _message(self, index, value):
+        spec = self._specs[index]
+        if isinstance(spec, ListOf):
+            if not isinstance(value, list):
+                return '%s: "%s" is not an instance of type %s' %(self.names[index], _describe(value), list)
+            value = [item for item in value if not isinstance(item, spec.types)][0]
+            types = spec.types
+        else:
+            types = spec
+        return '%s: "%s" is not an instance of type %s' %(self.names[index],
+                                                          _describe(value),
+                                                          ' or '.join([str(t) for t in types]))
+
+    def check(self, *values):
+        """Raise a ValueError for the first argument not matching the
+        schema, the values are given in schema order
+        """
+        if not Validator.enabled:
+            return
+        if Profiler.enabled:
+            start_time = timeit.default_timer()
+            index = self._first_failure(*values)
+            Profiler.observe('validation', timeit.default_timer() - start_time)
+        else:
+            index = self._first_failure(*values)
+        if index >= 0:
+            raise ValueError(self._message(index, values[index]))
+
+    def errors(self, *values):
+        """Return the error messages of all arguments not matching the schema
+        """
+        if not Validator.enabled or self._first_failure(*values) < 0:
+            return []
+        messages = []
+        for index, value in enumerate(values):
+            spec = self._specs[index]
+            if isinstance(spec, ListOf):
+                valid = isinstance(value, list) and all([isinstance(item, spec.types) for item in value])
+            else:
+                valid = isinstance(value, spec)
+            if not valid:
+                messages.append(self._message(index, value))
+        return messages
+
+_validators = {}
+
+def compile_validator(schema):
+    """Return the Validator of a schema, compiled on the first call
+    and taken from the cache afterwards
+    """
+    key = tuple([(name, ('list', types.types) if isinstance(types, ListOf)
+                  else (tuple(types) if isinstance(types, list) else types))
+                 for name, types in schema])
+    validator = _validators.get(key)
+    if validator is None:
+        validator = _validators[key] = Validator(schema)
+    return validator
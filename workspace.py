@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# Filename: workspace.py
+
+import os
+import errno
+import shutil
+import fnmatch
+import tempfile
+from threading import Thread
+from assert_variable_type import *
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request cloning a file's extents on btrfs, xfs and other
+# copy-on-write filesystems (_IOW(0x94, 9, int) from linux/fs.h)
+FICLONE = 0x40049409
+WORKSPACE_MODES = ['auto', 'reflink', 'hardlink', 'copy']
+
+def reflink_file(source, destination):
+    """Clone a file sharing its data blocks until either copy is written.
+    Raise IOError/OSError if the filesystem does not support it.
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'reflinks are not supported on this platform')
+    with open(source, 'rb') as src:
+        with open(destination, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except (IOError, OSError):
+                dst.close()
+                os.remove(destination)
+                raise
+    shutil.copystat(source, destination)
+
+class Workspace:
+    """A private working copy of a fixture directory tree, made without
+    copying the data where the filesystem allows it.
+
+    reflink -- every file is cloned, the filesystem copies blocks on write
+    hardlink -- every file is hard linked except those matching the writable
+                patterns, which are copied. A hard linked file shares its
+                inode with the source, so the program under test must only
+                replace such files, or copy_up must be called before it
+                writes them in place.
+    copy -- every file is copied
+    auto -- reflink if the filesystem supports it, hardlink otherwise, or
+            copy if the files cannot be hard linked either
+
+    Teardown moves the tree aside and deletes it in the background.
+    """
+
+    def __init__(self, source, writable=None, mode='auto', root=None):
+        """Positional arguments:
+        source -- the fixture directory
+        writable -- glob patterns, relative to source, of the files the
+                    program modifies in place, copied in hardlink mode
+        mode -- one of WORKSPACE_MODES
+        root -- directory to create the workspace in, a temp dir by default
+        """
+        assert_variable_type(source, str)
+        assert_variable_type(writable, [list, NoneType])
+        assert_variable_type(mode, str)
+        assert_variable_type(root, [str, NoneType])
+        if mode not in WORKSPACE_MODES:
+            raise ValueError('mode argument "%s" is not one of %s' %(mode, ', '.join(WORKSPACE_MODES)))
+        if not os.path.isdir(source):
+            raise ValueError('source argument "%s" is not a directory' %source)
+        self.source = os.path.abspath(source)
+        self.writable = writable or []
+        self.mode = mode
+        self.root = root
+        self.path = None
+        # mode actually used, auto resolves to reflink or hardlink
+        self.used_mode = None
+
+    def _is_writable(self, relative_path):
+        return [p for p in self.writable if fnmatch.fnmatch(relative_path, p)] != []
+
+    def _copy(self, source, destination):
+        if self.used_mode == 'reflink':
+            try:
+                reflink_file(source, destination)
+                return
+            except (IOError, OSError):
+                self.used_mode = 'copy'
+        shutil.copy2(source, destination)
+
+    def _materialize(self, source, destination, relative_path):
+        if self.used_mode is None:
+            # probe reflink support with the first file
+            if self.mode in ['auto', 'reflink']:
+                try:
+                    reflink_file(source, destination)
+                    self.used_mode = 'reflink'
+                    return
+                except (IOError, OSError):
+                    self.used_mode = 'hardlink' if self.mode == 'auto' else 'copy'
+            else:
+                self.used_mode = self.mode
+        if self.used_mode == 'hardlink' and not self._is_writable(relative_path):
+            try:
+                os.link(source, destination)
+                return
+            except OSError as e:
+                # the workspace root is on another filesystem or
+                # hard links to the source are not permitted
+                if e.errno not in [errno.EXDEV, errno.EPERM, errno.EMLINK]:
+                    raise
+                self.used_mode = 'copy'
+            shutil.copy2(source, destination)
+        else:
+            self._copy(source, destination)
+
+    def provision(self):
+        """Create the working copy and return its path
+        """
+        self.path = tempfile.mkdtemp(prefix='workspace-', dir=self.root)
+        try:
+            self._provision()
+        except:
+            shutil.rmtree(self.path, True)
+            self.path = None
+            raise
+        return self.path
+
+    def _provision(self):
+        for directory, subdirectories, files in os.walk(self.source):
+            relative_directory = os.path.relpath(directory, self.source)
+            target_directory = os.path.normpath(os.path.join(self.path, relative_directory))
+            for name in subdirectories:
+                source = os.path.join(directory, name)
+                target = os.path.join(target_directory, name)
+                if os.path.islink(source):
+                    os.symlink(os.readlink(source), target)
+                else:
+                    os.mkdir(target)
+                    shutil.copymode(source, target)
+            for name in files:
+                source = os.path.join(directory, name)
+                target = os.path.join(target_directory, name)
+                if os.path.islink(source):
+                    os.symlink(os.readlink(source), target)
+                else:
+                    self._materialize(source, target,
+                                      os.path.normpath(os.path.join(relative_directory, name)))
+
+    def copy_up(self, relative_path):
+        """Replace a hard linked file by a private copy before it is written in place
+        """
+        target = os.path.join(self.path, relative_path)
+        if os.path.isfile(target) and os.stat(target).st_nlink > 1:
+            temporary = target + '.copy_up'
+            shutil.copy2(target, temporary)
+            os.rename(temporary, target)
+
+    def teardown(self):
+        """Remove the working copy. The tree is renamed right away so the
+        path can be reused, and deleted by a background thread.
+        """
+        if self.path is None:
+            return
+        trash = self.path + '.trash'
+        try:
+            os.rename(self.path, trash)
+        except OSError:
+            trash = self.path
+        self.path = None
+        # non-daemon so the interpreter waits for the deletion on exit
+        Thread(target=shutil.rmtree, args=(trash, True)).start()
+
+def workspace_fixture(source, writable=None, mode='auto', root=None):
+    """Return a fixture for the fixture decorator which provisions a
+    Workspace of source for the case. The case finds its path in
+    self.fixture_value.
+    """
+    def workspace():
+        space = Workspace(source, writable, mode, root)
+        def setup():
+            return space.provision()
+        def teardown():
+            space.teardown()
+        return setup, teardown
+    return workspace